@@ -0,0 +1,437 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, exists, func, or_, select, tuple_, update
+
+from app import db
+from connections import record_entries_connections
+from data_version import bump_data_version
+from models import AnalysisJob, JournalEntry, Person, dialect_insert, journal_person
+from stats import replace_entries_sentiment_stats
+from utils import ChunkedPool, analyze_contents, get_name_matcher
+
+ANALYSIS_BATCH_SIZE = 100
+# Entries per task when a batch is spread over a process pool
+ANALYSIS_CHUNK_SIZE = 10
+# A claimed job whose worker hasn't finished it by then is handed out again
+CLAIM_TIMEOUT = timedelta(minutes=5)
+# Jobs that failed this many times are no longer claimed; `flask reanalyze` retries them
+MAX_ATTEMPTS = 5
+REANALYZE_BATCH_SIZE = 1000
+
+
+def enqueue_analysis(entry_id, connected_people=None):
+    """
+    Queue a journal entry for analysis in the current transaction.
+
+    If the entry is already queued its revision is bumped, so a worker that
+    is analyzing the previous content throws its result away, and the job
+    keeps its original queued_at, so lag measures the oldest unanalyzed save.
+    `connected_people` are the ids of the people whose connections the
+    entry already recorded, if it did; the worker records them again only
+    if the entry's people changed. Nothing is recorded while an entry is
+    queued, so a queued job keeps the people it was first queued with.
+    """
+    table = AnalysisJob.__table__
+    insert = dialect_insert(table).values(
+        entry_id=entry_id, revision=1, queued_at=datetime.utcnow(), attempts=0,
+        connected_people=json.dumps(sorted(connected_people)) if connected_people is not None else None
+    )
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.entry_id],
+        set_={'revision': table.c.revision + 1, 'claimed_at': None, 'claimed_by': None, 'attempts': 0}
+    ))
+
+
+def _failed(now):
+    """Condition of the jobs that gave up: out of attempts and not being analyzed"""
+    return and_(AnalysisJob.attempts >= MAX_ATTEMPTS,
+                or_(AnalysisJob.claimed_at.is_(None), AnalysisJob.claimed_at < now - CLAIM_TIMEOUT))
+
+
+def analysis_status(entry_ids):
+    """
+    Return {entry_id: status} of those of `entry_ids` still in the analysis queue.
+
+    The status is 'failed' for entries whose analysis gave up after
+    MAX_ATTEMPTS and 'pending' for the others; analyzed entries are left out.
+    """
+    if not entry_ids:
+        return {}
+    failed = _failed(datetime.utcnow())
+    return {
+        entry_id: 'failed' if is_failed else 'pending'
+        for entry_id, is_failed in db.session.execute(
+            select(AnalysisJob.entry_id, failed).where(AnalysisJob.entry_id.in_(entry_ids)))
+    }
+
+
+def retry_failed_analysis(user_id=None, date_from=None, date_to=None):
+    """
+    Give the failed analysis jobs another MAX_ATTEMPTS, in the current transaction.
+
+    Optionally only those of one user's entries created in [date_from, date_to).
+    They are queued again from now, so they don't count as lag for the time
+    they spent failed, and their users' data versions are bumped so the
+    entries' ETags change. Returns the number of jobs requeued.
+    """
+    entries = select(JournalEntry.id)
+    if user_id is not None:
+        entries = entries.where(JournalEntry.user_id == user_id)
+    if date_from is not None:
+        entries = entries.where(JournalEntry.date_created >= date_from)
+    if date_to is not None:
+        entries = entries.where(JournalEntry.date_created < date_to)
+
+    now = datetime.utcnow()
+    table = AnalysisJob.__table__
+    retried = db.session.execute(
+        update(table).where(_failed(now), table.c.entry_id.in_(entries))
+        .values(queued_at=now, claimed_at=None, claimed_by=None, attempts=0)
+        .returning(table.c.entry_id)
+    ).scalars().all()
+    if retried:
+        bump_data_version(db.session.execute(
+            select(JournalEntry.user_id).where(JournalEntry.id.in_(retried))
+        ).scalars())
+    return len(retried)
+
+
+def cancel_analysis(entry_id):
+    """Drop the queued analysis of an entry that is being deleted"""
+    db.session.execute(delete(AnalysisJob.__table__).where(AnalysisJob.entry_id == entry_id))
+
+
+def analysis_queue_stats():
+    """
+    Return the state of the analysis queue.
+
+    'depth' is the number of entries waiting for analysis, 'claimed' how
+    many of them workers are analyzing, 'failed' how many more gave up after
+    MAX_ATTEMPTS and 'lag_seconds' the age of the oldest waiting save (0
+    when none is waiting).
+    """
+    gave_up = _failed(datetime.utcnow())
+    depth, claimed, failed, oldest = db.session.execute(select(
+        func.count().filter(~gave_up),
+        func.count(AnalysisJob.claimed_at).filter(~gave_up),
+        func.count().filter(gave_up),
+        func.min(AnalysisJob.queued_at).filter(~gave_up)
+    )).one()
+    lag = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+    return {'depth': depth, 'claimed': claimed, 'failed': failed, 'lag_seconds': max(lag, 0)}
+
+
+def claim_analysis_jobs(worker_id, limit=ANALYSIS_BATCH_SIZE):
+    """
+    Claim up to `limit` of the oldest queued jobs for `worker_id` and commit.
+
+    Jobs whose claim timed out are claimed again. The claim is a single
+    conditional UPDATE ... RETURNING, so concurrent workers never get the
+    same job.
+    Returns {entry_id: revision} of the claimed jobs.
+    """
+    now = datetime.utcnow()
+    claimable = or_(AnalysisJob.claimed_at.is_(None), AnalysisJob.claimed_at < now - CLAIM_TIMEOUT)
+    oldest = select(AnalysisJob.entry_id).where(
+        claimable, AnalysisJob.attempts < MAX_ATTEMPTS
+    ).order_by(AnalysisJob.queued_at).limit(limit)
+
+    table = AnalysisJob.__table__
+    jobs = dict(db.session.execute(update(table).where(table.c.entry_id.in_(oldest), claimable).values(
+        claimed_at=now, claimed_by=worker_id, attempts=table.c.attempts + 1
+    ).returning(table.c.entry_id, table.c.revision)).all())
+    db.session.commit()
+    return jobs
+
+
+def process_analysis_jobs(worker_id=None, limit=ANALYSIS_BATCH_SIZE, pool=None):
+    """
+    Claim a batch of queued entries, analyze them and store the results.
+
+    Analysis runs outside of any transaction, on `pool` (a ChunkedPool of
+    analyze_contents) if given. Results are then written in one transaction, each only if its
+    job still has the claimed revision: an entry edited in the meantime is
+    left queued for its new content, and a job that was already completed
+    is not applied twice. Storing a result fills in the entry's sentiment,
+    highlights and extracted names, updates its people's stats and records
+    the connections between its people, like a synchronous save used to.
+
+    Returns the number of jobs claimed.
+    """
+    worker_id = worker_id or default_worker_id()
+    jobs = claim_analysis_jobs(worker_id, limit)
+    if not jobs:
+        return 0
+
+    try:
+        entries = db.session.execute(
+            select(JournalEntry.id, JournalEntry.content).where(JournalEntry.id.in_(list(jobs)))
+        ).all()
+        db.session.commit()
+        contents = [content for _, content in entries]
+        if pool is not None and len(contents) > ANALYSIS_CHUNK_SIZE:
+            results = pool.map(contents, ANALYSIS_CHUNK_SIZE)
+        else:
+            results = analyze_contents(contents)
+
+        _store_results(jobs, [(entry_id, content, result)
+                              for (entry_id, content), result in zip(entries, results)])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Release the claims so the jobs are retried, up to MAX_ATTEMPTS
+        db.session.execute(update(AnalysisJob.__table__).where(
+            AnalysisJob.entry_id.in_(list(jobs)), AnalysisJob.claimed_by == worker_id
+        ).values(claimed_at=None, claimed_by=None))
+        # Entries that just failed for good change status, so their ETags must too
+        bump_data_version(db.session.execute(
+            select(JournalEntry.user_id).join(AnalysisJob, AnalysisJob.entry_id == JournalEntry.id).where(
+                AnalysisJob.entry_id.in_(list(jobs)), AnalysisJob.attempts >= MAX_ATTEMPTS)
+        ).scalars())
+        db.session.commit()
+        raise
+    return len(jobs)
+
+
+def _store_results(jobs, analyzed):
+    """Write analysis results for jobs that weren't superseded, in the current transaction"""
+    table = AnalysisJob.__table__
+    # Deleting the jobs with the analyzed revisions is what commits to their
+    # results; jobs of deleted entries are dropped along the way
+    done = dict(db.session.execute(delete(table).where(
+        tuple_(table.c.entry_id, table.c.revision).in_(list(jobs.items()))
+    ).returning(table.c.entry_id, table.c.connected_people)).all())
+    current = [(entry_id, content, result) for entry_id, content, result in analyzed if entry_id in done]
+    if not current:
+        return
+
+    entry_ids = [entry_id for entry_id, _, _ in current]
+    rows = db.session.execute(select(
+        JournalEntry.id, JournalEntry.user_id, JournalEntry.sentiment_score, JournalEntry.interaction_type
+    ).where(JournalEntry.id.in_(entry_ids))).all()
+    entry_rows = {row.id: row for row in rows}
+
+    people_by_entry = _load_entry_people(entry_ids)
+    matchers = _load_matchers({row.user_id for row in rows})
+
+    versions = bump_data_version(row.user_id for row in rows)
+    updates = []
+    sentiment_changes = []
+    connections = {}  # user_id -> [(person_ids, sentiment_score), ...]
+    for entry_id, content, result in current:
+        row = entry_rows.get(entry_id)
+        if row is None:
+            continue
+        values = _analysis_values(matchers[row.user_id], content, result)
+        values['id'] = entry_id
+        values['sync_version'] = versions[row.user_id]
+        updates.append(values)
+        person_ids = people_by_entry[entry_id]
+        sentiment_changes.append((person_ids, row.sentiment_score, values['sentiment_score']))
+        # An edit only records connections again if it changed the entry's people
+        connected = done[entry_id]
+        if connected is not None and sorted(person_ids) == json.loads(connected):
+            continue
+        if len(person_ids) > 1 and row.interaction_type:
+            connections.setdefault(row.user_id, []).append((person_ids, values['sentiment_score']))
+
+    if updates:
+        db.session.execute(update(JournalEntry), updates)
+    replace_entries_sentiment_stats(sentiment_changes)
+    for user_id, user_connections in connections.items():
+        record_entries_connections(user_connections, versions[user_id])
+
+
+def reanalyze_entries(user_id=None, date_from=None, date_to=None, after_id=0,
+                      batch_size=REANALYZE_BATCH_SIZE, workers=None):
+    """
+    Recompute the stored analysis of existing journal entries.
+
+    Used when the lexicon or name rules change. Entries are processed in id
+    order in batches of `batch_size`, optionally only those of one user and
+    created in [date_from, date_to), starting after `after_id`. Each batch is
+    analyzed across `workers` processes while the previous batch is written
+    back. Only entries whose sentiment, highlights or extracted names
+    actually changed are updated, together with their people's sentiment
+    stats, in one transaction per batch. Connection sentiment averages are
+    left as they are. Entries queued for analysis are skipped, since the
+    queue will analyze them anyway.
+
+    Yields {'last_id', 'entries', 'changed'} after each committed batch,
+    with counts so far; pass last_id as after_id to resume.
+    """
+    statement = select(
+        JournalEntry.id, JournalEntry.user_id, JournalEntry.content, JournalEntry.sentiment_score,
+        JournalEntry.content_with_highlights, JournalEntry.extracted_names
+    ).where(~exists().where(AnalysisJob.entry_id == JournalEntry.id)).order_by(JournalEntry.id).limit(batch_size)
+    if user_id is not None:
+        statement = statement.where(JournalEntry.user_id == user_id)
+    if date_from is not None:
+        statement = statement.where(JournalEntry.date_created >= date_from)
+    if date_to is not None:
+        statement = statement.where(JournalEntry.date_created < date_to)
+
+    pool = ChunkedPool(analyze_contents, workers)
+
+    def prepare(after):
+        """Read the batch after `after` and start analyzing it"""
+        rows = db.session.execute(statement.where(JournalEntry.id > after)).all()
+        # Don't keep a transaction open while the batch is analyzed
+        db.session.commit()
+        return rows, pool.submit([row.content for row in rows])
+
+    entries = 0
+    changed = 0
+    try:
+        rows, analysis = prepare(after_id)
+        while rows:
+            # Start on the next batch while this one is written
+            next_batch = prepare(rows[-1].id)
+
+            results = analysis.result()
+
+            user_ids = {row.id: row.user_id for row in rows}
+            matchers = _load_matchers(set(user_ids.values()))
+            updates = []
+            for row, result in zip(rows, results):
+                values = _analysis_values(matchers[row.user_id], row.content, result)
+                if (values['sentiment_score'] != row.sentiment_score
+                        or values['content_with_highlights'] != row.content_with_highlights
+                        or values['extracted_names'] != row.extracted_names):
+                    values['id'] = row.id
+                    values['old_sentiment_score'] = row.sentiment_score
+                    updates.append(values)
+
+            if updates:
+                versions = bump_data_version(user_ids[values['id']] for values in updates)
+                rescored = [values for values in updates if values['sentiment_score'] != values['old_sentiment_score']]
+                people_by_entry = _load_entry_people([values['id'] for values in rescored])
+                replace_entries_sentiment_stats(
+                    (people_by_entry[values['id']], values['old_sentiment_score'], values['sentiment_score'])
+                    for values in rescored
+                )
+                for values in updates:
+                    del values['old_sentiment_score']
+                    values['sync_version'] = versions[user_ids[values['id']]]
+                db.session.execute(update(JournalEntry), updates)
+            db.session.commit()
+
+            entries += len(rows)
+            changed += len(updates)
+            yield {'last_id': rows[-1].id, 'entries': entries, 'changed': changed}
+            rows, analysis = next_batch
+    finally:
+        pool.shutdown()
+
+
+def _load_entry_people(entry_ids):
+    """Return {entry_id: [person_id, ...]} for `entry_ids` from journal_person"""
+    people_by_entry = {entry_id: [] for entry_id in entry_ids}
+    for entry_id, person_id in db.session.execute(
+        select(journal_person.c.journal_entry_id, journal_person.c.person_id).where(
+            journal_person.c.journal_entry_id.in_(entry_ids))
+    ):
+        people_by_entry[entry_id].append(person_id)
+    return people_by_entry
+
+
+def _load_matchers(user_ids):
+    """Return the NameMatcher of each of `user_ids`, loading their people in one query"""
+    people_by_user = {user_id: [] for user_id in user_ids}
+    for person_id, name, user_id in db.session.execute(
+        select(Person.id, Person.name, Person.user_id).where(Person.user_id.in_(user_ids)).order_by(Person.id)
+    ):
+        people_by_user[user_id].append((person_id, name))
+    return {user_id: get_name_matcher(user_id, people) for user_id, people in people_by_user.items()}
+
+
+def _analysis_values(matcher, content, result):
+    """Turn an analyze_contents result into the entry columns it sets"""
+    sentiment_score, potential_names = result
+    new_names = [name for name in potential_names if name not in matcher.names]
+    content_with_highlights, _ = matcher.highlight(content, new_names)
+    return {
+        'sentiment_score': sentiment_score,
+        'content_with_highlights': content_with_highlights,
+        'extracted_names': json.dumps(potential_names)
+    }
+
+
+def default_worker_id():
+    """Identify this process's workers in claimed_by"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class AnalysisWorker(threading.Thread):
+    """
+    Background thread that drains the analysis queue.
+
+    It processes batches until the queue is empty, then sleeps until
+    notify() is called after a save or `poll_interval` seconds pass, which
+    picks up jobs queued by other processes.
+    """
+
+    def __init__(self, app, poll_interval=5.0, processes=1):
+        super().__init__(name='analysis-worker', daemon=True)
+        self.app = app
+        self.poll_interval = poll_interval
+        self.processes = processes
+        self.wake = threading.Event()
+        self.stopping = False
+
+    def notify(self):
+        self.wake.set()
+
+    def stop(self):
+        self.stopping = True
+        self.wake.set()
+
+    def run(self):
+        pool = ChunkedPool(analyze_contents, self.processes)
+        worker_id = f'{default_worker_id()}:{self.ident}'
+        try:
+            with self.app.app_context():
+                while not self.stopping:
+                    try:
+                        if process_analysis_jobs(worker_id, pool=pool):
+                            continue
+                    except Exception:
+                        logging.exception('Journal entry analysis failed')
+                    finally:
+                        db.session.remove()
+                    self.wake.wait(self.poll_interval)
+                    self.wake.clear()
+        finally:
+            pool.shutdown(wait=False)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_analysis_worker(app):
+    """
+    Start this process's background analysis worker, if it isn't running.
+
+    Does nothing when ANALYSIS_WORKER is disabled, e.g. when the queue is
+    drained by `flask analysis-worker` processes instead. Starting lazily
+    also means each forked server process gets its own thread.
+    """
+    global _worker
+    if _worker is not None or not app.config.get('ANALYSIS_WORKER'):
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = AnalysisWorker(app)
+            _worker.start()
+
+
+def notify_analysis_worker():
+    """Wake this process's worker after a save queued an entry and committed"""
+    if _worker is not None:
+        _worker.notify()
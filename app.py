@@ -6,41 +6,122 @@ from sqlalchemy.orm import DeclarativeBase
 from flask_login import LoginManager
 from flask_cors import CORS
 
+from compression import init_compression
+from instrumentation import init_instrumentation
+from json_provider import init_json_provider
+
 
 class Base(DeclarativeBase):
     pass
 
 
+# Extensions are created unbound and bound to the app in create_app, so
+# modules can import them without creating an app
 db = SQLAlchemy(model_class=Base)
-# create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET")
-
-# configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///journal.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# initialize the app with the extension
-db.init_app(app)
-
-# setup login manager
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'pages.login'
+
+
+def load_config(app):
+    """Set the app's configuration from the environment"""
+    app.secret_key = os.environ.get("SESSION_SECRET")
+
+    # configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///journal.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Worker processes used to analyze entries during bulk imports
+    app.config["IMPORT_WORKERS"] = int(os.environ.get("IMPORT_WORKERS", 2))
+    # Analyze saved entries in a background thread of each server process; set
+    # ANALYSIS_WORKER=0 when the queue is drained by `flask analysis-worker` instead
+    app.config["ANALYSIS_WORKER"] = os.environ.get("ANALYSIS_WORKER", "1") != "0"
+    # Cache for visualization results: "memory" (per process), "sqlite" (a file
+    # shared by all server processes, RESULT_CACHE_PATH) or "none"
+    app.config["RESULT_CACHE"] = os.environ.get("RESULT_CACHE", "memory")
+    app.config["RESULT_CACHE_PATH"] = os.environ.get("RESULT_CACHE_PATH")
+    app.config["RESULT_CACHE_TTL"] = int(os.environ.get("RESULT_CACHE_TTL", 600))
+    app.config["RESULT_CACHE_MAX_ENTRIES"] = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 1024))
+    # Social web graphs kept in memory per process for graph metrics, one per
+    # user, with the result cache's TTL
+    app.config["GRAPH_CACHE_MAX_ENTRIES"] = int(os.environ.get("GRAPH_CACHE_MAX_ENTRIES", 256))
+    # Social webs with at least this many people and connections are laid out
+    # on the server when numpy is installed, instead of by the browser; the
+    # latest layout of each user's graph is kept per process to start the next from
+    app.config["LAYOUT_MIN_SIZE"] = int(os.environ.get("LAYOUT_MIN_SIZE", 300))
+    app.config["LAYOUT_CACHE_MAX_ENTRIES"] = int(os.environ.get("LAYOUT_CACHE_MAX_ENTRIES", 256))
+    # Responses of at least this many bytes are compressed when the client accepts gzip or brotli
+    app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    # Fraction of requests whose SQL and phases are timed for the Server-Timing
+    # header and /metrics; every request's latency is recorded regardless
+    app.config["INSTRUMENTATION_SAMPLE_RATE"] = float(os.environ.get("INSTRUMENTATION_SAMPLE_RATE", 1.0))
+    app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "1") != "0"
+    # When set, /metrics requires an "Authorization: Bearer <METRICS_TOKEN>" header;
+    # when unset, /metrics is only served to requests from the loopback address
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    # Seconds a logged-in user's fields are cached per process instead of queried
+    # on every request; with USER_SESSION_PAYLOAD=1 they're also kept in the
+    # signed session cookie, so other processes don't query them either. Only
+    # the process that changes a user drops its copy, so this is also how long
+    # other processes can keep using a changed or deleted account
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 5))
+    app.config["USER_SESSION_PAYLOAD"] = os.environ.get("USER_SESSION_PAYLOAD", "0") == "1"
+    # Fail views that run more SQL statements than their @query_budget; unless
+    # ENFORCE_QUERY_BUDGETS is 0 or 1, it is on when testing or debugging
+    enforce = os.environ.get("ENFORCE_QUERY_BUDGETS")
+    app.config["ENFORCE_QUERY_BUDGETS"] = None if enforce is None else enforce != "0"
+
+
+def create_app(config=None):
+    """
+    Create and configure the app.
 
-# Enable CORS
-CORS(app)
+    `config` is a mapping of settings that override the environment, e.g.
+    {'SQLALCHEMY_DATABASE_URI': ..., 'TESTING': True}. Creating the app
+    doesn't touch the database: the schema is created and upgraded
+    explicitly with `flask db upgrade`. Flask-Migrate, which pulls in
+    Alembic, is only set up when the app is created by the `flask` command
+    or config sets MIGRATIONS, so server processes start without it.
+    """
+    import click
 
-# Initialize database
-with app.app_context():
-    # Import models here so tables will be created
+    app = Flask(__name__)
+    load_config(app)
+    app.config["MIGRATIONS"] = click.get_current_context(silent=True) is not None
+    app.config.update(config or {})
+    if app.config["ENFORCE_QUERY_BUDGETS"] is None:
+        app.config["ENFORCE_QUERY_BUDGETS"] = app.testing or app.debug
+
+    # initialize the app with the extensions
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    # Enable CORS
+    CORS(app)
+
+    # Time requests, encode JSON with orjson when it's installed, and compress
+    # large responses; instrumentation comes first so it also times compression
+    init_instrumentation(app)
+    init_json_provider(app)
+    init_compression(app)
+
+    # Import models so they are registered with SQLAlchemy and migrations
     import models
-    
-    db.create_all()
 
-# Import routes
-from routes import *
+    from routes import api, pages
+    app.register_blueprint(pages)
+    app.register_blueprint(api)
+
+    # Register CLI commands
+    from cli import commands
+    app.register_blueprint(commands)
+
+    if app.config["MIGRATIONS"]:
+        # Schema changes are applied with migrations: run `flask db upgrade`
+        from flask_migrate import Migrate
+        Migrate(app, db, render_as_batch=True)
+
+    return app
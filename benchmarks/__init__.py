@@ -0,0 +1,6 @@
+"""
+Benchmarks of the app's hot paths on synthetic data.
+
+Run them from the repository root as modules, e.g.
+`python -m benchmarks.suite`; see each module for its options.
+"""
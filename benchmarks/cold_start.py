@@ -0,0 +1,55 @@
+"""
+Measure how long a fresh process takes to start serving.
+
+Each run starts a new interpreter, like a gunicorn worker without
+--preload, and times importing the app module, create_app() and the first
+request (the login page, which doesn't query the database). The medians
+are reported.
+
+    python -m benchmarks.cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import ROOT
+
+# Runs in the child interpreter; prints its timings as JSON
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + %(database)r,
+                              'SECRET_KEY': 'benchmark', 'ANALYSIS_WORKER': False})
+created = time.perf_counter()
+status = application.test_client().get('/login').status_code
+served = time.perf_counter()
+assert status == 200, status
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first_request': served - created, 'total': served - start}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10, help='Processes to start; the medians are reported')
+    args = parser.parse_args()
+
+    database = os.path.join(tempfile.mkdtemp(prefix='journal-bench-'), 'journal.db')
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE % {'database': database}], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        print(f'{phase:<14} {statistics.median(run[phase] for run in runs) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark JSON encoding and response compression of the entries API.
+
+Builds a synthetic account in a temporary SQLite database, then measures:
+- the time and size of encoding every entry with Flask's stdlib JSON
+  provider and with OrjsonProvider (when orjson is installed);
+- the bytes on the wire and request time of paging through
+  /api/journal-entries uncompressed, gzipped and brotli-compressed.
+
+Run it from the repository root:
+
+    python -m benchmarks.json_responses --entries 10000
+"""
+import argparse
+import gzip
+import statistics
+import time
+
+from benchmarks.synthetic import generate_account, logged_in_client, open_benchmark_app
+
+
+def timed(function, repeat):
+    """Return (median seconds, last result) of calling `function` `repeat` times"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--entries', type=int, default=10000, help='Entries in the synthetic account')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement; the median is reported')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic data')
+    args = parser.parse_args()
+
+    app = open_benchmark_app(RESULT_CACHE='none')
+
+    from flask.json.provider import DefaultJSONProvider
+
+    from compression import brotli
+    from json_provider import OrjsonProvider, orjson
+
+    with app.app_context():
+        start = time.perf_counter()
+        account = generate_account('benchmark', people=20, entries=args.entries, seed=args.seed)
+        print(f'Generated {args.entries} entries in {time.perf_counter() - start:.1f}s\n')
+    client = logged_in_client(app, account['user_id'])
+
+    def fetch_all(accept_encoding):
+        """Page through every entry; return (wire bytes, entries)"""
+        wire_bytes = 0
+        entries = []
+        cursor = None
+        while True:
+            query = {'limit': 200, **({'cursor': cursor} if cursor else {})}
+            response = client.get('/api/journal-entries', query_string=query,
+                                  headers={'Accept-Encoding': accept_encoding})
+            body = response.get_data()
+            wire_bytes += len(body)
+            encoding = response.headers.get('Content-Encoding')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'br':
+                body = brotli.decompress(body)
+            page = app.json.loads(body)
+            entries.extend(page['entries'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return wire_bytes, entries
+
+    _, entries = fetch_all('identity')
+    payload = {'entries': entries}
+
+    print('Encoding every entry as one response')
+    providers = [('stdlib json', DefaultJSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    else:
+        print('  (orjson is not installed)')
+    with app.app_context():
+        for name, provider in providers:
+            seconds, response = timed(lambda: provider.response(payload), args.repeat)
+            print(f'  {name:<12} {seconds * 1000:8.1f} ms {len(response.get_data()):>12,} bytes')
+
+    print(f'\nPaging through /api/journal-entries (limit=200, {app.json.__class__.__name__})')
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    if brotli is None:
+        print('  (brotli is not installed)')
+    for encoding in encodings:
+        seconds, (wire_bytes, _) = timed(lambda: fetch_all(encoding), args.repeat)
+        print(f'  {encoding:<12} {seconds * 1000:8.1f} ms {wire_bytes:>12,} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the server-side layout of large social webs.
+
+For synthetic clustered graphs of each size, measures:
+- one repulsion pass computed exactly and with the Barnes-Hut quadtree,
+  and how far apart their forces are;
+- a cold layout, from random positions;
+- a warm layout after 1% more people joined, from the cold one, and how
+  far the people already there moved.
+
+Needs numpy. Run it from the repository root:
+
+    python -m benchmarks.social_web_layout --people 300 1000 3000
+"""
+import argparse
+import math
+import statistics
+import sys
+import time
+
+import layout
+from layout import np
+
+
+def clustered_graph(people, links_per_person, seed):
+    """Return (sources, targets, weights) of a graph with communities of about 40 people"""
+    random = np.random.default_rng(seed)
+    community = random.integers(0, max(1, people // 40), people)
+    members = [np.flatnonzero(community == c) for c in range(community.max() + 1)]
+    pairs = set()
+    while len(pairs) < people * links_per_person:
+        a = int(random.integers(people))
+        # Most connections are within a community
+        pool = members[community[a]] if random.random() < 0.9 else np.arange(people)
+        b = int(random.choice(pool))
+        if a != b:
+            pairs.add((min(a, b), max(a, b)))
+    pairs = np.array(sorted(pairs))
+    return pairs[:, 0], pairs[:, 1], random.uniform(0.2, 3, len(pairs))
+
+
+def timed(function, repeat):
+    """Return (median seconds, last result) of calling `function` `repeat` times"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--people', type=int, nargs='+', default=[300, 1000, 3000], help='Graph sizes')
+    parser.add_argument('--links-per-person', type=float, default=2.5, help='Connections per person')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the median is reported')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic graphs')
+    args = parser.parse_args()
+    if not layout.layout_available():
+        sys.exit('numpy is not installed')
+
+    for people in args.people:
+        sources, targets, weights = clustered_graph(people, args.links_per_person, args.seed)
+        random = np.random.default_rng(args.seed)
+        radius = layout.LINK_DISTANCE * math.sqrt(people)
+        initial = random.uniform(-radius, radius, (people, 2))
+        print(f'-- {people} people, {len(sources)} connections')
+
+        k2 = layout.LINK_DISTANCE ** 2
+        if people <= 5000:
+            exact_time, exact = timed(lambda: layout._exact_repulsion(initial, k2), args.repeat)
+            print(f'repulsion, exact         {exact_time * 1000:8.1f} ms')
+        tree_time, tree = timed(lambda: layout._barnes_hut_repulsion(initial, k2), args.repeat)
+        print(f'repulsion, Barnes-Hut    {tree_time * 1000:8.1f} ms')
+        if people <= 5000:
+            error = np.linalg.norm(tree - exact, axis=1) / np.linalg.norm(exact, axis=1)
+            print(f'  relative error         {np.median(error):8.4f} median, {error.max():.4f} max')
+
+        cold_time, cold = timed(lambda: layout.force_layout(
+            people, sources, targets, weights, initial, layout.COLD_ITERATIONS, layout.COLD_STEP), args.repeat)
+        print(f'cold layout              {cold_time * 1000:8.1f} ms')
+
+        # 1% more people, each connected to a random person already there
+        added = max(1, people // 100)
+        joined = random.integers(people, size=added)
+        warm_initial = np.vstack([cold, cold[joined] + random.normal(0, layout.LINK_DISTANCE / 4, (added, 2))])
+        warm_sources = np.concatenate([sources, np.arange(people, people + added)])
+        warm_targets = np.concatenate([targets, joined])
+        warm_weights = np.concatenate([weights, np.ones(added)])
+        warm_time, warm = timed(lambda: layout.force_layout(
+            people + added, warm_sources, warm_targets, warm_weights, warm_initial,
+            layout.WARM_ITERATIONS, layout.WARM_STEP), args.repeat)
+        shift = np.linalg.norm((warm[:people] - warm[:people].mean(axis=0)) - cold, axis=1)
+        extent = (cold.max(axis=0) - cold.min(axis=0)).max()
+        print(f'warm layout, +{added:<4} people {warm_time * 1000:8.1f} ms')
+        print(f'  people moved           {np.median(shift):8.1f} px median, of a {extent:.0f} px layout\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+Benchmark suite of the app's hot paths, with regression checks.
+
+Generates one synthetic account per data size in a temporary SQLite
+database and times:
+- analyze_sentiment and extract_potential_names over a corpus of entries;
+- highlighting that corpus with each account's name matcher;
+- creating and updating an entry through the API, and analyzing it;
+- every GET /api/visualizations/* endpoint, with the result, graph and
+  layout caches off.
+
+Results are saved as JSON. Given a baseline (the JSON of an earlier run
+on the same machine), every benchmark whose median got slower by more
+than the threshold is reported and the exit status is 1:
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --baseline before.json --threshold 0.2
+"""
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from benchmarks.synthetic import (ROOT, generate_account, logged_in_client, open_benchmark_app,
+                                  synthetic_entries, synthetic_people)
+
+SIZES = {
+    'small': {'people': 10, 'entries': 200},
+    'medium': {'people': 50, 'entries': 2000},
+    'large': {'people': 200, 'entries': 10000},
+}
+CORPUS_SIZE = 200
+DEFAULT_THRESHOLD = 0.2
+
+
+def measure(function, repeat, warmup=1):
+    """Time `function` and return its statistics in milliseconds"""
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': statistics.median(times),
+        'min_ms': min(times),
+        'mean_ms': statistics.fmean(times),
+        'stdev_ms': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'repeat': repeat
+    }
+
+
+def text_benchmarks(corpus):
+    """Yield (name, function) of the analysis functions, which don't depend on the data size"""
+    from utils import analyze_sentiment, extract_potential_names
+
+    yield 'analyze_sentiment', lambda: [analyze_sentiment(text) for text in corpus]
+    yield 'extract_potential_names', lambda: [extract_potential_names(text) for text in corpus]
+
+
+def account_benchmarks(app, account, corpus):
+    """Yield (name, function) of the benchmarks that run against one account"""
+    from sqlalchemy import func, select
+
+    from analysis import process_analysis_jobs
+    from app import db
+    from models import JournalEntry, journal_person
+    from utils import NameMatcher, extract_potential_names
+
+    matcher = NameMatcher(account['people'])
+    candidates = [[name for name in extract_potential_names(text) if name not in matcher.names]
+                  for text in corpus]
+    yield 'highlight', lambda: [matcher.highlight(text, names) for text, names in zip(corpus, candidates)]
+
+    client = logged_in_client(app, account['user_id'])
+    with app.app_context():
+        # The most mentioned person has the most data behind their visualizations
+        person_id = db.session.execute(
+            select(journal_person.c.person_id).join(JournalEntry).where(
+                JournalEntry.user_id == account['user_id']
+            ).group_by(journal_person.c.person_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        entry_id = db.session.execute(
+            select(func.max(JournalEntry.id)).where(JournalEntry.user_id == account['user_id'])
+        ).scalar()
+    people_ids = [person_id for person_id, _ in account['people'][:3]]
+
+    def request(method, url, **kwargs):
+        response = client.open(url, method=method, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} returned {response.status_code}: {response.get_data(as_text=True)}')
+        return response
+
+    texts = iter(corpus * 1000)
+
+    def create_entry():
+        request('POST', '/api/journal-entries', json={
+            'title': 'Benchmark entry', 'content': next(texts), 'interaction_type': 'meeting',
+            'people_ids': people_ids
+        })
+
+    def update_entry():
+        request('PUT', f'/api/journal-entries/{entry_id}', json={'content': next(texts)})
+
+    def analyze_entry():
+        create_entry()
+        with app.app_context():
+            process_analysis_jobs(limit=1)
+
+    yield 'entry_create', create_entry
+    yield 'entry_update', update_entry
+    # Start from an empty queue, so the job analyzed is the entry just created
+    with app.app_context():
+        while process_analysis_jobs():
+            pass
+    yield 'entry_create_and_analyze', analyze_entry
+
+    # What the front end fetches after saving an entry: only the changes since its last sync
+    token = request('GET', '/api/sync', query_string={'types': 'people'}).get_json()['token']
+
+    def update_entry_and_sync():
+        update_entry()
+        request('GET', '/api/sync', query_string={'since': token, 'types': 'entries,people'})
+
+    yield 'sync_full', lambda: request('GET', '/api/sync')
+    yield 'entry_update_and_sync', update_entry_and_sync
+
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if rule.rule.startswith('/api/visualizations/') and 'GET' in rule.methods:
+            # Paths go from the first person to the most mentioned one
+            url = (rule.rule.replace('<int:person_id>', str(person_id))
+                   .replace('<int:source_id>', str(people_ids[0])).replace('<int:target_id>', str(person_id)))
+            name = re.sub(r'/<int:\w+>', '', rule.rule.removeprefix('/api/'))
+            yield name, lambda url=url: request('GET', url)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the medians of `results` with those of `baseline`.
+
+    Returns (name, baseline ms, current ms, ratio) rows of the benchmarks in
+    both, and the names of those whose ratio is above 1 + `threshold`.
+    """
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['median_ms']
+        ratio = result['median_ms'] / before if before else float('inf')
+        rows.append((name, before, result['median_ms'], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='small,medium',
+                        help=f'Comma-separated data sizes to run, of {", ".join(SIZES)} (default: small,medium)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark; the median is compared')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the synthetic data')
+    parser.add_argument('--filter', help='Only run benchmarks whose name matches this regular expression')
+    parser.add_argument('--output', default='bench_results.json', help='File to save the results to')
+    parser.add_argument('--baseline', help='Results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Slowdown counted as a regression, as a fraction (default: {DEFAULT_THRESHOLD})')
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f'Unknown sizes: {", ".join(unknown)}')
+    selected = re.compile(args.filter) if args.filter else None
+
+    app = open_benchmark_app(RESULT_CACHE='none', GRAPH_CACHE_MAX_ENTRIES=0, LAYOUT_CACHE_MAX_ENTRIES=0)
+    corpus = [record['content'] for record in
+              synthetic_entries(synthetic_people(20, args.seed), CORPUS_SIZE, args.seed)]
+    results = {}
+
+    def run(name, function):
+        if selected and not selected.search(name):
+            return
+        results[name] = measure(function, args.repeat)
+        print(f'{name:<60} {results[name]["median_ms"]:10.2f} ms', flush=True)
+
+    for name, function in text_benchmarks(corpus):
+        run(name, function)
+    for size in sizes:
+        with app.app_context():
+            start = time.perf_counter()
+            account = generate_account(f'bench-{size}', seed=args.seed, **SIZES[size])
+        print(f'-- {size}: {account["entries"]} entries, {len(account["people"])} people, '
+              f'{account["connections"]} connections, generated in {time.perf_counter() - start:.1f}s', flush=True)
+        for name, function in account_benchmarks(app, account, corpus):
+            run(f'{size}/{name}', function)
+
+    from json_provider import orjson
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'orjson': orjson is not None,
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'corpus_size': CORPUS_SIZE,
+                'sizes': {size: SIZES[size] for size in sizes}
+            },
+            'results': results
+        }, f, indent=2, sort_keys=True)
+    print(f'\nSaved results to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        rows, regressions = compare(results, baseline, args.threshold)
+        print(f'\n{"benchmark":<60} {"baseline":>10} {"current":>10} {"change":>8}')
+        for name, before, after, ratio in rows:
+            flag = '  REGRESSION' if name in regressions else ''
+            print(f'{name:<60} {before:10.2f} {after:10.2f} {ratio - 1:+8.1%}{flag}')
+        if regressions:
+            print(f'\n{len(regressions)} of {len(rows)} benchmarks are more than {args.threshold:.0%} slower')
+            sys.exit(1)
+        print(f'\nNo benchmark is more than {args.threshold:.0%} slower')
+
+
+if __name__ == '__main__':
+    main()
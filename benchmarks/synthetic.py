@@ -0,0 +1,223 @@
+"""
+Seeded generator of realistic synthetic accounts for benchmarks.
+
+People are split into circles (family, friends, colleagues...) and most
+entries mention a few people of one circle, so co-mentions, and with them
+connections, cluster the way they do in real journals. Entry text mixes
+neutral filler, sentiment words and phrases of the analysis lexicon, and
+capitalized names of people who aren't in the account, which name
+extraction picks up. The same seed always produces the same account.
+"""
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from itertools import combinations
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = [
+    'Alice', 'Amir', 'Ana', 'Ben', 'Bianca', 'Carlos', 'Chen', 'Chloe', 'Daniel', 'Dara', 'Elena', 'Emeka',
+    'Fatima', 'Felix', 'Grace', 'Hana', 'Hugo', 'Ines', 'Isaac', 'Jada', 'Jonas', 'Kai', 'Keiko', 'Liam',
+    'Lucia', 'Mateo', 'Maya', 'Mary Ann', 'Nadia', 'Nils', 'Omar', 'Olivia', 'Pablo', 'Priya', 'Quinn',
+    'Rosa', 'Ravi', 'Sofia', 'Sam', 'Tariq', 'Tessa', 'Uma', 'Victor', 'Wen', 'Xavier', 'Yara', 'Yusuf', 'Zoe'
+]
+LAST_NAMES = [
+    'Adams', 'Baker', 'Costa', 'Diaz', 'Evans', 'Fischer', 'Garcia', 'Haddad', 'Ito', 'Jensen', 'Kim',
+    'Lopez', 'Moreau', 'Nakamura', 'Okafor', 'Patel', 'Rossi', 'Silva', 'Tanaka', 'Weber'
+]
+# Names that appear in entries without being one of the account's people
+STRANGER_NAMES = ['Brenda', 'Gerald', 'Marisol', 'Theo', 'Wilhelmina', 'Ezra', 'Lorenzo', 'Ottilie']
+
+CIRCLES = [('family', 0.25), ('friend', 0.35), ('colleague', 0.3), ('acquaintance', 0.1)]
+MOODS = ['happy', 'sad', 'neutral', 'anxious', 'excited', 'grateful', 'tired', None]
+INTERACTIONS = ['meeting', 'call', 'message', 'event', 'meal', None]
+
+FILLER = ('we talked about work and family for a long time after dinner and then walked home through the '
+          'park while it started to rain so we stopped for coffee and caught up on the news from the '
+          'neighborhood and plans for the weekend').split()
+POSITIVE = ['really enjoyed', 'had a great time', 'was so thoughtful', 'made me laugh', 'wonderful', 'happy',
+            'grateful for', 'went well', 'relaxed', 'proud of']
+NEGATIVE = ['was rude', 'felt awkward', 'frustrated', 'worried about', 'disappointed', 'upset', 'tired',
+            "didn't go well", 'annoyed', 'concerned about']
+WHEN = ['on Monday', 'last Friday', 'in June', 'on Sunday', 'in December', 'yesterday', 'this morning']
+
+
+def synthetic_people(count, seed=1):
+    """Return `count` unique (name, relationship_type, circle index) tuples"""
+    rng = random.Random(seed)
+    names = list(FIRST_NAMES)
+    rng.shuffle(names)
+    full_names = [f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES]
+    rng.shuffle(full_names)
+    names = (names + full_names)[:count]
+    if len(names) < count:
+        raise ValueError(f'At most {len(FIRST_NAMES) * (len(LAST_NAMES) + 1)} synthetic people are supported')
+
+    circles = rng.choices(range(len(CIRCLES)), weights=[weight for _, weight in CIRCLES], k=count)
+    return [(name, CIRCLES[circle][0], circle) for name, circle in zip(names, circles)]
+
+
+def _sentence(rng, mentioned, mood):
+    words = rng.choices(FILLER, k=rng.randint(5, 14))
+    words.insert(rng.randrange(len(words) + 1), rng.choice(mentioned))
+    roll = rng.random()
+    if roll < 0.35 + mood:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(POSITIVE))
+    elif roll < 0.7:
+        words.insert(rng.randrange(len(words) + 1), rng.choice(NEGATIVE))
+    if rng.random() < 0.1:
+        words.insert(rng.randrange(1, len(words) + 1), rng.choice(STRANGER_NAMES))
+    if rng.random() < 0.15:
+        words.append(rng.choice(WHEN))
+    sentence = ' '.join(words)
+    return sentence[0].upper() + sentence[1:] + '.'
+
+
+def synthetic_entries(people, count, seed=1, end=datetime(2024, 12, 31), days=730):
+    """
+    Yield `count` entry records in the import format, oldest first.
+
+    `people` are synthetic_people() tuples. Each entry mentions one to four
+    people, mostly from a single circle, and 80% have an interaction type,
+    which connects the people they mention.
+    """
+    rng = random.Random(seed)
+    by_circle = {}
+    for name, _, circle in people:
+        by_circle.setdefault(circle, []).append(name)
+    circles = list(by_circle)
+    weights = [CIRCLES[circle][1] for circle in circles]
+    # Each person has a general mood towards them, some people are liked more
+    moods = {name: rng.uniform(-0.3, 0.3) for name, _, _ in people}
+    start = end - timedelta(days=days)
+
+    for index in range(count):
+        members = by_circle[rng.choices(circles, weights)[0]]
+        mentioned = rng.sample(members, min(len(members), rng.choices([1, 2, 3, 4], [4, 3, 2, 1])[0]))
+        if rng.random() < 0.15:
+            mentioned.append(rng.choice(people)[0])
+        mentioned = list(dict.fromkeys(mentioned))
+        mood = sum(moods[name] for name in mentioned) / len(mentioned)
+
+        sentences = [_sentence(rng, mentioned, mood) for _ in range(rng.randint(2, 10))]
+        date_created = start + timedelta(seconds=int(days * 86400 * (index + rng.random()) / count))
+        yield {
+            'title': f'{rng.choice(["Time with", "Talked to", "Saw", "Catching up with"])} {mentioned[0]}',
+            'content': ' '.join(sentences),
+            'date_created': date_created.isoformat(),
+            'mood': rng.choice(MOODS),
+            'interaction_type': rng.choices(INTERACTIONS, [2, 2, 2, 1, 1, 2])[0],
+            'people': mentioned
+        }
+
+
+def open_benchmark_app(directory=None, **config):
+    """
+    Create an app on a fresh SQLite database in `directory` and migrate it.
+
+    Keyword arguments override the app's config. Background analysis is
+    turned off; drain the queue with analysis.process_analysis_jobs.
+    """
+    from flask_migrate import upgrade
+
+    from app import create_app
+
+    directory = directory or tempfile.mkdtemp(prefix='journal-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'journal.db'),
+        'SECRET_KEY': 'benchmark',
+        'ANALYSIS_WORKER': False,
+        'MIGRATIONS': True,
+        **config
+    })
+    with app.app_context():
+        upgrade(os.path.join(ROOT, 'migrations'))
+    return app
+
+
+def generate_account(username, people=20, entries=500, connection_density=0.3, seed=1, workers=1):
+    """
+    Create a user with `people` people and `entries` analyzed entries.
+
+    Entries are written with import_journal, so stats, highlights and the
+    connections between co-mentioned people are what saving them one by one
+    would produce. Then `connection_density` of all pairs of people in the
+    same circle (and a tenth of that across circles) get a described
+    connection with a relationship type and closeness, as if the user had
+    edited them. Run it inside an app context.
+
+    Returns {'user_id', 'people': [(id, name)], 'entries', 'connections'}.
+    """
+    from sqlalchemy import func
+
+    from app import db
+    from connections import connection_pair
+    from data_version import bump_data_version
+    from importer import import_journal
+    from models import Person, PersonConnection, User, dialect_insert
+
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password(username)
+    db.session.add(user)
+    db.session.flush()
+
+    generated = synthetic_people(people, seed)
+    rows = [Person(name=name, relationship_type=relationship_type, user_id=user.id)
+            for name, relationship_type, _ in generated]
+    db.session.add_all(rows)
+    db.session.flush()
+    user_id = user.id
+    person_ids = [person.id for person in rows]
+    db.session.commit()
+
+    records = (json.dumps(record) for record in synthetic_entries(generated, entries, seed))
+    for _ in import_journal(user_id, records, workers=workers):
+        pass
+
+    version = bump_data_version([user_id])[user_id]
+    rng = random.Random(seed)
+    described = []
+    for (person_id, (_, relationship_type, circle)), (other_id, (_, _, other_circle)) in combinations(
+            zip(person_ids, generated), 2):
+        if rng.random() < connection_density * (1 if circle == other_circle else 0.1):
+            source_id, target_id = connection_pair(person_id, other_id)
+            described.append({
+                'source_id': source_id,
+                'target_id': target_id,
+                'relationship_type': relationship_type if circle == other_circle else 'acquaintance',
+                'closeness': rng.randint(1, 10),
+                'notes': None,
+                'sentiment': 0,
+                'interaction_count': 0,
+                'mention_count': 0,
+                'last_updated': datetime.utcnow(),
+                'sync_version': version
+            })
+    table = PersonConnection.__table__
+    for start in range(0, len(described), 500):
+        insert = dialect_insert(table).values(described[start:start + 500])
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=[table.c.source_id, table.c.target_id],
+            set_={'relationship_type': insert.excluded.relationship_type, 'closeness': insert.excluded.closeness,
+                  'sync_version': insert.excluded.sync_version}
+        ))
+    db.session.commit()
+
+    return {
+        'user_id': user_id,
+        'people': [(person_id, name) for person_id, (name, _, _) in zip(person_ids, generated)],
+        'entries': entries,
+        'connections': db.session.query(func.count(PersonConnection.id)).filter(
+            PersonConnection.source_id.in_(person_ids)).scalar()
+    }
+
+
+def logged_in_client(app, user_id):
+    """Return a test client with `user_id` logged in"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
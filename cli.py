@@ -0,0 +1,235 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+from app import db
+from data_version import bump_data_version
+from analysis import (REANALYZE_BATCH_SIZE, AnalysisWorker, analysis_queue_stats, process_analysis_jobs,
+                      reanalyze_entries, retry_failed_analysis)
+from importer import DEFAULT_IMPORT_BATCH_SIZE, JournalImportError, import_journal
+from models import User
+from stats import rebuild_person_stats
+from sync import DEFAULT_TOMBSTONE_DAYS, prune_tombstones
+from utils import ChunkedPool, analyze_contents, analyze_sentiment
+
+# Commands are registered at the top level of `flask`, e.g. `flask reanalyze`
+commands = Blueprint('commands', __name__, cli_group=None)
+
+SENTIMENT_CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'sentiment_corpus.json')
+
+
+@commands.cli.command('check-sentiment')
+@click.option('--corpus', 'corpus_path', default=SENTIMENT_CORPUS_PATH,
+              type=click.Path(exists=True, dir_okay=False),
+              help='JSON list of {"text", "score"} cases to replay.')
+def check_sentiment(corpus_path):
+    """
+    Replay the sentiment regression corpus against analyze_sentiment.
+
+    The expected scores were recorded from the original per-keyword
+    implementation, so every case must match exactly.
+    """
+    with open(corpus_path, encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    failures = 0
+    for i, case in enumerate(corpus):
+        score = analyze_sentiment(case['text'])
+        if score != case['score']:
+            failures += 1
+            click.echo(f'#{i}: expected {case["score"]!r}, got {score!r}: {case["text"][:60]!r}')
+
+    click.echo(f'{len(corpus) - failures}/{len(corpus)} sentiment cases match')
+    if failures:
+        raise SystemExit(1)
+
+
+@commands.cli.command('rebuild-person-stats')
+@click.option('--user-id', type=int, default=None, help='Only rebuild the stats of this user\'s people.')
+def rebuild_person_stats_command(user_id):
+    """Rebuild the per-person stats tables from journal_person."""
+    rebuild_person_stats(user_id)
+    bump_data_version(None if user_id is None else [user_id])
+    db.session.commit()
+    click.echo('Person stats rebuilt')
+
+
+@commands.cli.command('prune-sync-tombstones')
+@click.option('--days', type=click.IntRange(min=0), default=DEFAULT_TOMBSTONE_DAYS, show_default=True,
+              help='Keep the tombstones of deletes made in the last this many days.')
+def prune_sync_tombstones_command(days):
+    """Delete old tombstones of deleted records; clients that synced before them get a full sync."""
+    pruned = prune_tombstones(datetime.utcnow() - timedelta(days=days))
+    db.session.commit()
+    click.echo(f'{pruned} tombstones pruned')
+
+
+@commands.cli.command('import-journal')
+@click.argument('source', type=click.File('rb'))
+@click.option('--user', 'username', required=True, help='Username to import the entries for.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_IMPORT_BATCH_SIZE, show_default=True,
+              help='Lines written per transaction.')
+@click.option('--workers', type=click.IntRange(min=1), default=None,
+              help='Processes analyzing entries. [default: number of CPUs]')
+@click.option('--skip', type=click.IntRange(min=0), default=None,
+              help='Skip this many lines. [default: resume from the checkpoint]')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), default=None,
+              help='File recording the lines imported so far. [default: SOURCE.checkpoint]')
+def import_journal_command(source, username, batch_size, workers, skip, checkpoint_path):
+    """
+    Import journal entries from an NDJSON file (- for stdin).
+
+    Progress is checkpointed after every committed batch, so an interrupted
+    import continues where it stopped when run again with the same
+    arguments. The checkpoint is removed once the import completes.
+    """
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f'No user named {username!r}', param_hint='--user')
+
+    if checkpoint_path is None and source.name != '<stdin>':
+        checkpoint_path = f'{source.name}.checkpoint'
+
+    if skip is None:
+        skip = 0
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint['user_id'] != user.id:
+                raise click.ClickException(f'{checkpoint_path} belongs to another user\'s import')
+            skip = checkpoint['lines']
+            click.echo(f'Resuming after line {skip}')
+
+    started = time.monotonic()
+    progress = {'lines': skip, 'imported': 0, 'failed': 0}
+    try:
+        for progress in import_journal(user.id, source, skip, batch_size, workers or os.cpu_count()):
+            if checkpoint_path:
+                with open(checkpoint_path, 'w', encoding='utf-8') as f:
+                    json.dump({'user_id': user.id, 'lines': progress['lines']}, f)
+            for error in progress['errors']:
+                click.echo(f'line {error["line"]}: {error["error"]}', err=True)
+            rate = progress['imported'] / max(time.monotonic() - started, 1e-9)
+            click.echo(f'{progress["lines"]} lines, {progress["imported"]} imported, '
+                       f'{progress["failed"]} failed ({rate:.0f} entries/s)')
+    except JournalImportError as e:
+        resume = 'Run the command again' if checkpoint_path else f'Pass --skip {e.resume_from}'
+        raise click.ClickException(f'{e}\n{resume} to resume after line {e.resume_from}.')
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    click.echo(f'Imported {progress["imported"]} entries, {progress["failed"]} failed')
+
+
+@commands.cli.command('analysis-worker')
+@click.option('--processes', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Processes analyzing each batch of entries.')
+@click.option('--poll-interval', type=click.FloatRange(min=0.1), default=2.0, show_default=True,
+              help='Seconds between checks of an empty queue.')
+@click.option('--drain', is_flag=True, help='Exit once the queue is empty.')
+def analysis_worker_command(processes, poll_interval, drain):
+    """
+    Analyze queued journal entries.
+
+    Use it with ANALYSIS_WORKER=0 to take analysis out of the server
+    processes. Several workers can run at once.
+    """
+    if drain:
+        total = 0
+        with ChunkedPool(analyze_contents, processes) as pool:
+            while True:
+                count = process_analysis_jobs(pool=pool)
+                if not count:
+                    break
+                total += count
+        click.echo(f'Analyzed {total} entries')
+        return
+
+    worker = AnalysisWorker(current_app._get_current_object(), poll_interval=poll_interval, processes=processes)
+    worker.start()
+    click.echo(f'Analysis worker running with {processes} process(es), Ctrl+C to stop')
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
+        worker.join()
+
+
+@commands.cli.command('analysis-queue')
+def analysis_queue_command():
+    """Show the depth and lag of the analysis queue."""
+    stats = analysis_queue_stats()
+    click.echo(f'{stats["depth"]} queued ({stats["claimed"]} claimed, {stats["failed"]} failed), '
+               f'oldest queued {stats["lag_seconds"]:.1f}s ago')
+
+
+@commands.cli.command('reanalyze')
+@click.option('--user', 'username', default=None, help='Only reanalyze this user\'s entries.')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Only entries created on or after this date (YYYY-MM-DD).')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Only entries created on or before this date (YYYY-MM-DD).')
+@click.option('--batch-size', type=click.IntRange(min=1), default=REANALYZE_BATCH_SIZE, show_default=True,
+              help='Entries per batch and transaction.')
+@click.option('--workers', type=click.IntRange(min=1), default=None,
+              help='Processes analyzing entries. [default: number of CPUs]')
+@click.option('--checkpoint', 'checkpoint_path', type=click.Path(dir_okay=False), default='reanalyze.checkpoint',
+              show_default=True, help='File recording the last entry id done.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first entry.')
+def reanalyze_command(username, since, until, batch_size, workers, checkpoint_path, restart):
+    """
+    Recompute the sentiment, highlights and extracted names of stored entries.
+
+    Run it after changing the sentiment lexicon or name rules. Progress is
+    checkpointed after every batch, so an interrupted run continues where it
+    stopped when run again with the same filters. Entries whose queued
+    analysis failed are queued again for the analysis worker.
+    """
+    user_id = None
+    if username is not None:
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.BadParameter(f'No user named {username!r}', param_hint='--user')
+        user_id = user.id
+
+    filters = {
+        'user_id': user_id,
+        'since': since.date().isoformat() if since else None,
+        'until': until.date().isoformat() if until else None
+    }
+    after_id = 0
+    if not restart and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint['filters'] != filters:
+            raise click.ClickException(f'{checkpoint_path} is for a run with other filters; use --restart')
+        after_id = checkpoint['last_id']
+        click.echo(f'Resuming after entry {after_id}')
+
+    date_to = until + timedelta(days=1) if until else None
+    retried = retry_failed_analysis(user_id, since, date_to)
+    db.session.commit()
+    if retried:
+        click.echo(f'{retried} failed entries queued for analysis again')
+
+    started = time.monotonic()
+    progress = {'entries': 0, 'changed': 0}
+    for progress in reanalyze_entries(
+            user_id, since, date_to, after_id,
+            batch_size, workers or os.cpu_count()):
+        with open(checkpoint_path, 'w', encoding='utf-8') as f:
+            json.dump({'filters': filters, 'last_id': progress['last_id']}, f)
+        rate = progress['entries'] / max(time.monotonic() - started, 1e-9)
+        click.echo(f'{progress["entries"]} entries, {progress["changed"]} changed, '
+                   f'up to id {progress["last_id"]} ({rate:.0f} entries/s)')
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.monotonic() - started
+    click.echo(f'Reanalyzed {progress["entries"]} entries, {progress["changed"]} changed, in {elapsed:.1f}s '
+               f'({progress["entries"] / max(elapsed, 1e-9):.0f} entries/s)')
@@ -0,0 +1,84 @@
+import gzip
+
+from flask import request
+
+from instrumentation import timed_phase
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; responses are only gzipped without it
+    brotli = None
+
+# Content types worth compressing; everything else (images, fonts) already is
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'application/x-ndjson', 'image/svg+xml',
+    'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain'
+}
+# Supported encodings, preferred first when the client accepts several equally
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def _compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BROTLI_QUALITY'])
+    # mtime=0 keeps the output, and so the response, the same for the same body
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def encoded_etag(etag, encoding):
+    """The ETag of the `encoding`-compressed representation of a body tagged `etag`"""
+    return f'{etag}-{encoding}'
+
+
+def matching_etag(etag):
+    """
+    Return the tag in If-None-Match that matches `etag` in any encoding, or None.
+
+    Compressed responses carry an encoding-specific ETag (see encoded_etag),
+    which is what the client sends back, so a 304 has to look for every form.
+    """
+    if_none_match = request.if_none_match
+    for tag in (etag, *(encoded_etag(etag, encoding) for encoding in CONTENT_ENCODINGS)):
+        if if_none_match.contains(tag):
+            return tag
+    return None
+
+
+def init_compression(app):
+    """
+    Compress large responses with the best encoding the client accepts.
+
+    Complete 200 responses of a compressible type of at least
+    COMPRESS_MIN_SIZE bytes are brotli-compressed if the brotli module is
+    installed and the client prefers it, and gzipped otherwise. Streamed
+    and file responses are left alone, since they'd have to be buffered.
+    A strong ETag gets the encoding appended, so each representation has
+    its own. Register it before after_request hooks that change the body,
+    so it runs after them.
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers):
+            return response
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(CONTENT_ENCODINGS)
+        if encoding is None:
+            return response
+
+        with timed_phase('compress'):
+            response.set_data(_compress(data, encoding, app.config))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(encoded_etag(etag, encoding))
+        return response
@@ -0,0 +1,112 @@
+from datetime import datetime
+from itertools import combinations
+
+from app import db
+from models import PersonConnection, dialect_insert
+
+
+def connection_pair(person_id, other_id):
+    """Return the canonical (source_id, target_id) key of a connection, with source_id < target_id"""
+    return (person_id, other_id) if person_id < other_id else (other_id, person_id)
+
+
+def record_entry_connections(person_ids, sentiment_score, sync_version):
+    """
+    Record that the given people interacted together in one journal entry.
+
+    Every pair of people gets one more interaction and mention, and the
+    entry's sentiment is folded into the pair's average sentiment. Missing
+    pairs are created. All pairs are written with a single upsert on the
+    unique (source_id, target_id) index, so concurrent saves of the same pair
+    can't create duplicate connections. `sync_version` is the people's user's
+    data version from bump_data_version.
+    """
+    record_entries_connections([(person_ids, sentiment_score)], sync_version)
+
+
+def record_entries_connections(entries, sync_version):
+    """
+    Record the interactions of many journal entries of one user at once.
+
+    `entries` is an iterable of (person_ids, sentiment_score) tuples. The
+    interactions are aggregated per pair first, so a pair mentioned in many
+    entries is written once with its total count and mean sentiment, which
+    is then weighted into the stored average.
+    """
+    totals = {}
+    for person_ids, sentiment_score in entries:
+        for pair in combinations(sorted(set(person_ids)), 2):
+            count, sentiment_sum = totals.get(pair, (0, 0))
+            totals[pair] = (count + 1, sentiment_sum + sentiment_score)
+    if not totals:
+        return
+
+    now = datetime.utcnow()
+    table = PersonConnection.__table__
+    insert = dialect_insert(table).values([
+        {
+            'source_id': source_id,
+            'target_id': target_id,
+            'relationship_type': 'unknown',  # Default
+            'closeness': 1,  # Start with a low closeness
+            'sentiment': sentiment_sum / count,
+            'interaction_count': count,
+            'mention_count': count,
+            'last_updated': now,
+            'sync_version': sync_version
+        }
+        for (source_id, target_id), (count, sentiment_sum) in sorted(totals.items())
+    ])
+    excluded = insert.excluded
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.source_id, table.c.target_id],
+        set_={
+            'interaction_count': table.c.interaction_count + excluded.interaction_count,
+            # Update sentiment with a weighted average
+            'sentiment': (db.func.coalesce(table.c.sentiment, 0) * table.c.mention_count
+                          + excluded.sentiment * excluded.mention_count)
+                         / (table.c.mention_count + excluded.mention_count),
+            'mention_count': table.c.mention_count + excluded.mention_count,
+            'last_updated': excluded.last_updated,
+            'sync_version': excluded.sync_version
+        }
+    ))
+
+
+def save_connection(source_id, target_id, sync_version, relationship_type=None, sentiment=None,
+                    closeness=None, notes=None):
+    """
+    Create the connection between two people, or update the one they have, and return its id.
+
+    Like the connections page, a new connection gets defaults for what isn't
+    given, while an existing one only changes what is (a relationship type
+    and notes only when not empty). It is one upsert on the unique
+    (source_id, target_id) index, so concurrent saves of the same pair can't
+    collide. `source_id` and `target_id` must be a connection_pair.
+    """
+    table = PersonConnection.__table__
+    insert = dialect_insert(table).values(
+        source_id=source_id,
+        target_id=target_id,
+        relationship_type=relationship_type or 'Unknown',
+        sentiment=sentiment or 0,
+        closeness=closeness or 1,
+        notes=notes,
+        interaction_count=0,
+        mention_count=0,
+        last_updated=datetime.utcnow(),
+        sync_version=sync_version
+    )
+    excluded = insert.excluded
+    changes = {'last_updated': excluded.last_updated, 'sync_version': excluded.sync_version}
+    if relationship_type:
+        changes['relationship_type'] = excluded.relationship_type
+    if sentiment is not None:
+        changes['sentiment'] = excluded.sentiment
+    if closeness is not None:
+        changes['closeness'] = excluded.closeness
+    if notes:
+        changes['notes'] = excluded.notes
+    return db.session.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.source_id, table.c.target_id], set_=changes
+    ).returning(table.c.id)).scalar_one()
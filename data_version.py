@@ -0,0 +1,83 @@
+import hashlib
+from functools import wraps
+
+from flask import g, make_response, request
+from flask_login import current_user
+from sqlalchemy import literal, select
+
+from app import db
+from compression import matching_etag
+from models import DataVersion, User, dialect_insert
+
+# Bump when the format of versioned responses changes, so clients don't keep
+# using bodies cached under the same data version
+RESPONSE_FORMAT = 1
+
+
+def bump_data_version(user_ids=None):
+    """
+    Advance the data version of `user_ids`, or of every user if None.
+
+    Call it in the same transaction as any write to a user's entries, people
+    or connections (or data derived from them), so a new version is only
+    visible together with the data it describes. Returns {user_id: version}
+    of the new versions, to stamp the written rows' sync_version with. The
+    version rows stay locked until the transaction ends, so versions of a
+    user are committed in order.
+    """
+    table = DataVersion.__table__
+    if user_ids is None:
+        # SQLite needs a WHERE clause to parse INSERT ... SELECT ... ON CONFLICT
+        every_user = select(User.id, literal(1)).where(User.id.is_not(None))
+        insert = dialect_insert(table).from_select(['user_id', 'version'], every_user)
+    else:
+        user_ids = sorted(set(user_ids))
+        if not user_ids:
+            return {}
+        insert = dialect_insert(table).values([{'user_id': user_id, 'version': 1} for user_id in user_ids])
+    return dict(db.session.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={'version': table.c.version + 1}
+    ).returning(table.c.user_id, table.c.version)).all())
+
+
+def get_data_version(user_id):
+    """Return a user's current data version, 0 if their data never changed"""
+    return db.session.execute(
+        select(DataVersion.version).where(DataVersion.user_id == user_id)
+    ).scalar() or 0
+
+
+def data_version_etag(view):
+    """
+    Answer conditional GETs of a per-user view from the data version alone.
+
+    The strong ETag combines the user's data version with the request path
+    and query string. When If-None-Match matches, a 304 is returned without
+    calling the view. The version is read before the view runs, so a body is
+    never labelled with a version newer than its data, and it is kept in
+    g.data_version for the view. Compressed bodies get the encoding
+    appended to the ETag, and a 304 matches either form. Put it below
+    @login_required.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = g.data_version = get_data_version(current_user.id)
+        key = f'{RESPONSE_FORMAT}:{current_user.id}:{request.full_path}'
+        etag = f'{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}'
+
+        matched = matching_etag(etag)
+        if matched is not None:
+            response = make_response('', 304)
+            # Echo the client's tag, which names the encoding it has
+            etag = matched
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        # Let the browser keep the body but check back on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+    return wrapper
@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+
+from sqlalchemy import or_, select
+
+from app import db
+from models import JournalEntry, Person, PersonConnection, journal_person
+from sync import in_sync_window
+
+EXPORT_TYPES = ('people', 'entries', 'connections')
+EXPORT_BATCH_SIZE = 500
+
+# Columns of each record type, in CSV column order
+EXPORT_FIELDS = {
+    'people': ('id', 'name', 'relationship_type', 'description', 'date_added'),
+    'entries': ('id', 'title', 'content', 'date_created', 'mood', 'sentiment_score',
+                'interaction_type', 'people_ids', 'people'),
+    'connections': ('id', 'source_id', 'target_id', 'relationship_type', 'closeness', 'sentiment',
+                    'notes', 'interaction_count', 'mention_count', 'last_updated')
+}
+
+
+def _stream(statement):
+    """
+    Execute `statement` and yield its rows in batches.
+
+    yield_per streams the rows with a server-side cursor where the database
+    supports one, so only one batch is held in memory at a time.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for rows in result.partitions():
+        yield rows
+
+
+def _iter_people(user_id, since, version):
+    statement = select(*[getattr(Person, field) for field in EXPORT_FIELDS['people']]).filter_by(
+        user_id=user_id).order_by(Person.id)
+    statement = in_sync_window(statement, Person.sync_version, since, version)
+    for rows in _stream(statement):
+        for row in rows:
+            yield dict(row._mapping)
+
+
+def _iter_entries(user_id, since, version):
+    columns = [getattr(JournalEntry, field) for field in EXPORT_FIELDS['entries'][:-2]]
+    statement = select(*columns).filter_by(user_id=user_id).order_by(JournalEntry.id)
+    statement = in_sync_window(statement, JournalEntry.sync_version, since, version)
+
+    for rows in _stream(statement):
+        # Look up the people of each batch of entries with one query
+        people = {row.id: ([], []) for row in rows}
+        links = db.session.execute(
+            select(journal_person.c.journal_entry_id, Person.id, Person.name).join(
+                Person, Person.id == journal_person.c.person_id
+            ).where(journal_person.c.journal_entry_id.in_(list(people))).order_by(Person.id)
+        )
+        for entry_id, person_id, name in links:
+            people[entry_id][0].append(person_id)
+            people[entry_id][1].append(name)
+
+        for row in rows:
+            record = dict(row._mapping)
+            record['people_ids'], record['people'] = people[row.id]
+            yield record
+
+
+def _iter_connections(user_id, since, version):
+    person_ids = select(Person.id).filter_by(user_id=user_id)
+    statement = select(*[getattr(PersonConnection, field) for field in EXPORT_FIELDS['connections']]).where(
+        or_(PersonConnection.source_id.in_(person_ids), PersonConnection.target_id.in_(person_ids))
+    ).order_by(PersonConnection.id)
+    statement = in_sync_window(statement, PersonConnection.sync_version, since, version)
+    for rows in _stream(statement):
+        for row in rows:
+            yield dict(row._mapping)
+
+
+_ITERATORS = {'people': _iter_people, 'entries': _iter_entries, 'connections': _iter_connections}
+
+
+def iter_export(user_id, version, types=EXPORT_TYPES, since=None):
+    """
+    Yield (type, record) for a user's data at data version `version`, one type after the other.
+
+    Records are plain dicts with the EXPORT_FIELDS of their type. Entries
+    list their people's ids and names, so an entries export can be fed back
+    to import_journal. With `since`, a data version as in a sync token, only
+    records added or changed after it are exported, like a sync would send
+    them; deletions aren't. Read `version` before the data, so a change
+    committed meanwhile is exported again next time rather than missed.
+    """
+    for record_type in types:
+        for record in _ITERATORS[record_type](user_id, since, version):
+            yield record_type, record
+
+
+def _export_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def export_ndjson(user_id, version, types=EXPORT_TYPES, since=None):
+    """Yield NDJSON lines of a user's data, each record tagged with its 'type'"""
+    for record_type, record in iter_export(user_id, version, types, since):
+        line = {'type': record_type}
+        line.update((key, _export_value(value)) for key, value in record.items())
+        yield json.dumps(line) + '\n'
+
+
+def export_csv(user_id, version, record_type, since=None):
+    """
+    Yield CSV text of one type of a user's data, starting with a header row.
+
+    List columns (an entry's people_ids and people) are JSON-encoded.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    fields = EXPORT_FIELDS[record_type]
+    writer.writerow(fields)
+    for _, record in iter_export(user_id, version, [record_type], since):
+        writer.writerow([
+            json.dumps(value) if isinstance(value, list) else _export_value(value)
+            for value in (record[field] for field in fields)
+        ])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
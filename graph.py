@@ -0,0 +1,313 @@
+import heapq
+import math
+import threading
+from array import array
+from functools import cached_property
+
+from flask import current_app
+from sqlalchemy import select
+
+from app import db
+from instrumentation import timed_phase
+from models import Person, PersonConnection
+from result_cache import DEFAULT_TTL, MemoryCache
+
+# Closeness assumed for connections without one, on its 1-10 scale
+DEFAULT_CLOSENESS = 5
+PAGERANK_DAMPING = 0.85
+PAGERANK_TOLERANCE = 1e-9
+PAGERANK_MAX_ITERATIONS = 100
+COMMUNITY_MAX_ITERATIONS = 50
+DEFAULT_GRAPH_CACHE_ENTRIES = 256
+# Key of the graph in the graph cache, which holds one graph per user
+GRAPH_KEY = 'graph'
+
+
+def connection_weight(closeness, sentiment, interaction_count):
+    """
+    Return the strength of a connection, always above 0.
+
+    Closeness (1-10) scales it linearly, sentiment (-1 to 1) by 0.5 to 1.5,
+    and shared entries logarithmically, so the first few interactions count
+    for more than the hundredth.
+    """
+    closeness = min(max(closeness if closeness is not None else DEFAULT_CLOSENESS, 1), 10)
+    sentiment = min(max(sentiment or 0, -1), 1)
+    return closeness / 10 * (1 + sentiment / 2) * (1 + math.log1p(max(interaction_count or 0, 0)))
+
+
+class Graph:
+    """
+    A user's social web as an undirected, weighted graph in CSR form.
+
+    People are numbered 0..n-1 in id order. The neighbors of person i are
+    neighbors[offsets[i]:offsets[i + 1]], and the strengths of those
+    connections (see connection_weight) are at the same positions in
+    weights; each connection is stored once from either side. A graph isn't
+    changed once built, so its metrics are computed on first use and kept.
+
+    The algorithms are plain Python loops over per-node adjacency lists,
+    without numpy: a PageRank over 3,000 people and 7,500 connections takes
+    about a tenth of a second, which the graph cache pays once per change.
+    """
+
+    def __init__(self, people, connections):
+        """
+        `people` is a list of (id, name) ordered by id, `connections` a list
+        of (source_id, target_id, weight); connections to unknown people and
+        loops are ignored.
+        """
+        self.ids = array('q', [person_id for person_id, _ in people])
+        self.names = [name for _, name in people]
+        self.index = {person_id: i for i, person_id in enumerate(self.ids)}
+
+        n = len(self.ids)
+        edges = []
+        degrees = [0] * n
+        for source_id, target_id, weight in connections:
+            source, target = self.index.get(source_id), self.index.get(target_id)
+            if source is None or target is None or source == target:
+                continue
+            edges.append((source, target, weight))
+            degrees[source] += 1
+            degrees[target] += 1
+
+        self.offsets = array('q', [0] * (n + 1))
+        for i, degree in enumerate(degrees):
+            self.offsets[i + 1] = self.offsets[i] + degree
+        self.neighbors = array('q', [0] * self.offsets[n])
+        self.weights = array('d', [0.0] * self.offsets[n])
+        position = self.offsets[:n]
+        for source, target, weight in edges:
+            for node, other in ((source, target), (target, source)):
+                self.neighbors[position[node]] = other
+                self.weights[position[node]] = weight
+                position[node] += 1
+
+    @property
+    def node_count(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return len(self.neighbors) // 2
+
+    def degree(self, i):
+        return self.offsets[i + 1] - self.offsets[i]
+
+    @cached_property
+    def adjacency(self):
+        """(neighbors, weights) lists of each node, unpacked from the arrays once for the algorithms' inner loops"""
+        neighbors, weights, offsets = self.neighbors.tolist(), self.weights.tolist(), self.offsets.tolist()
+        return [(neighbors[start:end], weights[start:end]) for start, end in zip(offsets, offsets[1:])]
+
+    @cached_property
+    def weighted_degrees(self):
+        """The total strength of each node's connections"""
+        return [sum(weights) for _, weights in self.adjacency]
+
+    @cached_property
+    def pagerank(self):
+        """
+        Weighted PageRank of each node, summing to 1.
+
+        Found by power iteration; the rank of people without connections is
+        spread over everyone, as if they linked to all.
+        """
+        n = self.node_count
+        if n == 0:
+            return []
+        strengths = self.weighted_degrees
+        adjacency = self.adjacency
+        ranks = [1 / n] * n
+        for _ in range(PAGERANK_MAX_ITERATIONS):
+            dangling = sum(rank for rank, strength in zip(ranks, strengths) if strength == 0)
+            base = (1 - PAGERANK_DAMPING) / n + PAGERANK_DAMPING * dangling / n
+            new_ranks = [base] * n
+            for rank, strength, (neighbors, weights) in zip(ranks, strengths, adjacency):
+                if strength == 0:
+                    continue
+                share = PAGERANK_DAMPING * rank / strength
+                for neighbor, weight in zip(neighbors, weights):
+                    new_ranks[neighbor] += share * weight
+            change = sum(abs(new - old) for new, old in zip(new_ranks, ranks))
+            ranks = new_ranks
+            if change < PAGERANK_TOLERANCE * n:
+                break
+        return ranks
+
+    @cached_property
+    def communities(self):
+        """
+        The community of each node, found by weighted label propagation.
+
+        Each person in turn joins the community their connections are most
+        strongly tied to, keeping their own on ties, until no one moves.
+        Communities are numbered from 0 by decreasing size, then by their
+        first member, so the result only depends on the graph.
+        """
+        n = self.node_count
+        adjacency = self.adjacency
+        labels = list(range(n))
+        for _ in range(COMMUNITY_MAX_ITERATIONS):
+            moved = False
+            for i, (neighbors, weights) in enumerate(adjacency):
+                if not neighbors:
+                    continue
+                totals = {}
+                for neighbor, weight in zip(neighbors, weights):
+                    label = labels[neighbor]
+                    totals[label] = totals.get(label, 0) + weight
+                best = max(totals.values())
+                if totals.get(labels[i], 0) >= best * (1 - 1e-12):
+                    continue
+                labels[i] = min(label for label, total in totals.items() if total >= best * (1 - 1e-12))
+                moved = True
+            if not moved:
+                break
+
+        members = {}
+        for i, label in enumerate(labels):
+            members.setdefault(label, []).append(i)
+        ordered = sorted(members.values(), key=lambda nodes: (-len(nodes), nodes[0]))
+        communities = [0] * n
+        for number, nodes in enumerate(ordered):
+            for i in nodes:
+                communities[i] = number
+        return communities
+
+    @cached_property
+    def modularity(self):
+        """The weighted modularity of the communities, from -0.5 to 1; 0 without connections"""
+        total = sum(self.weighted_degrees)
+        if total == 0:
+            return 0.0
+        communities = self.communities
+        internal = {}
+        degrees = {}
+        for community, strength, (neighbors, weights) in zip(communities, self.weighted_degrees, self.adjacency):
+            degrees[community] = degrees.get(community, 0) + strength
+            internal[community] = internal.get(community, 0) + sum(
+                weight for neighbor, weight in zip(neighbors, weights) if communities[neighbor] == community)
+        return sum(internal[community] / total - (degrees[community] / total) ** 2 for community in degrees)
+
+    def shortest_path(self, source_id, target_id):
+        """
+        Return (person ids, distance) of the closest path between two people, or None if they aren't connected.
+
+        Each connection is as long as the inverse of its strength, so the
+        path goes through the strongest ties rather than the fewest people.
+        Raises KeyError for people not in the graph.
+        """
+        source, target = self.index[source_id], self.index[target_id]
+        adjacency = self.adjacency
+        distances = {source: 0.0}
+        previous = {}
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if distance > distances[node]:
+                continue
+            for neighbor, weight in zip(*adjacency[node]):
+                candidate = distance + 1 / weight
+                if candidate < distances.get(neighbor, math.inf):
+                    distances[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (candidate, neighbor))
+        if target not in distances:
+            return None
+
+        path = [target]
+        while path[-1] != source:
+            path.append(previous[path[-1]])
+        return [self.ids[i] for i in reversed(path)], distances[target]
+
+    def metrics(self):
+        """Return the metrics of every person and community, as served by /api/visualizations/graph-metrics"""
+        n = self.node_count
+        max_strength = max(self.weighted_degrees, default=0)
+        nodes = [
+            {
+                'id': self.ids[i],
+                'name': self.names[i],
+                'degree': self.degree(i),
+                'degree_centrality': self.degree(i) / (n - 1) if n > 1 else 0.0,
+                'weighted_degree': self.weighted_degrees[i],
+                'weighted_centrality': self.weighted_degrees[i] / max_strength if max_strength else 0.0,
+                'pagerank': self.pagerank[i],
+                'community': self.communities[i]
+            }
+            for i in range(n)
+        ]
+        communities = {}
+        for i, community in enumerate(self.communities):
+            communities.setdefault(community, []).append(self.ids[i])
+        return {
+            'node_count': n,
+            'edge_count': self.edge_count,
+            'modularity': self.modularity,
+            'nodes': nodes,
+            'communities': [{'id': community, 'members': members} for community, members in communities.items()]
+        }
+
+
+def load_graph(user_id):
+    """Build a user's Graph from their people and connections, in two queries"""
+    people = db.session.execute(
+        select(Person.id, Person.name).where(Person.user_id == user_id).order_by(Person.id)
+    ).all()
+    # Both people of a connection belong to the same user
+    connections = db.session.execute(
+        select(PersonConnection.source_id, PersonConnection.target_id, PersonConnection.closeness,
+               PersonConnection.sentiment, PersonConnection.interaction_count)
+        .join(Person, Person.id == PersonConnection.source_id)
+        .where(Person.user_id == user_id)
+        .order_by(PersonConnection.id)
+    ).all()
+    return Graph(people, [
+        (source_id, target_id, connection_weight(closeness, sentiment, interaction_count))
+        for source_id, target_id, closeness, sentiment, interaction_count in connections
+    ])
+
+
+_cache_lock = threading.Lock()
+
+
+def get_graph_cache():
+    """Return the app's graph cache in this process, creating it on first use"""
+    cache = current_app.extensions.get('graph_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.get('graph_cache')
+            if cache is None:
+                cache = current_app.extensions['graph_cache'] = MemoryCache(
+                    current_app.config.get('RESULT_CACHE_TTL', DEFAULT_TTL),
+                    current_app.config.get('GRAPH_CACHE_MAX_ENTRIES', DEFAULT_GRAPH_CACHE_ENTRIES))
+    return cache
+
+
+def get_user_graph(user_id, version):
+    """
+    Return a user's Graph at data version `version`, building it on a miss.
+
+    Graphs are kept in memory per process, together with the metrics
+    computed on them, until the user's data version changes. Pass the
+    version read before any of the user's data, e.g. g.data_version.
+    """
+    cache = get_graph_cache()
+    graph = cache.get(user_id, version, GRAPH_KEY)
+    if graph is None:
+        with timed_phase('graph'):
+            graph = load_graph(user_id)
+        cache.set(user_id, version, GRAPH_KEY, graph)
+    return graph
+
+
+def graph_cache_stats():
+    """Return the size and counters of the graph cache"""
+    cache = get_graph_cache()
+    stats = cache.stats.as_dict()
+    stats['size'] = cache.size()
+    return stats
@@ -0,0 +1,22 @@
+# Gunicorn settings, read automatically when gunicorn starts in this directory.
+#
+# The app is safe to load once in the master with --preload and share with
+# the workers copy-on-write: creating it doesn't touch the database, and the
+# analysis worker thread and caches are started lazily in each worker.
+import gc
+
+
+def pre_fork(server, worker):
+    if server.cfg.preload_app:
+        # Move the preloaded objects out of the garbage collector's generations,
+        # so collections in the workers don't write to (and copy) their pages
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # Never share pooled database connections with the master
+        from app import db
+
+        with server.app.wsgi().app_context():
+            db.engine.dispose(close=False)
@@ -0,0 +1,223 @@
+import json
+from datetime import datetime, timezone
+from itertools import islice
+
+from sqlalchemy import insert
+
+from app import db
+from connections import record_entries_connections
+from data_version import bump_data_version
+from models import JournalEntry, Person, journal_person
+from stats import add_entries_stats
+from utils import ChunkedPool, analyze_contents, get_name_matcher
+
+DEFAULT_IMPORT_BATCH_SIZE = 500
+
+
+class JournalImportError(Exception):
+    """
+    An import stopped part way through.
+
+    Every batch before the failing one is committed; `resume_from` is the
+    number of input lines they cover, to pass back as `skip`.
+    """
+
+    def __init__(self, message, resume_from):
+        super().__init__(message)
+        self.resume_from = resume_from
+
+
+def parse_import_record(record, people_by_id, people_by_name):
+    """
+    Validate one decoded import record and turn it into entry column values.
+
+    Records look like the body of POST /api/journal-entries, plus an optional
+    ISO 8601 'date_created' and a 'people' list of names of existing people
+    (matched case-insensitively) as an alternative to 'people_ids'. Raises
+    ValueError describing the problem if the record is invalid.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Record must be a JSON object')
+
+    title = record.get('title')
+    content = record.get('content')
+    if not title or not content or not isinstance(title, str) or not isinstance(content, str):
+        raise ValueError('Title and content are required')
+    if len(title) > JournalEntry.title.type.length:
+        raise ValueError(f'Title is longer than {JournalEntry.title.type.length} characters')
+
+    date_created = record.get('date_created')
+    if date_created:
+        if not isinstance(date_created, str):
+            raise ValueError('date_created must be an ISO 8601 string')
+        date_created = datetime.fromisoformat(date_created)
+        if date_created.tzinfo is not None:
+            # Dates are stored as naive UTC
+            date_created = date_created.astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        date_created = datetime.utcnow()
+
+    people_ids = record.get('people_ids') or []
+    names = record.get('people') or []
+    if not isinstance(people_ids, list) or not isinstance(names, list):
+        raise ValueError('people_ids and people must be lists')
+
+    # Like a single save, people that aren't the user's are ignored. bool is
+    # an int subclass, so True would otherwise be taken as person 1
+    person_ids = [person_id for person_id in people_ids
+                  if type(person_id) is int and person_id in people_by_id]
+    for name in names:
+        person_id = people_by_name.get(str(name).lower())
+        if person_id is not None:
+            person_ids.append(person_id)
+
+    return {
+        'title': title,
+        'content': content,
+        'date_created': date_created,
+        'mood': _optional_string(record, 'mood', JournalEntry.mood),
+        'interaction_type': _optional_string(record, 'interaction_type', JournalEntry.interaction_type),
+        'person_ids': list(dict.fromkeys(person_ids))
+    }
+
+
+def _optional_string(record, field, column):
+    """Return the string or None in `record[field]`, raising ValueError if it doesn't fit `column`"""
+    value = record.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    if len(value) > column.type.length:
+        raise ValueError(f'{field} is longer than {column.type.length} characters')
+    return value
+
+
+def _read_batches(lines, skip, batch_size):
+    """
+    Yield (first line number, lines) batches of an NDJSON stream.
+
+    Line numbers start at 1 and the first `skip` lines are not yielded.
+    """
+    iterator = iter(lines)
+    for _ in islice(iterator, skip):
+        pass
+    line_number = skip + 1
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield line_number, batch
+        line_number += len(batch)
+
+
+def import_journal(user_id, lines, skip=0, batch_size=DEFAULT_IMPORT_BATCH_SIZE, workers=None):
+    """
+    Import journal entries for a user from an NDJSON stream.
+
+    `lines` is any iterable of lines (str or bytes) holding one entry record
+    per line; it is consumed lazily, so inputs of any size can be streamed.
+    Entries are analyzed like POST /api/journal-entries would, with the
+    sentiment and name extraction of each batch spread over `workers`
+    processes while the previous batch is being written. Each batch of
+    `batch_size` lines is written in its own transaction: entries, their
+    people links, person stats and aggregated connection updates.
+
+    Yields a progress dict after each committed batch:
+    {'lines': input lines done, 'imported': entries imported so far,
+     'failed': invalid records so far, 'errors': [{'line', 'error'}] of the batch}.
+    Blank lines are ignored and invalid records are reported and skipped.
+    If writing a batch fails it is rolled back and JournalImportError is
+    raised; importing again with skip=error.resume_from continues from there.
+    """
+    people = db.session.query(Person.id, Person.name).filter_by(user_id=user_id).order_by(Person.id).all()
+    people_by_id = {person_id for person_id, _ in people}
+    people_by_name = {}
+    for person_id, name in people:
+        people_by_name.setdefault(name.lower(), person_id)
+    matcher = get_name_matcher(user_id, [tuple(person) for person in people])
+
+    pool = ChunkedPool(analyze_contents, workers)
+
+    def prepare(first_line, batch):
+        """Parse a batch and start analyzing its valid entries"""
+        entries = []
+        errors = []
+        for line_number, line in enumerate(batch, first_line):
+            if not line.strip():
+                continue
+            try:
+                entries.append(parse_import_record(json.loads(line), people_by_id, people_by_name))
+            except ValueError as e:
+                errors.append({'line': line_number, 'error': str(e)})
+
+        # Analyzed while the previous batch is being written
+        analysis = pool.submit([entry['content'] for entry in entries])
+        return first_line + len(batch) - 1, entries, errors, analysis
+
+    imported = 0
+    failed = 0
+    done_lines = skip
+    try:
+        batches = _read_batches(lines, skip, batch_size)
+        batch = next(batches, None)
+        prepared = prepare(*batch) if batch else None
+        while prepared is not None:
+            last_line, entries, errors, analysis = prepared
+            batch = next(batches, None)
+            prepared = prepare(*batch) if batch else None
+
+            try:
+                imported += _write_batch(user_id, matcher, entries, analysis.result())
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                raise JournalImportError(f'Import failed after line {done_lines}: {e}', done_lines) from e
+
+            failed += len(errors)
+            done_lines = last_line
+            yield {'lines': done_lines, 'imported': imported, 'failed': failed, 'errors': errors}
+    finally:
+        pool.shutdown()
+
+
+def _write_batch(user_id, matcher, entries, results):
+    """Insert one analyzed batch of entries with their links, stats and connections"""
+    if not entries:
+        return 0
+
+    version = bump_data_version([user_id])[user_id]
+    rows = []
+    for entry, (sentiment_score, potential_names) in zip(entries, results):
+        new_names = [name for name in potential_names if name not in matcher.names]
+        content_with_highlights, _ = matcher.highlight(entry['content'], new_names)
+        entry['sentiment_score'] = sentiment_score
+        rows.append({
+            'title': entry['title'],
+            'content': entry['content'],
+            'content_with_highlights': content_with_highlights,
+            'date_created': entry['date_created'],
+            'mood': entry['mood'],
+            'sentiment_score': sentiment_score,
+            'interaction_type': entry['interaction_type'],
+            'user_id': user_id,
+            'extracted_names': json.dumps(potential_names),
+            'sync_version': version
+        })
+
+    entry_ids = db.session.execute(
+        insert(JournalEntry).returning(JournalEntry.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+
+    links = [{'journal_entry_id': entry_id, 'person_id': person_id}
+             for entry_id, entry in zip(entry_ids, entries) for person_id in entry['person_ids']]
+    if links:
+        db.session.execute(journal_person.insert(), links)
+
+    add_entries_stats((entry['person_ids'], entry['date_created'], entry['sentiment_score'])
+                      for entry in entries)
+    # Like a single save, only entries with an interaction type connect their people
+    record_entries_connections([(entry['person_ids'], entry['sentiment_score'])
+                                for entry in entries
+                                if len(entry['person_ids']) > 1 and entry['interaction_type']], version)
+    return len(entries)
@@ -0,0 +1,189 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTiming:
+    """Phase and SQL timings of one sampled request"""
+
+    def __init__(self):
+        self.phases = {}  # name -> seconds, in the order phases first ran
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def server_timing(self, total):
+        """Format the timings as a Server-Timing header value"""
+        metrics = [f'sql;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_count} queries"']
+        metrics.extend(f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in self.phases.items())
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timed_phase(name):
+    """
+    Time a named phase of the current request, e.g. 'people' or 'serialize'.
+
+    The time is added to the request's Server-Timing header and to the
+    per-endpoint phase totals of /metrics. Phases include the SQL they run,
+    and a phase entered several times is summed. Outside a request, or
+    when the request isn't sampled, it costs one attribute lookup.
+    """
+    timing = g.get('timing') if has_request_context() else None
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+class Metrics:
+    """
+    Request metrics of this process, in the Prometheus text format.
+
+    Every request is counted in the latency histogram; the SQL and phase
+    totals only cover sampled requests, which are counted separately so
+    they can be scaled. With several server processes each has its own
+    metrics, so scrape every process or sum them in Prometheus.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # (endpoint, method, status) -> [cumulative bucket counts..., count, sum]
+        self.latency = {}
+        # endpoint -> [sampled requests, SQL statements, SQL seconds]
+        self.sampled = {}
+        # (endpoint, phase) -> seconds
+        self.phases = {}
+
+    def observe(self, endpoint, method, status, seconds, timing=None):
+        with self.lock:
+            counts = self.latency.get((endpoint, method, status))
+            if counts is None:
+                counts = self.latency[endpoint, method, status] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += seconds
+
+            if timing is not None:
+                sampled = self.sampled.setdefault(endpoint, [0, 0, 0.0])
+                sampled[0] += 1
+                sampled[1] += timing.sql_count
+                sampled[2] += timing.sql_seconds
+                for phase, phase_seconds in timing.phases.items():
+                    self.phases[endpoint, phase] = self.phases.get((endpoint, phase), 0.0) + phase_seconds
+
+    def render(self, extra=()):
+        """
+        Return the metrics in the Prometheus text exposition format.
+
+        `extra` are more (name, type, help, value) samples to include, e.g.
+        the depth of the analysis queue.
+        """
+        with self.lock:
+            latency = {key: list(counts) for key, counts in self.latency.items()}
+            sampled = {key: list(values) for key, values in self.sampled.items()}
+            phases = dict(self.phases)
+
+        lines = [
+            '# HELP journal_request_duration_seconds Time to handle a request, by endpoint.',
+            '# TYPE journal_request_duration_seconds histogram'
+        ]
+        for (endpoint, method, status), counts in sorted(latency.items()):
+            labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'journal_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'journal_request_duration_seconds_bucket{{{labels},le="+Inf"}} {counts[-2]}')
+            lines.append(f'journal_request_duration_seconds_sum{{{labels}}} {counts[-1]:.6f}')
+            lines.append(f'journal_request_duration_seconds_count{{{labels}}} {counts[-2]}')
+
+        for name, index, kind, help_text in (
+            ('journal_sampled_requests_total', 0, 'counter', 'Requests whose SQL and phases were timed.'),
+            ('journal_sql_statements_total', 1, 'counter', 'SQL statements executed by sampled requests.'),
+            ('journal_sql_duration_seconds_total', 2, 'counter', 'Time spent in SQL by sampled requests.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, values in sorted(sampled.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {values[index]:g}')
+
+        lines.append('# HELP journal_phase_duration_seconds_total Time spent in named phases by sampled requests.')
+        lines.append('# TYPE journal_phase_duration_seconds_total counter')
+        for (endpoint, phase), seconds in sorted(phases.items()):
+            lines.append(f'journal_phase_duration_seconds_total{{endpoint="{endpoint}",phase="{phase}"}} {seconds:.6f}')
+
+        for name, kind, help_text, value in extra:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get('timing') is not None:
+        conn.info['query_start'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start', None)
+    if start is not None and has_request_context():
+        timing = g.get('timing')
+        if timing is not None:
+            timing.sql_count += 1
+            timing.sql_seconds += time.perf_counter() - start
+
+
+def init_instrumentation(app):
+    """
+    Time every request, and the phases and SQL of a sample of them.
+
+    INSTRUMENTATION_SAMPLE_RATE is the fraction of requests whose SQL and
+    phases are timed; those get a Server-Timing header unless SERVER_TIMING
+    is off. Streamed responses are timed until the view returns. Register
+    it before init_compression, so its after_request hook runs after the
+    compression one and includes it.
+    """
+    app.config.setdefault('INSTRUMENTATION_SAMPLE_RATE', 1.0)
+    app.config.setdefault('SERVER_TIMING', True)
+
+    @app.before_request
+    def start_request_timing():
+        g.request_start = time.perf_counter()
+        if random.random() < app.config['INSTRUMENTATION_SAMPLE_RATE']:
+            g.timing = RequestTiming()
+
+    @app.after_request
+    def record_request_timing(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        # Stop timing, so SQL run while the response is sent isn't counted
+        timing = g.pop('timing', None)
+        total = time.perf_counter() - start
+        if timing is not None and app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = timing.server_timing(total)
+        # Unmatched URLs share one label, so scanners can't blow up the series count
+        metrics.observe(request.endpoint or 'unmatched', request.method, response.status_code, total, timing)
+        return response
@@ -0,0 +1,63 @@
+from flask.json.provider import DefaultJSONProvider
+
+from instrumentation import timed_phase
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; Flask's stdlib provider is used without it
+    orjson = None
+
+# dumps() arguments orjson has an equivalent for
+_ORJSON_ARGS = {'indent', 'separators', 'sort_keys', 'default'}
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's stdlib JSON provider, timing responses as the 'serialize' phase"""
+
+    def response(self, *args, **kwargs):
+        with timed_phase('serialize'):
+            return super().response(*args, **kwargs)
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    JSON provider that encodes with orjson.
+
+    Output matches DefaultJSONProvider except that non-ASCII characters are
+    written as UTF-8 instead of escaped, and non-string keys, which are
+    converted to strings, sort as strings. Dates, decimals, UUIDs and
+    dataclasses still go through the provider's default function, so dates
+    are HTTP dates. Responses are built from the encoded bytes directly.
+    Decoding stays with the stdlib.
+    """
+
+    ensure_ascii = False
+
+    def _options(self, sort_keys=None, indent=False):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        if self.ensure_ascii or not _ORJSON_ARGS.issuperset(kwargs):
+            return super().dumps(obj, **kwargs)
+        options = self._options(kwargs.get('sort_keys'), bool(kwargs.get('indent')))
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=options).decode()
+
+    def response(self, *args, **kwargs):
+        if self.ensure_ascii:
+            return super().response(*args, **kwargs)
+        with timed_phase('serialize'):
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            options = self._options(indent=indent) | orjson.OPT_APPEND_NEWLINE
+            return self._app.response_class(orjson.dumps(obj, default=self.default, option=options),
+                                            mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """Encode the app's JSON with orjson when it is installed, else the stdlib"""
+    app.json = OrjsonProvider(app) if orjson is not None else JSONProvider(app)
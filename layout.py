@@ -0,0 +1,347 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+from graph import connection_weight
+from instrumentation import timed_phase
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; without it social webs are laid out in the browser
+    np = None
+
+LAYOUT_MODES = ('auto', 'server', 'client')
+# Length of a connection at rest, in pixels, as the client's d3 link distance
+LINK_DISTANCE = 100
+# Strength of the repulsion between people relative to the connections'
+# pull; at 1, two connected people alone rest LINK_DISTANCE apart
+REPULSION = 1.0
+# Up to this many people, repulsion is computed exactly between every pair
+EXACT_REPULSION_NODES = 300
+# Above it, the quadtree is refined until its finest cells have at most this many people
+MAX_CELL_NODES = 8
+MAX_TREE_DEPTH = 12
+# Grids with at most this many cells per occupied cell are looked up in a table of all cells
+DENSE_LOOKUP_CELLS = 16
+# Node pairs of the exact near field computed at a time, which bounds its memory
+NEAR_PAIRS_PER_PASS = 1 << 20
+# A cold layout starts from scratch; a warm one from the previous layout of the user's graph
+COLD_ITERATIONS = 150
+WARM_ITERATIONS = 60
+COLD_STEP = 2.0
+WARM_STEP = 0.25
+FINAL_STEP = 0.01
+DEFAULT_LAYOUT_MIN_SIZE = 300
+DEFAULT_LAYOUT_CACHE_ENTRIES = 256
+
+
+def layout_available():
+    """Whether social webs can be laid out on the server, which needs numpy"""
+    return np is not None
+
+
+def _repel(x, y, other_x, other_y, mass, k2):
+    """
+    Repulsion on nodes at (x, y), (n,) arrays, from masses at (other_x, other_y), (n, m) arrays.
+
+    Returns the (n, 2) forces. Zero masses don't repel.
+    """
+    dx = x[:, None] - other_x
+    dy = y[:, None] - other_y
+    scale = mass / np.maximum(dx * dx + dy * dy, 1e-4 * k2)
+    return REPULSION * k2 * np.stack([(dx * scale).sum(axis=1), (dy * scale).sum(axis=1)], axis=1)
+
+
+def _exact_repulsion(positions, k2):
+    """Repulsion on each node from every other node, as an (n, 2) array"""
+    n = len(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    mass = 1.0 - np.eye(n)
+    return _repel(x, y, np.broadcast_to(x, (n, n)), np.broadcast_to(y, (n, n)), mass, k2)
+
+
+def _cells(positions, origin, size, grid):
+    """Integer x and y cell coordinates of each node in a grid x grid division of the bounding square"""
+    cells = np.clip(((positions - origin) / size * grid).astype(np.int64), 0, grid - 1)
+    return cells[:, 0], cells[:, 1]
+
+
+def _lookup(occupied, x, y, grid):
+    """
+    Index in `occupied`, the sorted keys of the occupied cells, of the cells at (x, y).
+
+    Returns (index, found); cells that are outside the grid or empty aren't
+    found. Coarse grids are looked up in a table of all their cells, and
+    grids with many more cells than occupied ones by binary search.
+    """
+    keys = x * grid + y
+    inside = (x >= 0) & (x < grid) & (y >= 0) & (y < grid)
+    if grid * grid <= DENSE_LOOKUP_CELLS * len(occupied):
+        table = np.full(grid * grid, -1)
+        table[occupied] = np.arange(len(occupied))
+        index = table[np.where(inside, keys, 0)]
+        return np.maximum(index, 0), inside & (index >= 0)
+    index = np.minimum(np.searchsorted(occupied, keys), len(occupied) - 1)
+    return index, inside & (occupied[index] == keys)
+
+
+def _near_repulsion(x, y, order, starts, counts, neighbors, found, k2):
+    """
+    Exact repulsion on each node from the other nodes of its neighboring cells, as an (n, 2) array.
+
+    `neighbors` are the (n, 9) occupied-cell indexes of each node's 3x3
+    cells, `order` the nodes sorted by cell, which start at `starts` and
+    number `counts`. The pairs are listed explicitly, a bounded number at a
+    time, so a dense clump that no cell could split costs memory in
+    proportion to its pairs rather than to the whole graph.
+    """
+    n = len(x)
+    sizes = np.where(found, counts[neighbors], 0)
+    pairs = np.cumsum(sizes.sum(axis=1))
+    force = np.zeros((n, 2))
+    first = 0
+    while first < n:
+        done = pairs[first - 1] if first else 0
+        last = max(int(np.searchsorted(pairs, done + NEAR_PAIRS_PER_PASS, side='right')), first + 1)
+        chunk_sizes = sizes[first:last].ravel()
+        total = int(chunk_sizes.sum())
+        nodes = np.repeat(np.repeat(np.arange(first, last), neighbors.shape[1]), chunk_sizes)
+        cells = np.repeat(neighbors[first:last].ravel(), chunk_sizes)
+        # Position of each pair within its cell's run of nodes
+        offsets = np.arange(total) - np.repeat(np.cumsum(chunk_sizes) - chunk_sizes, chunk_sizes)
+        others = order[starts[cells] + offsets]
+        dx = x[nodes] - x[others]
+        dy = y[nodes] - y[others]
+        scale = (others != nodes) / np.maximum(dx * dx + dy * dy, 1e-4 * k2)
+        force[:, 0] += np.bincount(nodes, weights=dx * scale, minlength=n)
+        force[:, 1] += np.bincount(nodes, weights=dy * scale, minlength=n)
+        first = last
+    return REPULSION * k2 * force
+
+
+def _barnes_hut_repulsion(positions, k2):
+    """
+    Approximate repulsion on each node, as an (n, 2) array.
+
+    The bounding square is divided into a quadtree of grids, 4x4 and finer.
+    At each level, every node is repelled by the center of mass of the
+    cells that are near its parent cell but not next to its own, the
+    cells the coarser level left out; at the finest level, which has at
+    most MAX_CELL_NODES nodes per cell unless MAX_TREE_DEPTH is reached
+    first (dense clusters make it deeper), nodes in the neighboring cells
+    repel it exactly. Each level is computed for all nodes at once, over
+    the occupied cells only, so a deep tree costs time and memory in
+    proportion to the nodes rather than to the cells of its grid.
+    """
+    n = len(positions)
+    x, y = positions[:, 0], positions[:, 1]
+    origin = positions.min(axis=0)
+    size = max(float((positions.max(axis=0) - origin).max()), 1e-9) * (1 + 1e-9)
+    depth = max(2, math.ceil(math.log2(math.sqrt(n / MAX_CELL_NODES))))
+    while depth < MAX_TREE_DEPTH:
+        cell_x, cell_y = _cells(positions, origin, size, 2 ** depth)
+        if np.unique(cell_x * 2 ** depth + cell_y, return_counts=True)[1].max() <= MAX_CELL_NODES:
+            break
+        depth += 1
+    force = np.zeros_like(positions)
+    # The 6x6 cells around a node's parent cell, as offsets from the parent's first child
+    block_offsets = [offsets.ravel() for offsets in np.meshgrid(np.arange(-2, 4), np.arange(-2, 4))]
+    # The 3x3 cells around a node's own cell
+    near_offsets = [offsets.ravel() for offsets in np.meshgrid(np.arange(-1, 2), np.arange(-1, 2))]
+
+    for level in range(2, depth + 1):
+        grid = 2 ** level
+        cell_x, cell_y = _cells(positions, origin, size, grid)
+        occupied, cell = np.unique(cell_x * grid + cell_y, return_inverse=True)
+        mass = np.bincount(cell).astype(float)
+        center_x = np.bincount(cell, weights=x) / mass
+        center_y = np.bincount(cell, weights=y) / mass
+
+        # Cells near the parent's neighborhood, but not adjacent to the node's own cell
+        block_x = (cell_x // 2 * 2)[:, None] + block_offsets[0]
+        block_y = (cell_y // 2 * 2)[:, None] + block_offsets[1]
+        index, found = _lookup(occupied, block_x, block_y, grid)
+        valid = found & ((np.abs(block_x - cell_x[:, None]) > 1) | (np.abs(block_y - cell_y[:, None]) > 1))
+        force += _repel(x, y, center_x[index], center_y[index], np.where(valid, mass[index], 0), k2)
+
+    # Near field: the nodes of the finest level's adjacent cells
+    grid = 2 ** depth
+    cell_x, cell_y = _cells(positions, origin, size, grid)
+    occupied, cell = np.unique(cell_x * grid + cell_y, return_inverse=True)
+    order = np.argsort(cell, kind='stable')
+    counts = np.bincount(cell)
+    starts = np.cumsum(counts) - counts
+    neighbors, found = _lookup(occupied, cell_x[:, None] + near_offsets[0], cell_y[:, None] + near_offsets[1], grid)
+    force += _near_repulsion(x, y, order, starts, counts, neighbors, found, k2)
+    return force
+
+
+def force_layout(n, sources, targets, weights, initial, iterations, step):
+    """
+    Lay out a graph of n nodes with a spring-electrical model, from `initial` (n, 2) positions.
+
+    Connections pull their ends together in proportion to their weight and
+    the square of their length; every pair of nodes repels. Each iteration
+    moves every node `step` times LINK_DISTANCE along the force on it, and
+    the step shrinks to FINAL_STEP over `iterations`. Returns the positions
+    as an (n, 2) array, centered on 0.
+    """
+    k = float(LINK_DISTANCE)
+    k2 = k * k
+    positions = np.array(initial, dtype=float)
+    if n < 2:
+        return positions - positions.mean(axis=0) if n else positions
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    weights = np.asarray(weights, dtype=float)
+    if len(weights):
+        weights = weights / weights.mean()
+    repulsion = _exact_repulsion if n <= EXACT_REPULSION_NODES else _barnes_hut_repulsion
+    cooling = (FINAL_STEP / step) ** (1 / max(iterations - 1, 1)) if step > FINAL_STEP else 1.0
+
+    for _ in range(iterations):
+        force = repulsion(positions, k2)
+        if len(sources):
+            diff = positions[targets] - positions[sources]
+            pull = diff * (weights * np.sqrt((diff ** 2).sum(axis=1)) / k)[:, None]
+            for axis in (0, 1):
+                force[:, axis] += np.bincount(sources, weights=pull[:, axis], minlength=n)
+                force[:, axis] -= np.bincount(targets, weights=pull[:, axis], minlength=n)
+        length = np.sqrt((force ** 2).sum(axis=1))
+        positions += force * (step * k / np.maximum(length, 1e-12))[:, None]
+        step = max(step * cooling, FINAL_STEP)
+    return positions - positions.mean(axis=0)
+
+
+def graph_signature(web):
+    """Hash of the people and weighted connections of a social web, which its layout depends on"""
+    digest = hashlib.sha1()
+    digest.update(','.join(str(node['id']) for node in web['nodes']).encode())
+    for link in web['links']:
+        weight = connection_weight(link['closeness'], link['sentiment'], link['interaction_count'])
+        digest.update(f";{link['source']}-{link['target']}:{weight:.6g}".encode())
+    return digest.hexdigest()
+
+
+class LayoutCache:
+    """
+    Per-process cache of the latest layout of each user's social web.
+
+    A layout is reused while the graph's signature is unchanged, and is the
+    starting point of the next one when it isn't. The least recently used
+    users are dropped when full.
+    """
+
+    def __init__(self, max_entries=DEFAULT_LAYOUT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # user_id -> (signature, {person_id: (x, y)}), least recently used first
+        self.entries = OrderedDict()
+
+    def get(self, user_id):
+        with self.lock:
+            item = self.entries.get(user_id)
+            if item is not None:
+                self.entries.move_to_end(user_id)
+            return item
+
+    def set(self, user_id, signature, positions):
+        with self.lock:
+            self.entries[user_id] = (signature, positions)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+_cache_lock = threading.Lock()
+
+
+def get_layout_cache():
+    """Return the app's layout cache in this process, creating it on first use"""
+    cache = current_app.extensions.get('layout_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.get('layout_cache')
+            if cache is None:
+                cache = current_app.extensions['layout_cache'] = LayoutCache(
+                    current_app.config.get('LAYOUT_CACHE_MAX_ENTRIES', DEFAULT_LAYOUT_CACHE_ENTRIES))
+    return cache
+
+
+def social_web_positions(user_id, web):
+    """
+    Return {person_id: (x, y)} of a social web from get_social_web, centered on 0.
+
+    The layout is cached per graph signature. When the graph changed, the
+    previous layout is refined: known people start where they were and
+    new ones next to the people they're connected to, so the picture stays
+    recognizable and takes a fraction of the iterations of a cold layout.
+    """
+    cache = get_layout_cache()
+    signature = graph_signature(web)
+    previous = cache.get(user_id)
+    if previous is not None and previous[0] == signature:
+        return previous[1]
+
+    ids = [node['id'] for node in web['nodes']]
+    index = {person_id: i for i, person_id in enumerate(ids)}
+    sources = [index[link['source']] for link in web['links']]
+    targets = [index[link['target']] for link in web['links']]
+    weights = [connection_weight(link['closeness'], link['sentiment'], link['interaction_count'])
+               for link in web['links']]
+    # Seeded by the graph, so processes without a previous layout agree
+    random = np.random.default_rng(int(signature[:8], 16))
+    radius = LINK_DISTANCE * math.sqrt(max(len(ids), 1))
+
+    known = previous[1] if previous is not None else {}
+    warm = any(person_id in known for person_id in ids)
+    initial = np.empty((len(ids), 2))
+    placed = np.zeros(len(ids), dtype=bool)
+    for i, person_id in enumerate(ids):
+        if person_id in known:
+            initial[i] = known[person_id]
+            placed[i] = True
+    linked_to = {}
+    for source, target in zip(sources, targets):
+        linked_to.setdefault(source, []).append(target)
+        linked_to.setdefault(target, []).append(source)
+    for i in np.flatnonzero(~placed):
+        linked = [j for j in linked_to.get(i, []) if placed[j]]
+        if linked:
+            initial[i] = initial[linked].mean(axis=0) + random.normal(0, LINK_DISTANCE / 4, 2)
+        else:
+            initial[i] = random.uniform(-radius, radius, 2)
+
+    with timed_phase('layout'):
+        if warm:
+            result = force_layout(len(ids), sources, targets, weights, initial, WARM_ITERATIONS, WARM_STEP)
+        else:
+            result = force_layout(len(ids), sources, targets, weights, initial, COLD_ITERATIONS, COLD_STEP)
+    positions = {person_id: (round(float(x), 1), round(float(y), 1)) for person_id, (x, y) in zip(ids, result)}
+    cache.set(user_id, signature, positions)
+    return positions
+
+
+def add_layout(user_id, web, mode='auto'):
+    """
+    Lay out a social web on the server if `mode` asks for it, in place.
+
+    'server' lays it out whenever numpy is installed, 'auto' only when it
+    has at least LAYOUT_MIN_SIZE people and connections, and 'client'
+    never. Sets web['layout'] to where it's laid out, 'server' or
+    'client', and the nodes' x and y for 'server'.
+    """
+    size = len(web['nodes']) + len(web['links'])
+    min_size = current_app.config.get('LAYOUT_MIN_SIZE', DEFAULT_LAYOUT_MIN_SIZE)
+    if not layout_available() or mode == 'client' or (mode == 'auto' and size < min_size):
+        web['layout'] = 'client'
+        return web
+
+    positions = social_web_positions(user_id, web)
+    for node in web['nodes']:
+        node['x'], node['y'] = positions[node['id']]
+    web['layout'] = 'server'
+    return web
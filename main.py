@@ -1,6 +1,8 @@
-from app import app
+from app import create_app
 import logging
 
+app = create_app()
+
 if __name__ == "__main__":
     # Set up logging for easier debugging
     logging.basicConfig(level=logging.DEBUG)
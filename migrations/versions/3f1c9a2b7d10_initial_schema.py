@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: 3f1c9a2b7d10
+Revises: 
+Create Date: 2026-10-18 00:16:22.916981
+
+Databases created before migrations were introduced already have these
+tables (from db.create_all()), so each table is only created if missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=64), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('password_hash', sa.String(length=256), nullable=False),
+        sa.Column('date_joined', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email'),
+        sa.UniqueConstraint('username')
+        )
+    if 'journal_entry' not in existing:
+        op.create_table('journal_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_with_highlights', sa.Text(), nullable=True),
+        sa.Column('date_created', sa.DateTime(), nullable=True),
+        sa.Column('mood', sa.String(length=50), nullable=True),
+        sa.Column('sentiment_score', sa.Float(), nullable=True),
+        sa.Column('interaction_type', sa.String(length=50), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('extracted_names', sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'person' not in existing:
+        op.create_table('person',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('relationship_type', sa.String(length=50), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('date_added', sa.DateTime(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'journal_person' not in existing:
+        op.create_table('journal_person',
+        sa.Column('journal_entry_id', sa.Integer(), nullable=False),
+        sa.Column('person_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['journal_entry_id'], ['journal_entry.id'], ),
+        sa.ForeignKeyConstraint(['person_id'], ['person.id'], ),
+        sa.PrimaryKeyConstraint('journal_entry_id', 'person_id')
+        )
+    if 'person_connection' not in existing:
+        op.create_table('person_connection',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_id', sa.Integer(), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('relationship_type', sa.String(length=50), nullable=True),
+        sa.Column('closeness', sa.Integer(), nullable=True),
+        sa.Column('sentiment', sa.Float(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('last_updated', sa.DateTime(), nullable=True),
+        sa.Column('interaction_count', sa.Integer(), nullable=True),
+        sa.Column('mention_count', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['source_id'], ['person.id'], ),
+        sa.ForeignKeyConstraint(['target_id'], ['person.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('person_connection')
+    op.drop_table('journal_person')
+    op.drop_table('person')
+    op.drop_table('journal_entry')
+    op.drop_table('user')
@@ -0,0 +1,69 @@
+"""person stats tables
+
+Revision ID: 8b4e6d0c2a51
+Revises: 3f1c9a2b7d10
+Create Date: 2026-10-18 00:17:05.120448
+
+Creates the tables maintained by stats.py (unless db.create_all() already
+did) and fills them from journal_person.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d0c2a51'
+down_revision = '3f1c9a2b7d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'person_stats' not in existing:
+        op.create_table('person_stats',
+        sa.Column('person_id', sa.Integer(), nullable=False),
+        sa.Column('entry_count', sa.Integer(), nullable=False),
+        sa.Column('sentiment_sum', sa.Float(), nullable=False),
+        sa.Column('sentiment_n', sa.Integer(), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=True),
+        sa.Column('last_seen', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['person_id'], ['person.id'], ),
+        sa.PrimaryKeyConstraint('person_id')
+        )
+    if 'person_month_stats' not in existing:
+        op.create_table('person_month_stats',
+        sa.Column('person_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.String(length=7), nullable=False),
+        sa.Column('entry_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['person_id'], ['person.id'], ),
+        sa.PrimaryKeyConstraint('person_id', 'month')
+        )
+
+    # Rebuild the stats from scratch, same as `flask rebuild-person-stats`
+    if op.get_bind().dialect.name == 'postgresql':
+        month = "to_char(journal_entry.date_created, 'YYYY-MM')"
+    else:
+        month = "strftime('%Y-%m', journal_entry.date_created)"
+
+    op.execute('DELETE FROM person_stats')
+    op.execute('DELETE FROM person_month_stats')
+    op.execute(
+        'INSERT INTO person_stats (person_id, entry_count, sentiment_sum, sentiment_n, first_seen, last_seen) '
+        'SELECT journal_person.person_id, count(*), coalesce(sum(journal_entry.sentiment_score), 0), '
+        'count(journal_entry.sentiment_score), min(journal_entry.date_created), max(journal_entry.date_created) '
+        'FROM journal_person JOIN journal_entry ON journal_entry.id = journal_person.journal_entry_id '
+        'GROUP BY journal_person.person_id'
+    )
+    op.execute(
+        'INSERT INTO person_month_stats (person_id, month, entry_count) '
+        f'SELECT journal_person.person_id, {month}, count(*) '
+        'FROM journal_person JOIN journal_entry ON journal_entry.id = journal_person.journal_entry_id '
+        f'GROUP BY journal_person.person_id, {month}'
+    )
+
+
+def downgrade():
+    op.drop_table('person_month_stats')
+    op.drop_table('person_stats')
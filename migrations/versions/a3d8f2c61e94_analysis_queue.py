@@ -0,0 +1,44 @@
+"""analysis queue
+
+Revision ID: a3d8f2c61e94
+Revises: e92d41b6c8f7
+Create Date: 2026-10-18 00:25:12.584301
+
+Creates the analysis_job table that queues saved journal entries for the
+background analysis worker (see analysis.py). Existing entries were
+analyzed when they were saved, so nothing is queued.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d8f2c61e94'
+down_revision = 'e92d41b6c8f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'analysis_job' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('analysis_job',
+    sa.Column('entry_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('queued_at', sa.DateTime(), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_by', sa.String(length=64), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['entry_id'], ['journal_entry.id'], ),
+    sa.PrimaryKeyConstraint('entry_id')
+    )
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.create_index('ix_analysis_job_queue', ['claimed_at', 'queued_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_analysis_job_queue')
+
+    op.drop_table('analysis_job')
@@ -0,0 +1,34 @@
+"""per-user data version
+
+Revision ID: b61e0d4f7a28
+Revises: a3d8f2c61e94
+Create Date: 2026-10-18 00:31:40.217065
+
+Creates the data_version table behind the ETags of the read APIs (see
+data_version.py). Users start without a row, which reads as version 0.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b61e0d4f7a28'
+down_revision = 'a3d8f2c61e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'data_version' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('data_version',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,98 @@
+"""indexes for hot lookup columns
+
+Revision ID: c5a7e19f4b63
+Revises: 8b4e6d0c2a51
+Create Date: 2026-10-18 00:17:48.302915
+
+Adds composite indexes for the per-user entry and people listings, joins
+from journal_person and connection lookups. The unique connection pair
+index needs canonical pairs (source_id < target_id), so connections stored
+in both directions are merged first: counts are added up, sentiment is
+averaged by mention count and the highest closeness is kept.
+Self-connections are removed.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e19f4b63'
+down_revision = '8b4e6d0c2a51'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('journal_entry', 'ix_journal_entry_user_date', ['user_id', 'date_created', 'id'], False),
+    ('person', 'ix_person_user_name', ['user_id', 'name'], False),
+    ('journal_person', 'ix_journal_person_person', ['person_id', 'journal_entry_id'], False),
+    ('person_connection', 'ix_person_connection_pair', ['source_id', 'target_id'], True),
+    ('person_connection', 'ix_person_connection_target', ['target_id'], False),
+]
+
+person_connection = sa.table('person_connection',
+    sa.column('id', sa.Integer),
+    sa.column('source_id', sa.Integer),
+    sa.column('target_id', sa.Integer),
+    sa.column('relationship_type', sa.String),
+    sa.column('closeness', sa.Integer),
+    sa.column('sentiment', sa.Float),
+    sa.column('notes', sa.Text),
+    sa.column('last_updated', sa.DateTime),
+    sa.column('interaction_count', sa.Integer),
+    sa.column('mention_count', sa.Integer),
+)
+
+
+def normalize_connections(bind):
+    """Merge connections stored in both directions into one row per canonical pair"""
+    rows = bind.execute(sa.select(person_connection).order_by(person_connection.c.id)).mappings().all()
+
+    merged = {}
+    deleted = []
+    for row in rows:
+        if row['source_id'] == row['target_id']:
+            deleted.append(row['id'])
+            continue
+
+        pair = tuple(sorted((row['source_id'], row['target_id'])))
+        kept = merged.get(pair)
+        if kept is None:
+            merged[pair] = dict(row, source_id=pair[0], target_id=pair[1], changed=pair[0] != row['source_id'])
+            continue
+
+        total_mentions = (kept['mention_count'] or 0) + (row['mention_count'] or 0)
+        if total_mentions:
+            kept['sentiment'] = ((kept['sentiment'] or 0) * (kept['mention_count'] or 0) +
+                                 (row['sentiment'] or 0) * (row['mention_count'] or 0)) / total_mentions
+        kept['interaction_count'] = (kept['interaction_count'] or 0) + (row['interaction_count'] or 0)
+        kept['mention_count'] = total_mentions
+        kept['closeness'] = max(kept['closeness'] or 0, row['closeness'] or 0) or None
+        if (kept['relationship_type'] or 'unknown').lower() == 'unknown':
+            kept['relationship_type'] = row['relationship_type']
+        if row['notes']:
+            kept['notes'] = f"{kept['notes']}\n{row['notes']}" if kept['notes'] else row['notes']
+        kept['last_updated'] = max(filter(None, [kept['last_updated'], row['last_updated']]), default=None)
+        kept['changed'] = True
+        deleted.append(row['id'])
+
+    if deleted:
+        bind.execute(person_connection.delete().where(person_connection.c.id.in_(deleted)))
+    for kept in merged.values():
+        if kept.pop('changed'):
+            row_id = kept.pop('id')
+            bind.execute(person_connection.update().where(person_connection.c.id == row_id).values(**kept))
+
+
+def upgrade():
+    bind = op.get_bind()
+    normalize_connections(bind)
+
+    inspector = sa.inspect(bind)
+    for table, name, columns, unique in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for table, name, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,68 @@
+"""delta sync of entries, people and connections
+
+Revision ID: d4e8a1f09c35
+Revises: b61e0d4f7a28
+Create Date: 2026-10-18 00:52:06.418337
+
+Adds the sync_version stamps of journal entries, people and connections,
+the sync_floor of data_version and the sync_tombstone table behind
+/api/sync (see sync.py). Existing rows are stamped 0, which clients
+without a token get with their first, full sync.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e8a1f09c35'
+down_revision = 'b61e0d4f7a28'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('journal_entry', 'sync_version'),
+    ('person', 'sync_version'),
+    ('person_connection', 'sync_version'),
+    ('data_version', 'sync_floor'),
+]
+
+INDEXES = [
+    ('journal_entry', 'ix_journal_entry_user_sync', ['user_id', 'sync_version']),
+    ('person', 'ix_person_user_sync', ['user_id', 'sync_version']),
+    ('person_connection', 'ix_person_connection_sync', ['sync_version']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, column in COLUMNS:
+        if column not in {existing['name'] for existing in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column(column, sa.BigInteger(), server_default='0', nullable=False))
+
+    for table, name, columns in INDEXES:
+        if name not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=False)
+
+    if 'sync_tombstone' not in inspector.get_table_names():
+        op.create_table('sync_tombstone',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('record_type', sa.String(length=20), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_sync_tombstone_user_version', 'sync_tombstone', ['user_id', 'version'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_sync_tombstone_user_version', table_name='sync_tombstone')
+    op.drop_table('sync_tombstone')
+    for table, name, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    # Not in batch mode: recreating journal_entry would drop its search triggers
+    for table, column in reversed(COLUMNS):
+        op.drop_column(table, column)
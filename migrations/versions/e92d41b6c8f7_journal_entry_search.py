@@ -0,0 +1,73 @@
+"""full-text search over journal entries
+
+Revision ID: e92d41b6c8f7
+Revises: c5a7e19f4b63
+Create Date: 2026-10-18 00:19:12.554031
+
+SQLite gets an external-content FTS5 table, journal_entry_fts, kept in
+sync with journal_entry by triggers. PostgreSQL gets a generated
+search_vector tsvector column with a GIN index. Neither is part of the
+models; env.py excludes them from autogenerate and search.py queries them.
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e92d41b6c8f7'
+down_revision = 'c5a7e19f4b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE journal_entry ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+            ") STORED"
+        )
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS ix_journal_entry_search ON journal_entry USING gin (search_vector)'
+        )
+    elif dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS journal_entry_fts USING fts5("
+            "title, content, content='journal_entry', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS journal_entry_fts_insert AFTER INSERT ON journal_entry BEGIN '
+            'INSERT INTO journal_entry_fts (rowid, title, content) VALUES (new.id, new.title, new.content); '
+            'END'
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS journal_entry_fts_delete AFTER DELETE ON journal_entry BEGIN '
+            "INSERT INTO journal_entry_fts (journal_entry_fts, rowid, title, content) "
+            "VALUES ('delete', old.id, old.title, old.content); "
+            'END'
+        )
+        op.execute(
+            'CREATE TRIGGER IF NOT EXISTS journal_entry_fts_update AFTER UPDATE OF title, content ON journal_entry BEGIN '
+            "INSERT INTO journal_entry_fts (journal_entry_fts, rowid, title, content) "
+            "VALUES ('delete', old.id, old.title, old.content); "
+            'INSERT INTO journal_entry_fts (rowid, title, content) VALUES (new.id, new.title, new.content); '
+            'END'
+        )
+        # Index the existing entries
+        op.execute("INSERT INTO journal_entry_fts (journal_entry_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_journal_entry_search')
+        op.execute('ALTER TABLE journal_entry DROP COLUMN IF EXISTS search_vector')
+    elif dialect == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS journal_entry_fts_update')
+        op.execute('DROP TRIGGER IF EXISTS journal_entry_fts_delete')
+        op.execute('DROP TRIGGER IF EXISTS journal_entry_fts_insert')
+        op.execute('DROP TABLE IF EXISTS journal_entry_fts')
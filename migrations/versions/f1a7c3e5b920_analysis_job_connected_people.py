@@ -0,0 +1,31 @@
+"""people whose connections a queued entry already recorded
+
+Revision ID: f1a7c3e5b920
+Revises: d4e8a1f09c35
+Create Date: 2026-10-18 01:40:31.207816
+
+Adds analysis_job.connected_people, so the analysis worker only records
+the connections of an edited entry again when its people changed (see
+analysis.py). Queued jobs are left NULL and record their connections as
+before.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a7c3e5b920'
+down_revision = 'd4e8a1f09c35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('analysis_job')}
+    if 'connected_people' not in columns:
+        op.add_column('analysis_job', sa.Column('connected_people', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('analysis_job', schema=None) as batch_op:
+        batch_op.drop_column('connected_people')
@@ -1,11 +1,23 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import String, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 from werkzeug.security import generate_password_hash, check_password_hash
+from user_cache import CachedUser, invalidate_cached_user, load_cached_user
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Cached per process, so authenticated requests usually run no query for it
+    return load_cached_user(int(user_id), _load_user_fields)
+
+def _load_user_fields(user_id):
+    row = db.session.execute(
+        db.select(User.id, User.username, User.email).where(User.id == user_id)
+    ).one_or_none()
+    return CachedUser(*row) if row is not None else None
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -27,13 +39,27 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_cached_user(mapper, connection, user):
+    # Password and account changes must not be served from the user cache
+    invalidate_cached_user(user.id)
+
 class Person(db.Model):
+    __table_args__ = (
+        # People are listed per user and matched by name
+        db.Index('ix_person_user_name', 'user_id', 'name'),
+        # Changes are synced per user in data version order (see sync.py)
+        db.Index('ix_person_user_sync', 'user_id', 'sync_version'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     relationship_type = db.Column(db.String(50))  # e.g., friend, family, colleague
     description = db.Column(db.Text)
     date_added = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    sync_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Data version of the last change
     
     # Relationships
     journal_entries = db.relationship('JournalEntry', 
@@ -55,13 +81,27 @@ class Person(db.Model):
     
     def get_connections(self):
         """Get all connections for this person (both as source and target)"""
-        return self.connections_as_source.all() + self.connections_as_target.all()
+        return PersonConnection.query.filter(
+            (PersonConnection.source_id == self.id) | (PersonConnection.target_id == self.id)
+        ).order_by(PersonConnection.id).all()
     
     def __repr__(self):
         return f'<Person {self.name}>'
 
 class PersonConnection(db.Model):
-    """Represents a relationship between two people"""
+    """
+    Represents a relationship between two people.
+    
+    Connections are undirected: each pair is stored once, with
+    source_id < target_id (see connections.connection_pair).
+    """
+    __table_args__ = (
+        db.Index('ix_person_connection_pair', 'source_id', 'target_id', unique=True),
+        # Connections are also looked up from the target side
+        db.Index('ix_person_connection_target', 'target_id'),
+        db.Index('ix_person_connection_sync', 'sync_version'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     source_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
     target_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
@@ -77,10 +117,19 @@ class PersonConnection(db.Model):
     interaction_count = db.Column(db.Integer, default=0)
     mention_count = db.Column(db.Integer, default=0)
     
+    # Data version of the last change, in the data version of the people's user
+    sync_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    
     def __repr__(self):
         return f'<PersonConnection {self.source_id}-{self.target_id}: {self.relationship_type}>'
 
 class JournalEntry(db.Model):
+    __table_args__ = (
+        # Entries are listed per user, newest first, and paginated on (date_created, id)
+        db.Index('ix_journal_entry_user_date', 'user_id', 'date_created', 'id'),
+        db.Index('ix_journal_entry_user_sync', 'user_id', 'sync_version'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -94,11 +143,133 @@ class JournalEntry(db.Model):
     # Additional metadata for relationship analysis
     extracted_names = db.Column(db.Text)  # JSON string of names extracted from content
     
+    sync_version = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Data version of the last change
+    
     def __repr__(self):
         return f'<JournalEntry {self.title}>'
 
+class PersonStats(db.Model):
+    """Running journal entry statistics for a person, maintained by stats.py"""
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    sentiment_sum = db.Column(db.Float, nullable=False, default=0)  # Sum of non-null sentiment scores
+    sentiment_n = db.Column(db.Integer, nullable=False, default=0)  # Number of entries with a sentiment score
+    first_seen = db.Column(db.DateTime)
+    last_seen = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<PersonStats {self.person_id}: {self.entry_count} entries>'
+
+class PersonMonthStats(db.Model):
+    """Number of journal entries per person and month, maintained by stats.py"""
+    person_id = db.Column(db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True)  # 'YYYY-MM'
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PersonMonthStats {self.person_id} {self.month}: {self.entry_count}>'
+
+class DataVersion(db.Model):
+    """
+    Per-user counter bumped by every write to the user's data, maintained by data_version.py.
+    
+    Read APIs derive their ETags from it, so unchanged responses can be
+    revalidated with one primary key lookup. Changed rows are stamped with
+    the version of their change, which makes it the token of /api/sync.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    # Sync tokens older than this may miss pruned tombstones
+    sync_floor = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    
+    def __repr__(self):
+        return f'<DataVersion {self.user_id}: {self.version}>'
+
+class SyncTombstone(db.Model):
+    """
+    A deleted entry, person or connection, maintained by sync.py.
+    
+    Clients syncing from an older data version are told to drop the record.
+    Tombstones are pruned after a while with `flask prune-sync-tombstones`.
+    """
+    __table_args__ = (
+        db.Index('ix_sync_tombstone_user_version', 'user_id', 'version'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    record_type = db.Column(db.String(20), nullable=False)  # 'entries', 'people' or 'connections'
+    record_id = db.Column(db.Integer, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False)  # Data version of the delete
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SyncTombstone {self.record_type} {self.record_id}>'
+
+class AnalysisJob(db.Model):
+    """
+    A journal entry waiting for background analysis, maintained by analysis.py.
+    
+    There is at most one job per entry: saving an entry again while it is
+    queued bumps the revision instead of adding a job, so repeated edits are
+    analyzed once.
+    """
+    __table_args__ = (
+        # Workers claim the oldest unclaimed jobs first
+        db.Index('ix_analysis_job_queue', 'claimed_at', 'queued_at'),
+    )
+    
+    entry_id = db.Column(db.Integer, db.ForeignKey('journal_entry.id'), primary_key=True)
+    revision = db.Column(db.Integer, nullable=False, default=1)  # Bumped by every save while queued
+    queued_at = db.Column(db.DateTime, nullable=False)  # When the oldest unanalyzed save was made
+    claimed_at = db.Column(db.DateTime)
+    claimed_by = db.Column(db.String(64))
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # JSON list of the person ids the entry's connections were recorded for
+    # before it was queued, or null if they weren't
+    connected_people = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.entry_id} r{self.revision}>'
+
 # Association table for many-to-many relationship between JournalEntry and Person
 journal_person = db.Table('journal_person',
     db.Column('journal_entry_id', db.Integer, db.ForeignKey('journal_entry.id'), primary_key=True),
-    db.Column('person_id', db.Integer, db.ForeignKey('person.id'), primary_key=True)
+    db.Column('person_id', db.Integer, db.ForeignKey('person.id'), primary_key=True),
+    # The primary key covers lookups by entry; this one covers joins from a person
+    db.Index('ix_journal_person_person', 'person_id', 'journal_entry_id')
 )
+
+
+class month_bucket(FunctionElement):
+    """
+    SQL expression for the 'YYYY-MM' month of a datetime column.
+    
+    Compiles to to_char() on PostgreSQL and strftime() on SQLite, so entries
+    can be grouped by month in the database.
+    """
+    type = String()
+    inherit_cache = True
+
+@compiles(month_bucket)
+def _month_bucket_default(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+@compiles(month_bucket, 'sqlite')
+def _month_bucket_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+
+def dialect_insert(table):
+    """
+    Return an INSERT for `table` that supports on_conflict_do_update().
+    
+    Upserts are only available through the dialect-specific insert()
+    constructs, so this picks the one for the configured database.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise NotImplementedError(f'Upserts are not supported on {dialect}')
@@ -0,0 +1,84 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+
+
+class QueryCounter:
+    """Collects the SQL statements executed while it is active"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """
+    Count the SQL statements executed on `engine` by this thread inside the block.
+
+    Statements of other threads, e.g. the analysis worker, are not counted.
+    Defaults to the Flask-SQLAlchemy engine, so it must run inside an app
+    context. Yields a QueryCounter.
+    """
+    engine = engine or db.engine
+    counter = QueryCounter()
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            counter.statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(max_count, engine=None):
+    """
+    Fail with AssertionError if the block executes more than `max_count` SQL statements.
+
+    Use it around test-client requests to pin an endpoint's query budget:
+
+        with app.app_context(), assert_max_queries(3):
+            client.get('/api/visualizations/social-web')
+    """
+    with count_queries(engine) as counter:
+        yield counter
+
+    if counter.count > max_count:
+        statements = '\n'.join(counter.statements)
+        raise AssertionError(f'{counter.count} SQL statements executed, expected at most {max_count}:\n{statements}')
+
+
+def query_budget(max_count):
+    """
+    Declare the maximum number of SQL statements a view may execute.
+
+    The budget is only enforced when the app config sets
+    ENFORCE_QUERY_BUDGETS, which is the default when testing or debugging;
+    going over it then raises AssertionError. Apply it below
+    @login_required so the user lookup is not counted. The budget is kept
+    as the view's query_budget attribute, which decorators above it copy
+    with functools.wraps, so tests can find every budgeted view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('ENFORCE_QUERY_BUDGETS'):
+                return view(*args, **kwargs)
+            with assert_max_queries(max_count):
+                return view(*args, **kwargs)
+        wrapper.query_budget = max_count
+        return wrapper
+    return decorator
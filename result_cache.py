@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, request
+from flask_login import current_user
+
+from data_version import get_data_version
+from instrumentation import timed_phase
+
+DEFAULT_TTL = 600
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class CacheStats:
+    """Hit, miss, eviction and invalidation counters of one cache in this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0  # Dropped for space or because they expired
+        self.invalidations = 0  # Dropped because the user's data changed
+
+    def add(self, **counts):
+        with self.lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def as_dict(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'invalidations': self.invalidations}
+
+
+class NullCache:
+    """Cache backend that stores nothing, for RESULT_CACHE = 'none'"""
+
+    name = 'none'
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, user_id, version, key):
+        self.stats.add(misses=1)
+        return None
+
+    def set(self, user_id, version, key, value):
+        pass
+
+    def size(self):
+        return 0
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with a TTL.
+
+    Each server process has its own copy. Values for a user's older data
+    versions can't be read any more; they are dropped when looked up or
+    replaced, or when they reach the least recently used end, so storing a
+    value never scans the other entries.
+    """
+
+    name = 'memory'
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        # (user_id, key) -> (version, expires_at, value), least recently used first
+        self.entries = OrderedDict()
+
+    def get(self, user_id, version, key):
+        with self.lock:
+            item = self.entries.get((user_id, key))
+            if item is not None and item[0] < version:
+                del self.entries[user_id, key]
+                self.stats.add(misses=1, invalidations=1)
+                return None
+            if item is None or item[0] != version:
+                self.stats.add(misses=1)
+                return None
+            if item[1] < time.monotonic():
+                del self.entries[user_id, key]
+                self.stats.add(misses=1, evictions=1)
+                return None
+            self.entries.move_to_end((user_id, key))
+        self.stats.add(hits=1)
+        return item[2]
+
+    def set(self, user_id, version, key, value):
+        with self.lock:
+            replaced = self.entries.pop((user_id, key), None)
+            self.entries[user_id, key] = (version, time.monotonic() + self.ttl, value)
+            evicted = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+        invalidated = replaced is not None and replaced[0] < version
+        self.stats.add(invalidations=int(invalidated), evictions=evicted)
+
+    def size(self):
+        return len(self.entries)
+
+
+class SQLiteCache:
+    """
+    LRU cache with a TTL in a local SQLite file, shared by all server processes.
+
+    Every thread uses its own connection. Storing a value for a user drops
+    their values for older data versions. The counters are per process.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS result_cache ('
+                'user_id INTEGER NOT NULL, key TEXT NOT NULL, version INTEGER NOT NULL, value BLOB NOT NULL, '
+                'expires_at REAL NOT NULL, accessed_at REAL NOT NULL, PRIMARY KEY (user_id, key))'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_result_cache_accessed ON result_cache (accessed_at)')
+            self.local.connection = connection
+        return connection
+
+    def get(self, user_id, version, key):
+        connection = self.connection()
+        now = time.time()
+        row = connection.execute(
+            'SELECT value, expires_at FROM result_cache WHERE user_id = ? AND key = ? AND version = ?',
+            (user_id, key, version)
+        ).fetchone()
+        if row is None:
+            self.stats.add(misses=1)
+            return None
+        if row[1] < now:
+            connection.execute('DELETE FROM result_cache WHERE user_id = ? AND key = ?', (user_id, key))
+            self.stats.add(misses=1, evictions=1)
+            return None
+        # Recency only needs to be roughly right, so don't write on every hit
+        connection.execute(
+            'UPDATE result_cache SET accessed_at = ? WHERE user_id = ? AND key = ? AND accessed_at < ?',
+            (now, user_id, key, now - 1)
+        )
+        self.stats.add(hits=1)
+        return row[0]
+
+    def set(self, user_id, version, key, value):
+        connection = self.connection()
+        now = time.time()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            invalidated = connection.execute(
+                'DELETE FROM result_cache WHERE user_id = ? AND version < ?', (user_id, version)
+            ).rowcount
+            connection.execute(
+                'INSERT OR REPLACE INTO result_cache (user_id, key, version, value, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (user_id, key, version, value, now + self.ttl, now)
+            )
+            evicted = connection.execute('DELETE FROM result_cache WHERE expires_at < ?', (now,)).rowcount
+            evicted += connection.execute(
+                'DELETE FROM result_cache WHERE rowid IN (SELECT rowid FROM result_cache ORDER BY accessed_at '
+                'LIMIT max(0, (SELECT count(*) FROM result_cache) - ?))',
+                (self.max_entries,)
+            ).rowcount
+        self.stats.add(invalidations=invalidated, evictions=evicted)
+
+    def size(self):
+        return self.connection().execute('SELECT count(*) FROM result_cache').fetchone()[0]
+
+
+_cache_lock = threading.Lock()
+
+
+def create_result_cache(config, instance_path):
+    """Build the cache backend selected by RESULT_CACHE ('memory', 'sqlite' or 'none')"""
+    backend = config.get('RESULT_CACHE', 'memory')
+    ttl = config.get('RESULT_CACHE_TTL', DEFAULT_TTL)
+    max_entries = config.get('RESULT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+    if backend == 'memory':
+        return MemoryCache(ttl, max_entries)
+    if backend == 'sqlite':
+        path = config.get('RESULT_CACHE_PATH') or os.path.join(instance_path, 'result_cache.sqlite3')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        return SQLiteCache(path, ttl, max_entries)
+    if backend == 'none':
+        return NullCache()
+    raise ValueError(f'Unknown RESULT_CACHE backend {backend!r}')
+
+
+def get_result_cache():
+    """Return the app's result cache in this process, creating it on first use"""
+    cache = current_app.extensions.get('result_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.get('result_cache')
+            if cache is None:
+                cache = current_app.extensions['result_cache'] = create_result_cache(
+                    current_app.config, current_app.instance_path)
+    return cache
+
+
+def result_cache_stats():
+    """Return the backend, size and counters of the result cache"""
+    cache = get_result_cache()
+    stats = cache.stats.as_dict()
+    stats['backend'] = cache.name
+    stats['size'] = cache.size()
+    return stats
+
+
+def cached_result(view):
+    """
+    Cache the JSON body of a per-user GET view by user and data version.
+
+    A write bumps the user's data version, so it invalidates their cached
+    results at once; each backend then drops the older versions' values
+    (see MemoryCache and SQLiteCache). Put it below @data_version_etag,
+    whose version it reuses, and above @query_budget, so hits run no
+    queries.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = g.get('data_version')
+        if version is None:
+            version = get_data_version(current_user.id)
+        cache = get_result_cache()
+        key = request.full_path
+
+        with timed_phase('cache'):
+            body = cache.get(current_user.id, version, key)
+        if body is not None:
+            return Response(body, mimetype='application/json')
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code == 200 and response.mimetype == 'application/json':
+            with timed_phase('cache'):
+                cache.set(current_user.id, version, key, response.get_data())
+        return response
+    return wrapper
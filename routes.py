@@ -1,26 +1,56 @@
 import logging
-from flask import render_template, redirect, url_for, flash, request, jsonify, session
+from flask import (Blueprint, current_app, g, render_template, redirect, url_for, flash, request, jsonify, session,
+                   Response, stream_with_context)
 from markupsafe import Markup  # Use markupsafe instead of flask for Markup
 from flask_login import login_user, logout_user, login_required, current_user
-from app import app, db
-from models import User, Person, JournalEntry, PersonConnection
-from utils import analyze_sentiment, extract_potential_names
+from app import db
+from models import User, Person, JournalEntry, PersonConnection, PersonMonthStats, PersonStats, journal_person
+from query_count import query_budget
+from data_version import bump_data_version, data_version_etag, get_data_version
+from result_cache import cached_result, result_cache_stats
+from instrumentation import metrics, timed_phase
+from user_cache import clear_session_user, user_cache_stats
+from stats import add_entry_stats, delete_person_stats, remove_entry_stats
+from connections import connection_pair, record_entry_connections, save_connection
+from search import search_entries
+from graph import get_user_graph, graph_cache_stats
+from layout import LAYOUT_MODES, add_layout
+from sync import (SYNC_PAGE_SIZE, SYNC_TYPES, changed_connections, changed_entries, changed_people,
+                  decode_sync_cursor, decode_sync_token, deleted_records, encode_sync_cursor, encode_sync_token,
+                  record_tombstones, sync_since)
+from importer import DEFAULT_IMPORT_BATCH_SIZE, JournalImportError, import_journal
+from export import EXPORT_TYPES, export_csv, export_ndjson
+from analysis import (analysis_queue_stats, cancel_analysis, enqueue_analysis, notify_analysis_worker,
+                      analysis_status, start_analysis_worker)
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+from utils import invalidate_name_matcher
+import base64
 import json
 from datetime import datetime
-import re
+
+# HTML pages and authentication
+pages = Blueprint('pages', __name__)
+# JSON API and metrics
+api = Blueprint('api', __name__)
+
+@api.before_app_request
+def ensure_analysis_worker():
+    # Started on the first request so every server process gets its own worker
+    start_analysis_worker(current_app._get_current_object())
 
 # Home route
-@app.route('/')
+@pages.route('/')
 def index():
     if current_user.is_authenticated:
         return render_template('index.html')
-    return redirect(url_for('login'))
+    return redirect(url_for('pages.login'))
 
 # Authentication routes
-@app.route('/login', methods=['GET', 'POST'])
+@pages.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('pages.index'))
         
     if request.method == 'POST':
         username = request.form.get('username')
@@ -31,16 +61,16 @@ def login():
         if user and user.check_password(password):
             login_user(user)
             next_page = request.args.get('next')
-            return redirect(next_page or url_for('index'))
+            return redirect(next_page or url_for('pages.index'))
         else:
             flash('Invalid username or password', 'danger')
             
     return render_template('login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@pages.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('pages.index'))
         
     if request.method == 'POST':
         username = request.form.get('username')
@@ -64,57 +94,203 @@ def register():
         db.session.commit()
         
         flash('Account created successfully! Please log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('pages.login'))
         
     return render_template('register.html')
 
-@app.route('/logout')
+@pages.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('login'))
+    clear_session_user()
+    return redirect(url_for('pages.login'))
 
 # Journal routes
-@app.route('/journal')
+@pages.route('/journal')
 @login_required
 def journal():
     return render_template('journal.html')
 
-@app.route('/api/journal-entries', methods=['GET'])
+# Fields that can be requested from the journal entries list with ?fields=
+ENTRY_FIELDS = ('title', 'content', 'content_with_highlights', 'date_created', 'mood',
+                'sentiment_score', 'interaction_type', 'people', 'extracted_names')
+DEFAULT_ENTRIES_PAGE_SIZE = 50
+MAX_ENTRIES_PAGE_SIZE = 200
+
+def encode_entry_cursor(entry):
+    """Encode an entry's (date_created, id) sort key as an opaque cursor"""
+    raw = f'{entry.date_created.isoformat()}|{entry.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_entry_cursor(cursor):
+    """Decode a cursor from encode_entry_cursor, raising ValueError if it is malformed"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    date_created, entry_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(date_created), int(entry_id)
+
+def load_entry_people(entry_ids):
+    """Load the people linked to each of `entry_ids` in one query, as {entry_id: [{'id', 'name'}]}"""
+    people_by_entry = {entry_id: [] for entry_id in entry_ids}
+    if not entry_ids:
+        return people_by_entry
+    
+    rows = db.session.query(journal_person.c.journal_entry_id, Person.id, Person.name).join(
+        Person, Person.id == journal_person.c.person_id
+    ).filter(journal_person.c.journal_entry_id.in_(entry_ids)).order_by(Person.id).all()
+    
+    for entry_id, person_id, name in rows:
+        people_by_entry[entry_id].append({'id': person_id, 'name': name})
+    return people_by_entry
+
+def serialize_entry(entry, fields=ENTRY_FIELDS, people=None):
+    """
+    Serialize a journal entry for the entries list, limited to `fields`.
+    
+    `people` is the entry's preloaded people list; it is queried from the
+    entry when not given.
+    """
+    result = {'id': entry.id}
+    
+    for field in fields:
+        if field == 'date_created':
+            result['date_created'] = entry.date_created.strftime('%Y-%m-%d %H:%M:%S')
+        elif field == 'people':
+            if people is None:
+                people = [{'id': person.id, 'name': person.name} for person in entry.people]
+            result['people'] = people
+        elif field == 'extracted_names':
+            # Extract potential names if present
+            extracted_names = []
+            if entry.extracted_names:
+                try:
+                    extracted_names = json.loads(entry.extracted_names)
+                except ValueError:
+                    # If JSON parsing fails, use empty list
+                    pass
+            result['extracted_names'] = extracted_names
+        else:
+            result[field] = getattr(entry, field)
+    
+    return result
+
+@api.route('/api/journal-entries', methods=['GET'])
 @login_required
+@data_version_etag
+@query_budget(2)
 def get_journal_entries():
-    entries = JournalEntry.query.filter_by(user_id=current_user.id).order_by(JournalEntry.date_created.desc()).all()
+    """
+    Get a page of the current user's journal entries, newest first.
     
-    result = []
-    for entry in entries:
-        people_list = [{'id': person.id, 'name': person.name} for person in entry.people]
-        
-        # Extract potential names if present
-        extracted_names = []
-        if entry.extracted_names:
-            try:
-                extracted_names = json.loads(entry.extracted_names)
-            except:
-                # If JSON parsing fails, use empty list
-                pass
-        
-        result.append({
-            'id': entry.id,
-            'title': entry.title,
-            'content': entry.content,
-            'content_with_highlights': entry.content_with_highlights,
-            'date_created': entry.date_created.strftime('%Y-%m-%d %H:%M:%S'),
-            'mood': entry.mood,
-            'sentiment_score': entry.sentiment_score,
-            'interaction_type': entry.interaction_type,
-            'people': people_list,
-            'extracted_names': extracted_names
-        })
+    Query parameters:
+    - limit: page size (default 50, at most 200)
+    - cursor: the next_cursor returned with the previous page
+    - fields: comma-separated subset of ENTRY_FIELDS to include (default: all)
     
-    return jsonify(result)
+    Returns {'entries': [...], 'next_cursor': str or None}.
+    """
+    try:
+        limit = int(request.args.get('limit', DEFAULT_ENTRIES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, MAX_ENTRIES_PAGE_SIZE))
+    
+    fields = ENTRY_FIELDS
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in ENTRY_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    # Only load the columns that will be serialized
+    columns = [getattr(JournalEntry, field) for field in fields
+               if field != 'people' and field != 'date_created']
+    query = JournalEntry.query.options(
+        load_only(JournalEntry.id, JournalEntry.date_created, *columns)
+    ).filter_by(user_id=current_user.id)
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_entry_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(or_(
+            JournalEntry.date_created < cursor_date,
+            and_(JournalEntry.date_created == cursor_date, JournalEntry.id < cursor_id)
+        ))
+    
+    # Fetch one extra row to find out whether there is another page
+    with timed_phase('query'):
+        entries = query.order_by(JournalEntry.date_created.desc(), JournalEntry.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_entry_cursor(entries[limit - 1]) if len(entries) > limit else None
+    entries = entries[:limit]
+    
+    people_by_entry = {}
+    if 'people' in fields:
+        with timed_phase('people'):
+            people_by_entry = load_entry_people([entry.id for entry in entries])
+    
+    with timed_phase('serialize'):
+        serialized = [serialize_entry(entry, fields, people_by_entry.get(entry.id)) for entry in entries]
+    return jsonify({'entries': serialized, 'next_cursor': next_cursor})
+
+@api.route('/api/journal-entries/search', methods=['GET'])
+@login_required
+@data_version_etag
+@query_budget(2)
+def search_journal_entries():
+    """
+    Full-text search over the current user's journal entries, best matches first.
+    
+    Query parameters:
+    - q: the search text (required)
+    - person_id, mood, interaction_type: only return matching entries
+    - date_from, date_to: inclusive YYYY-MM-DD date range
+    - limit (default 20, at most 100) and offset: paging
+    
+    Returns {'results': [...], 'next_offset': int or None}. Each result has
+    the entry fields, its people, a 'snippet' of HTML with <mark>ed matches
+    and a relevance 'rank'.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search text is required'}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        offset = max(0, int(request.args.get('offset', 0)))
+        person_id = request.args.get('person_id', type=int)
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d') if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d') if date_to else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, offset or date'}), 400
+    
+    # Fetch one extra result to find out whether there is another page
+    results = search_entries(
+        current_user.id, query,
+        person_id=person_id,
+        mood=request.args.get('mood'),
+        interaction_type=request.args.get('interaction_type'),
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit + 1,
+        offset=offset
+    )
+    next_offset = offset + limit if len(results) > limit else None
+    results = results[:limit]
+    
+    people_by_entry = load_entry_people([result['id'] for result in results])
+    for result in results:
+        result['date_created'] = result['date_created'].strftime('%Y-%m-%d %H:%M:%S')
+        result['people'] = people_by_entry[result['id']]
+    
+    return jsonify({'results': results, 'next_offset': next_offset})
 
-@app.route('/api/journal-entries/<int:entry_id>', methods=['GET'])
+@api.route('/api/journal-entries/<int:entry_id>', methods=['GET'])
 @login_required
+@data_version_etag
 def get_journal_entry(entry_id):
     entry = JournalEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
     
@@ -128,12 +304,107 @@ def get_journal_entry(entry_id):
         'mood': entry.mood,
         'sentiment_score': entry.sentiment_score,
         'interaction_type': entry.interaction_type,
-        'people': people_list
+        'people': people_list,
+        'analysis_status': analysis_status([entry.id]).get(entry.id, 'ready')
     }
     
     return jsonify(result)
 
-@app.route('/api/journal-entries', methods=['POST'])
+@api.route('/api/journal-entries/analysis', methods=['GET'])
+@login_required
+@data_version_etag
+@query_budget(2)
+def get_journal_entries_analysis():
+    """
+    Poll the background analysis of some of the current user's entries.
+    
+    Query parameters:
+    - ids: comma-separated entry ids (at most 100)
+    
+    Returns {'entries': [...]} with each found entry's 'id' and
+    'analysis_status', one of 'pending', 'failed' or 'ready'; analyzed
+    entries also include their 'sentiment_score', 'content_with_highlights'
+    and 'extracted_names'.
+    """
+    try:
+        entry_ids = [int(entry_id) for entry_id in request.args.get('ids', '').split(',') if entry_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers'}), 400
+    if not entry_ids or len(entry_ids) > 100:
+        return jsonify({'error': 'Between 1 and 100 ids are required'}), 400
+    
+    entries = JournalEntry.query.options(load_only(
+        JournalEntry.id, JournalEntry.sentiment_score, JournalEntry.content_with_highlights,
+        JournalEntry.extracted_names
+    )).filter(JournalEntry.id.in_(entry_ids), JournalEntry.user_id == current_user.id).all()
+    statuses = analysis_status([entry.id for entry in entries])
+    
+    results = []
+    for entry in entries:
+        if entry.id in statuses:
+            results.append({'id': entry.id, 'analysis_status': statuses[entry.id]})
+        else:
+            result = serialize_entry(entry, ('sentiment_score', 'content_with_highlights', 'extracted_names'))
+            result['analysis_status'] = 'ready'
+            results.append(result)
+    
+    return jsonify({'entries': results})
+
+@api.route('/api/analysis-queue', methods=['GET'])
+@login_required
+def get_analysis_queue():
+    """Report the depth and lag of the background analysis queue"""
+    return jsonify(analysis_queue_stats())
+
+@api.route('/api/result-cache', methods=['GET'])
+@login_required
+def get_result_cache_stats():
+    """Report the backend, size and hit/miss/eviction counters of the visualization cache"""
+    return jsonify(result_cache_stats())
+
+# Without a METRICS_TOKEN, /metrics is only served to these clients
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Export this process's request metrics in the Prometheus text format.
+    
+    Includes per-endpoint latency histograms, SQL and phase totals of
+    sampled requests, the analysis queue and the result, graph and user
+    cache counters.
+    If METRICS_TOKEN is set, it must be sent as a bearer token; otherwise
+    only requests from the loopback address are served.
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return Response('Forbidden\n', 403, mimetype='text/plain')
+    
+    queue = analysis_queue_stats()
+    cache = result_cache_stats()
+    graphs = graph_cache_stats()
+    extra = [
+        ('journal_analysis_queue_depth', 'gauge', 'Entries waiting for analysis.', queue['depth']),
+        ('journal_analysis_queue_claimed', 'gauge', 'Queued entries being analyzed.', queue['claimed']),
+        ('journal_analysis_queue_failed', 'gauge', 'Queued entries that gave up after retries.', queue['failed']),
+        ('journal_analysis_queue_lag_seconds', 'gauge', 'Age of the oldest queued save.', queue['lag_seconds']),
+        ('journal_result_cache_entries', 'gauge', 'Results in the visualization cache.', cache['size']),
+    ]
+    extra.extend((f'journal_result_cache_{name}_total', 'counter', f'Visualization cache {name}.', cache[name])
+                 for name in ('hits', 'misses', 'evictions', 'invalidations'))
+    extra.append(('journal_graph_cache_entries', 'gauge', 'Social web graphs cached in memory.', graphs['size']))
+    extra.extend((f'journal_graph_cache_{name}_total', 'counter', f'Graph cache {name}.', graphs[name])
+                 for name in ('hits', 'misses', 'invalidations'))
+    users = user_cache_stats()
+    extra.append(('journal_user_cache_entries', 'gauge', 'Logged-in users cached in memory.', users['size']))
+    extra.extend((f'journal_user_cache_{name}_total', 'counter', f'User cache {name}.', users[name])
+                 for name in ('hits', 'misses'))
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/journal-entries', methods=['POST'])
 @login_required
 def create_journal_entry():
     data = request.json
@@ -149,174 +420,77 @@ def create_journal_entry():
     if not title or not content:
         return jsonify({'error': 'Title and content are required'}), 400
     
-    # Analyze sentiment
-    sentiment_score = analyze_sentiment(content)
-    
-    # Extract potential names from content
-    potential_names = extract_potential_names(content)
-    
-    # Get existing people names for comparison
-    existing_people = Person.query.filter_by(user_id=current_user.id).all()
-    existing_names = {person.name for person in existing_people}
+    # Stamp the entry with the new data version, so it is synced to clients
+    version = bump_data_version([current_user.id])[current_user.id]
     
-    # Extract names not in existing people
-    new_names = [name for name in potential_names if name not in existing_names]
-    
-    # Create content with highlighted names
-    content_with_highlights = content
-    known_people = {}
-    
-    # Add highlights for existing people first
-    for person in existing_people:
-        if person.name in content:
-            # Create a case-insensitive pattern to find the name
-            pattern = re.compile(r'\b' + re.escape(person.name) + r'\b', re.IGNORECASE)
-            
-            # Highlight with person ID for linking
-            highlight = f'<span class="person-highlight known" data-person-id="{person.id}">{person.name}</span>'
-            content_with_highlights = pattern.sub(highlight, content_with_highlights)
-            known_people[person.name] = person.id
-    
-    # Add highlights for potential new people
-    for name in new_names:
-        if name in content:
-            pattern = re.compile(r'\b' + re.escape(name) + r'\b', re.IGNORECASE)
-            highlight = f'<span class="person-highlight new">{name}</span>'
-            content_with_highlights = pattern.sub(highlight, content_with_highlights)
-    
-    # Create journal entry with extracted data
+    # Create journal entry; sentiment, highlights and extracted names are
+    # filled in by the background analysis worker
     new_entry = JournalEntry(
         title=title,
         content=content,
-        content_with_highlights=content_with_highlights,
         mood=mood,
         interaction_type=interaction_type,
-        sentiment_score=sentiment_score,
         user_id=current_user.id,
-        extracted_names=json.dumps(potential_names)
+        sync_version=version
     )
     
     # Add associated people
     entry_people = []
-    for person_id in people_ids:
-        person = Person.query.filter_by(id=person_id, user_id=current_user.id).first()
-        if person:
-            new_entry.people.append(person)
-            entry_people.append(person)
-    
-    db.session.add(new_entry)
-    db.session.commit()
+    with timed_phase('people'):
+        # The entry isn't in the session yet, so the lookups mustn't flush its people
+        with db.session.no_autoflush:
+            for person_id in people_ids:
+                person = Person.query.filter_by(id=person_id, user_id=current_user.id).first()
+                if person:
+                    new_entry.people.append(person)
+                    entry_people.append(person)
+        
+        db.session.add(new_entry)
+        db.session.flush()
     
-    # Process relationships between people mentioned in this entry
-    if len(entry_people) > 1 and interaction_type:
-        # If multiple people are mentioned in a single entry,
-        # create or update relationships between them
-        for i in range(len(entry_people)):
-            for j in range(i + 1, len(entry_people)):
-                source_person = entry_people[i]
-                target_person = entry_people[j]
-                
-                # Check if a connection already exists
-                connection = PersonConnection.query.filter(
-                    (PersonConnection.source_id == source_person.id) & 
-                    (PersonConnection.target_id == target_person.id)
-                ).first()
-                
-                if not connection:
-                    # Check the reverse direction
-                    connection = PersonConnection.query.filter(
-                        (PersonConnection.source_id == target_person.id) & 
-                        (PersonConnection.target_id == source_person.id)
-                    ).first()
-                
-                if connection:
-                    # Update existing connection
-                    connection.interaction_count += 1
-                    # Update sentiment with a weighted average
-                    connection.sentiment = (connection.sentiment * connection.mention_count + sentiment_score) / (connection.mention_count + 1)
-                    connection.mention_count += 1
-                    connection.last_updated = datetime.utcnow()
-                else:
-                    # Create new connection
-                    connection = PersonConnection(
-                        source_id=source_person.id,
-                        target_id=target_person.id,
-                        relationship_type="unknown",  # Default
-                        closeness=1,  # Start with a low closeness
-                        sentiment=sentiment_score,
-                        interaction_count=1,
-                        mention_count=1
-                    )
-                    db.session.add(connection)
+    # Count the entry in the stats of its people; its sentiment is added once analyzed
+    with timed_phase('stats'):
+        add_entry_stats([person.id for person in entry_people], new_entry.date_created, None)
     
-    db.session.commit()
+    # The worker also records the relationships between the entry's people
+    with timed_phase('enqueue'):
+        enqueue_analysis(new_entry.id)
+    with timed_phase('commit'):
+        db.session.commit()
+    notify_analysis_worker()
     
-    # Return data includes highlighted content and extracted names
     response_data = {
         'id': new_entry.id, 
         'message': 'Journal entry created successfully',
-        'content_with_highlights': content_with_highlights,
-        'potential_new_names': new_names,
-        'known_people': known_people
+        'analysis_status': 'pending'
     }
     
     return jsonify(response_data), 201
 
-@app.route('/api/journal-entries/<int:entry_id>', methods=['PUT'])
+@api.route('/api/journal-entries/<int:entry_id>', methods=['PUT'])
 @login_required
 def update_journal_entry(entry_id):
     entry = JournalEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
+    version = bump_data_version([current_user.id])[current_user.id]
+    entry.sync_version = version
     
     data = request.json
     content_changed = False
     sentiment_score = entry.sentiment_score
+    old_sentiment_score = entry.sentiment_score
+    old_interaction_type = entry.interaction_type
     
     # Update fields
     if 'title' in data:
         entry.title = data['title']
-    if 'content' in data:
-        content = data['content']
-        entry.content = content
+    if 'content' in data and data['content'] != entry.content:
+        entry.content = data['content']
         content_changed = True
-        # Re-analyze sentiment if content changed
-        sentiment_score = analyze_sentiment(content)
-        entry.sentiment_score = sentiment_score
-        
-        # Extract potential names from content
-        potential_names = extract_potential_names(content)
-        
-        # Get existing people names for comparison
-        existing_people = Person.query.filter_by(user_id=current_user.id).all()
-        existing_names = {person.name for person in existing_people}
-        
-        # Extract names not in existing people
-        new_names = [name for name in potential_names if name not in existing_names]
-        
-        # Create content with highlighted names
-        content_with_highlights = content
-        known_people = {}
-        
-        # Add highlights for existing people first
-        for person in existing_people:
-            if person.name in content:
-                # Create a case-insensitive pattern to find the name
-                pattern = re.compile(r'\b' + re.escape(person.name) + r'\b', re.IGNORECASE)
-                
-                # Highlight with person ID for linking
-                highlight = f'<span class="person-highlight known" data-person-id="{person.id}">{person.name}</span>'
-                content_with_highlights = pattern.sub(highlight, content_with_highlights)
-                known_people[person.name] = person.id
-        
-        # Add highlights for potential new people
-        for name in new_names:
-            if name in content:
-                pattern = re.compile(r'\b' + re.escape(name) + r'\b', re.IGNORECASE)
-                highlight = f'<span class="person-highlight new">{name}</span>'
-                content_with_highlights = pattern.sub(highlight, content_with_highlights)
-        
-        # Update highlighted content and extracted names
-        entry.content_with_highlights = content_with_highlights
-        entry.extracted_names = json.dumps(potential_names)
+        # Clear the analysis of the old content until the worker redoes it
+        sentiment_score = None
+        entry.sentiment_score = None
+        entry.content_with_highlights = None
+        entry.extracted_names = None
         
     if 'mood' in data:
         entry.mood = data['mood']
@@ -328,134 +502,311 @@ def update_journal_entry(entry_id):
     entry_people = []
     
     if 'people_ids' in data:
-        # Clear existing people
-        entry.people = []
-        
-        # Add new people
-        for person_id in data['people_ids']:
-            person = Person.query.filter_by(id=person_id, user_id=current_user.id).first()
-            if person:
-                entry.people.append(person)
-                entry_people.append(person)
-    
-    db.session.commit()
-    
-    # Process relationships between people mentioned in this entry if people changed
-    if len(entry_people) > 1 and entry.interaction_type and (
-        content_changed or set(old_people) != set(entry_people)):
-        # If multiple people are mentioned in a single entry,
-        # create or update relationships between them
-        for i in range(len(entry_people)):
-            for j in range(i + 1, len(entry_people)):
-                source_person = entry_people[i]
-                target_person = entry_people[j]
-                
-                # Check if a connection already exists
-                connection = PersonConnection.query.filter(
-                    (PersonConnection.source_id == source_person.id) & 
-                    (PersonConnection.target_id == target_person.id)
-                ).first()
-                
-                if not connection:
-                    # Check the reverse direction
-                    connection = PersonConnection.query.filter(
-                        (PersonConnection.source_id == target_person.id) & 
-                        (PersonConnection.target_id == source_person.id)
-                    ).first()
-                
-                if connection:
-                    # Update existing connection
-                    connection.interaction_count += 1
-                    # Update sentiment with a weighted average
-                    connection.sentiment = (connection.sentiment * connection.mention_count + sentiment_score) / (connection.mention_count + 1)
-                    connection.mention_count += 1
-                    connection.last_updated = datetime.utcnow()
-                else:
-                    # Create new connection
-                    connection = PersonConnection(
-                        source_id=source_person.id,
-                        target_id=target_person.id,
-                        relationship_type="unknown",  # Default
-                        closeness=1,  # Start with a low closeness
-                        sentiment=sentiment_score,
-                        interaction_count=1,
-                        mention_count=1
-                    )
-                    db.session.add(connection)
-        
+        with timed_phase('people'):
+            # Clear existing people
+            entry.people = []
+            
+            # Add new people; the lookups mustn't flush the half-built list
+            with db.session.no_autoflush:
+                for person_id in data['people_ids']:
+                    person = Person.query.filter_by(id=person_id, user_id=current_user.id).first()
+                    if person:
+                        entry.people.append(person)
+                        entry_people.append(person)
+    
+    # Move the entry's contribution in the people stats if its sentiment or people changed
+    old_people_ids = {person.id for person in old_people}
+    new_people_ids = {person.id for person in entry_people} if 'people_ids' in data else old_people_ids
+    if sentiment_score != old_sentiment_score or new_people_ids != old_people_ids:
+        with timed_phase('stats'):
+            remove_entry_stats(old_people_ids, entry.date_created, old_sentiment_score)
+            add_entry_stats(new_people_ids, entry.date_created, sentiment_score)
+    
+    with timed_phase('enqueue'):
+        status = analysis_status([entry.id]).get(entry.id, 'ready')
+        if content_changed:
+            # The worker re-analyzes the content and records the relationships
+            # between the entry's people, unless an analyzed entry already
+            # recorded them for the same people
+            recorded = status == 'ready' and len(old_people_ids) > 1 and old_interaction_type
+            enqueue_analysis(entry.id, old_people_ids if recorded else None)
+            status = 'pending'
+    if status == 'ready' and len(entry_people) > 1 and entry.interaction_type and set(old_people) != set(entry_people):
+        # Process relationships between people mentioned in this entry if people changed
+        with timed_phase('connections'):
+            record_entry_connections([person.id for person in entry_people], sentiment_score, version)
+    
+    with timed_phase('commit'):
         db.session.commit()
-    
-    # Include highlighted content in response if content changed
-    response_data = {'message': 'Journal entry updated successfully'}
     if content_changed:
-        # These are already defined in the content block
-        # We don't need to recreate them here
-        response_data['content_with_highlights'] = entry.content_with_highlights
-        
-        # Reuse existing variable or extract from JSON
-        if 'potential_names' in locals():
-            # Get existing people names for comparison
-            existing_people = Person.query.filter_by(user_id=current_user.id).all()
-            existing_names = {person.name for person in existing_people}
-            
-            # Extract names not in existing people
-            new_names = [name for name in potential_names if name not in existing_names]
-            response_data['potential_new_names'] = new_names
-            
-            if 'known_people' in locals():
-                response_data['known_people'] = known_people
+        notify_analysis_worker()
     
-    return jsonify(response_data)
+    return jsonify({
+        'message': 'Journal entry updated successfully',
+        'analysis_status': status
+    })
 
-@app.route('/api/journal-entries/<int:entry_id>', methods=['DELETE'])
+@api.route('/api/journal-entries/<int:entry_id>', methods=['DELETE'])
 @login_required
 def delete_journal_entry(entry_id):
     entry = JournalEntry.query.filter_by(id=entry_id, user_id=current_user.id).first_or_404()
+    people_ids = [person.id for person in entry.people]
     
+    cancel_analysis(entry.id)
     db.session.delete(entry)
+    remove_entry_stats(people_ids, entry.date_created, entry.sentiment_score)
+    version = bump_data_version([current_user.id])[current_user.id]
+    record_tombstones(current_user.id, version, 'entries', [entry.id])
     db.session.commit()
     
     return jsonify({'message': 'Journal entry deleted successfully'})
 
-# People routes
-@app.route('/people')
+@api.route('/api/journal-entries/import', methods=['POST'])
 @login_required
-def people():
-    return render_template('people.html')
+def import_journal_entries():
+    """
+    Bulk import journal entries from an NDJSON request body.
+    
+    Each line is an entry like the body of POST /api/journal-entries, with an
+    optional ISO 8601 'date_created' and a 'people' list of existing people's
+    names. The body is streamed and written in batches, each in its own
+    transaction.
+    
+    Query parameters:
+    - skip: number of lines to skip, to resume an interrupted import
+    - batch_size: lines per transaction (default 500, at most 5000)
+    
+    The response is NDJSON too: one progress line per committed batch
+    ({'lines', 'imported', 'failed', 'errors'}), then a final line with
+    'done': true, or with an 'error' and the 'resume_from' to pass as skip.
+    """
+    try:
+        skip = max(0, int(request.args.get('skip', 0)))
+        batch_size = max(1, min(int(request.args.get('batch_size', DEFAULT_IMPORT_BATCH_SIZE)), 5000))
+    except ValueError:
+        return jsonify({'error': 'skip and batch_size must be integers'}), 400
+    
+    user_id = current_user.id
+    workers = current_app.config.get('IMPORT_WORKERS')
+    
+    def generate():
+        progress = {'lines': skip, 'imported': 0, 'failed': 0}
+        try:
+            for progress in import_journal(user_id, request.stream, skip, batch_size, workers):
+                yield json.dumps(progress) + '\n'
+        except JournalImportError as e:
+            logging.exception('Journal import failed')
+            yield json.dumps({'error': 'Import failed', 'resume_from': e.resume_from}) + '\n'
+            return
+        yield json.dumps({'done': True, 'lines': progress['lines'], 'imported': progress['imported'],
+                          'failed': progress['failed']}) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
-@app.route('/api/people', methods=['GET'])
+@api.route('/api/export', methods=['GET'])
 @login_required
-def get_people():
-    people = Person.query.filter_by(user_id=current_user.id).all()
-    
-    result = []
-    for person in people:
-        result.append({
-            'id': person.id,
-            'name': person.name,
-            'relationship_type': person.relationship_type,
-            'description': person.description,
-            'date_added': person.date_added.strftime('%Y-%m-%d %H:%M:%S')
-        })
+def export_data():
+    """
+    Stream a download of the current user's people, entries and connections.
+    
+    Query parameters:
+    - format: 'ndjson' (default), one JSON record per line tagged with its
+      'type', or 'csv', which holds a single type
+    - types: comma-separated subset of people, entries, connections
+      (default: all); exactly one for CSV
+    - since: a sync token, from GET /api/sync or the X-Sync-Token of an
+      earlier export; only export what was added or changed after it, for
+      incremental backups
+    
+    Rows are streamed from the database in batches while the response is
+    written, so memory use doesn't grow with the size of the export. The
+    X-Sync-Token response header holds the token to pass as since next time.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    
+    types = EXPORT_TYPES
+    if request.args.get('types'):
+        types = [record_type.strip() for record_type in request.args['types'].split(',') if record_type.strip()]
+        unknown = [record_type for record_type in types if record_type not in EXPORT_TYPES]
+        if unknown:
+            return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+    if export_format == 'csv' and len(types) != 1:
+        return jsonify({'error': 'CSV exports hold exactly one of: ' + ', '.join(EXPORT_TYPES)}), 400
+    
+    # Read before the data, so changes committed meanwhile are in the next export
+    version = get_data_version(current_user.id)
+    since = None
+    if request.args.get('since'):
+        try:
+            token_user_id, since = decode_sync_token(request.args['since'])
+        except ValueError:
+            return jsonify({'error': 'since must be a sync token'}), 400
+        if token_user_id != current_user.id or since > version:
+            return jsonify({'error': 'since is not a sync token of this account'}), 400
+    
+    if export_format == 'csv':
+        body = export_csv(current_user.id, version, types[0], since)
+        mimetype = 'text/csv'
+        filename = f'journal-{types[0]}.csv'
+    else:
+        body = export_ndjson(current_user.id, version, types, since)
+        mimetype = 'application/x-ndjson'
+        filename = 'journal-export.ndjson'
     
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Sync-Token': encode_sync_token(current_user.id, version)
+    })
+
+def serialize_connection(connection):
+    return {
+        'id': connection.id,
+        'source_id': connection.source_id,
+        'target_id': connection.target_id,
+        'relationship_type': connection.relationship_type,
+        'closeness': connection.closeness,
+        'sentiment': connection.sentiment,
+        'notes': connection.notes,
+        'interaction_count': connection.interaction_count,
+        'mention_count': connection.mention_count,
+        'last_updated': connection.last_updated.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+@api.route('/api/sync', methods=['GET'])
+@login_required
+@data_version_etag
+@query_budget(6)
+def sync_data():
+    """
+    Get the current user's entries, people and connections changed since the last sync.
+    
+    Query parameters:
+    - since: the token returned by the previous sync; without it every
+      record is returned, and so it is when the token can't be used
+    - types: comma-separated subset of SYNC_TYPES to sync (default: all)
+    - fields: comma-separated subset of ENTRY_FIELDS to include in entries (default: all)
+    - limit: most entries to return (default and at most SYNC_PAGE_SIZE)
+    - cursor: the next_cursor of the previous page, with the same other parameters
+    
+    Returns {'token': str, 'full': bool, 'entries': [...], 'people': [...],
+    'connections': [...], 'deleted': {'entries': [ids], ...}} for the
+    requested types. Entries and people are serialized like the entries list
+    and GET /api/people. With 'full', the records replace the client's copy;
+    otherwise changed records replace those with the same id and deleted ids
+    are dropped. Entries list their people's names, so clients patch changed
+    and deleted people into their entries too. Pass the token as since next
+    time.
+    
+    Entries come in id order, a page of at most `limit` at a time, so a full
+    sync of a large journal isn't one huge response. When there are more,
+    'next_cursor' is set; the following pages hold only entries of the same
+    sync window, and nothing is deleted by them. The token is the same on
+    every page.
+    """
+    types = SYNC_TYPES
+    if request.args.get('types'):
+        types = [record_type.strip() for record_type in request.args['types'].split(',') if record_type.strip()]
+        unknown = [record_type for record_type in types if record_type not in SYNC_TYPES]
+        if unknown:
+            return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+    
+    fields = ENTRY_FIELDS
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in ENTRY_FIELDS]
+        if unknown:
+            return jsonify({'error': f'Unknown fields: {", ".join(unknown)}'}), 400
+    
+    try:
+        limit = max(1, min(int(request.args.get('limit', SYNC_PAGE_SIZE)), SYNC_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    # The data version read by data_version_etag is the end of the window
+    version = g.data_version
+    after_id = 0
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_user_id, cursor_version, after_id = decode_sync_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if cursor_user_id != current_user.id or cursor_version > version:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        # Later pages continue the first page's window
+        version = cursor_version
+        types = [record_type for record_type in types if record_type == 'entries']
+    since = sync_since(current_user.id, request.args.get('since'), version)
+    result = {'token': encode_sync_token(current_user.id, version), 'full': since is None}
+    
+    with timed_phase('query'):
+        if 'entries' in types:
+            columns = [getattr(JournalEntry, field) for field in fields
+                       if field != 'people' and field != 'date_created']
+            # Fetch one extra entry to find out whether there is another page
+            entries = changed_entries(current_user.id, since, version,
+                                      [load_only(JournalEntry.id, JournalEntry.date_created, *columns)],
+                                      after_id, limit + 1)
+            if len(entries) > limit:
+                entries = entries[:limit]
+                result['next_cursor'] = encode_sync_cursor(current_user.id, version, entries[-1].id)
+        if 'people' in types:
+            people = changed_people(current_user.id, since, version)
+        if 'connections' in types:
+            connections = changed_connections(current_user.id, since, version)
+        if cursor:
+            result['deleted'] = {record_type: [] for record_type in types}
+        else:
+            result['deleted'] = deleted_records(current_user.id, since, version, types)
+    
+    people_by_entry = {}
+    if 'entries' in types and 'people' in fields:
+        with timed_phase('people'):
+            people_by_entry = load_entry_people([entry.id for entry in entries])
+    
+    with timed_phase('serialize'):
+        if 'entries' in types:
+            result['entries'] = [serialize_entry(entry, fields, people_by_entry.get(entry.id)) for entry in entries]
+        if 'people' in types:
+            result['people'] = [serialize_person(person) for person in people]
+        if 'connections' in types:
+            result['connections'] = [serialize_connection(connection) for connection in connections]
     return jsonify(result)
 
-@app.route('/api/people/<int:person_id>', methods=['GET'])
+# People routes
+@pages.route('/people')
 @login_required
-def get_person(person_id):
-    person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
-    
-    result = {
+def people():
+    return render_template('people.html')
+
+def serialize_person(person):
+    return {
         'id': person.id,
         'name': person.name,
         'relationship_type': person.relationship_type,
         'description': person.description,
         'date_added': person.date_added.strftime('%Y-%m-%d %H:%M:%S')
     }
+
+@api.route('/api/people', methods=['GET'])
+@login_required
+@data_version_etag
+def get_people():
+    people = Person.query.filter_by(user_id=current_user.id).all()
     
-    return jsonify(result)
+    return jsonify([serialize_person(person) for person in people])
+
+@api.route('/api/people/<int:person_id>', methods=['GET'])
+@login_required
+@data_version_etag
+def get_person(person_id):
+    person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
+    
+    return jsonify(serialize_person(person))
 
-@app.route('/api/people', methods=['POST'])
+@api.route('/api/people', methods=['POST'])
 @login_required
 def create_person():
     data = request.json
@@ -470,19 +821,22 @@ def create_person():
         return jsonify({'error': 'Name is required'}), 400
     
     # Create person
+    version = bump_data_version([current_user.id])[current_user.id]
     new_person = Person(
         name=name,
         relationship_type=relationship_type,
         description=description,
-        user_id=current_user.id
+        user_id=current_user.id,
+        sync_version=version
     )
     
     db.session.add(new_person)
     db.session.commit()
+    invalidate_name_matcher(current_user.id)
     
     return jsonify({'id': new_person.id, 'message': 'Person created successfully'}), 201
 
-@app.route('/api/people/<int:person_id>', methods=['PUT'])
+@api.route('/api/people/<int:person_id>', methods=['PUT'])
 @login_required
 def update_person(person_id):
     person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
@@ -497,82 +851,175 @@ def update_person(person_id):
     if 'description' in data:
         person.description = data['description']
     
+    person.sync_version = bump_data_version([current_user.id])[current_user.id]
     db.session.commit()
+    invalidate_name_matcher(current_user.id)
     
     return jsonify({'message': 'Person updated successfully'})
 
-@app.route('/api/people/<int:person_id>', methods=['DELETE'])
+@api.route('/api/people/<int:person_id>', methods=['DELETE'])
 @login_required
 def delete_person(person_id):
     person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
     
     # Delete associated connections first
-    PersonConnection.query.filter(
+    connections = PersonConnection.query.filter(
         (PersonConnection.source_id == person_id) |
         (PersonConnection.target_id == person_id)
-    ).delete(synchronize_session=False)
+    )
+    connection_ids = [connection_id for connection_id, in connections.with_entities(PersonConnection.id)]
+    connections.delete(synchronize_session=False)
+    delete_person_stats(person_id)
     
     db.session.delete(person)
+    version = bump_data_version([current_user.id])[current_user.id]
+    record_tombstones(current_user.id, version, 'people', [person_id])
+    record_tombstones(current_user.id, version, 'connections', connection_ids)
     db.session.commit()
+    invalidate_name_matcher(current_user.id)
     
     return jsonify({'message': 'Person deleted successfully'})
 
 # Visualization routes
-@app.route('/visualizations')
+@pages.route('/visualizations')
 @login_required
 def visualizations():
     return render_template('visualizations.html')
 
-@app.route('/api/visualizations/relationship-strength', methods=['GET'])
-@login_required
-def get_relationship_strength():
-    # Get all people with their associated journal entries
-    people = Person.query.filter_by(user_id=current_user.id).all()
+def person_entry_stats(user_id):
+    """
+    Get the precomputed journal entry stats of each person owned by the user.
+    
+    Returns one (person, entry_count, avg_sentiment) tuple per person,
+    including people without entries. Entries without a sentiment score count
+    towards entry_count but not towards the sentiment total.
+    """
+    rows = db.session.query(
+        Person, PersonStats.entry_count, PersonStats.sentiment_sum
+    ).outerjoin(
+        PersonStats, PersonStats.person_id == Person.id
+    ).filter(Person.user_id == user_id).order_by(Person.id).all()
     
     result = []
-    for person in people:
-        entry_count = len(person.journal_entries)
-        # Calculate average sentiment
-        total_sentiment = 0
-        for entry in person.journal_entries:
-            if entry.sentiment_score is not None:
-                total_sentiment += entry.sentiment_score
-        
-        avg_sentiment = total_sentiment / entry_count if entry_count > 0 else 0
-        
-        result.append({
+    for person, entry_count, sentiment_sum in rows:
+        entry_count = entry_count or 0
+        avg_sentiment = sentiment_sum / entry_count if entry_count > 0 else 0
+        result.append((person, entry_count, avg_sentiment))
+    return result
+
+def relationship_strength(people_stats):
+    """Serialize the (person, entry_count, avg_sentiment) tuples of person_entry_stats for the strength chart"""
+    return [
+        {
             'id': person.id,
             'name': person.name,
             'entry_count': entry_count,
             'avg_sentiment': avg_sentiment
-        })
+        }
+        for person, entry_count, avg_sentiment in people_stats
+    ]
+
+def interaction_frequency(rows):
+    """
+    Group (person_id, name, month, entry_count) rows, ordered by person and month, into
+    [{'id', 'name', 'months': [{'month', 'count'}]}], one item per person.
     
-    return jsonify(result)
+    People without entries have a single row with no month and get an empty list.
+    """
+    result = []
+    for person_id, name, month_key, count in rows:
+        if not result or result[-1]['id'] != person_id:
+            result.append({'id': person_id, 'name': name, 'months': []})
+        if month_key is not None:
+            result[-1]['months'].append({'month': month_key, 'count': count})
+    return result
 
-@app.route('/api/visualizations/interaction-frequency', methods=['GET'])
-@login_required
-def get_interaction_frequency():
-    # Get entries by month and person
-    people = Person.query.filter_by(user_id=current_user.id).all()
+def social_web(people_stats, user_id):
+    """
+    Build the social web nodes from person_entry_stats and load its links.
     
-    result = {}
-    for person in people:
-        entries_by_month = {}
+    Returns {'nodes': [...], 'links': [...]}, running one query for the
+    connections between the user's people.
+    """
+    # Prepare nodes (people)
+    nodes = []
+    for person, entry_count, avg_sentiment in people_stats:
+        # Create node
+        nodes.append({
+            'id': person.id,
+            'name': person.name,
+            'relationship_type': person.relationship_type or 'Unknown',
+            'entry_count': entry_count,
+            'avg_sentiment': avg_sentiment
+        })
+    
+    # Prepare links (connections between people)
+    links = []
+    # Track processed connections to avoid duplicates
+    processed_connections = set()
+    
+    # Get all connections between this user's people in one query
+    person_ids = {person.id for person, _, _ in people_stats}
+    user_person_ids = db.session.query(Person.id).filter_by(user_id=user_id)
+    connections = PersonConnection.query.filter(
+        PersonConnection.source_id.in_(user_person_ids) | PersonConnection.target_id.in_(user_person_ids)
+    ).order_by(PersonConnection.id).all()
+    
+    for connection in connections:
+        # Only include connections between people owned by the current user
+        if connection.source_id not in person_ids or connection.target_id not in person_ids:
+            continue
         
-        for entry in person.journal_entries:
-            month_key = entry.date_created.strftime('%Y-%m')
-            
-            if month_key not in entries_by_month:
-                entries_by_month[month_key] = 0
-            
-            entries_by_month[month_key] += 1
+        # Create a unique identifier for this connection
+        # Sort IDs to ensure we catch connections in both directions
+        link_key = tuple(sorted([connection.source_id, connection.target_id]))
         
-        result[person.name] = [{'month': k, 'count': v} for k, v in entries_by_month.items()]
+        # Skip if already processed
+        if link_key in processed_connections:
+            continue
+        
+        # Mark as processed
+        processed_connections.add(link_key)
+        
+        links.append({
+            'source': connection.source_id,
+            'target': connection.target_id,
+            'relationship_type': connection.relationship_type or 'Unknown',
+            'sentiment': connection.sentiment,
+            'interaction_count': connection.interaction_count,
+            'mention_count': connection.mention_count,
+            'closeness': connection.closeness
+        })
     
-    return jsonify(result)
+    return {'nodes': nodes, 'links': links}
+
+@api.route('/api/visualizations/relationship-strength', methods=['GET'])
+@login_required
+@data_version_etag
+@cached_result
+@query_budget(1)
+def get_relationship_strength():
+    # Read the precomputed entry count and average sentiment per person
+    return jsonify(relationship_strength(person_entry_stats(current_user.id)))
 
-@app.route('/api/visualizations/emotion-timeline/<int:person_id>', methods=['GET'])
+@api.route('/api/visualizations/interaction-frequency', methods=['GET'])
 @login_required
+@data_version_etag
+@cached_result
+@query_budget(1)
+def get_interaction_frequency():
+    # Read the precomputed entry counts by month and person
+    rows = db.session.query(
+        Person.id, Person.name, PersonMonthStats.month, PersonMonthStats.entry_count
+    ).outerjoin(
+        PersonMonthStats, PersonMonthStats.person_id == Person.id
+    ).filter(Person.user_id == current_user.id).order_by(Person.id, PersonMonthStats.month).all()
+    
+    return jsonify(interaction_frequency(rows))
+
+@api.route('/api/visualizations/emotion-timeline/<int:person_id>', methods=['GET'])
+@login_required
+@data_version_etag
 def get_emotion_timeline(person_id):
     person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
     
@@ -591,81 +1038,143 @@ def get_emotion_timeline(person_id):
     
     return jsonify(entries)
 
-@app.route('/api/visualizations/social-web', methods=['GET'])
+@api.route('/api/visualizations/social-web', methods=['GET'])
 @login_required
+@data_version_etag
+@cached_result
+@query_budget(2)
 def get_social_web():
     """
     Get social web data for visualization of relationships between people.
     Returns nodes (people) and links (connections between people).
+    
+    Query parameters:
+    - layout: where to lay out the graph, one of LAYOUT_MODES (default:
+      auto, see layout.add_layout); 'layout' in the response says which
+      was used, with each node's x and y when laid out on the server
     """
-    # Get all people for the current user
-    people = Person.query.filter_by(user_id=current_user.id).all()
+    mode = request.args.get('layout', 'auto')
+    if mode not in LAYOUT_MODES:
+        return jsonify({'error': f'layout must be one of: {", ".join(LAYOUT_MODES)}'}), 400
     
-    # Prepare nodes (people)
-    nodes = []
-    for person in people:
-        # Count journal entries for this person
-        entry_count = len(person.journal_entries)
-        
-        # Calculate average sentiment
-        total_sentiment = 0
-        for entry in person.journal_entries:
-            if entry.sentiment_score is not None:
-                total_sentiment += entry.sentiment_score
-        
-        avg_sentiment = total_sentiment / entry_count if entry_count > 0 else 0
-        
-        # Create node
-        nodes.append({
-            'id': person.id,
-            'name': person.name,
-            'relationship_type': person.relationship_type or 'Unknown',
-            'entry_count': entry_count,
-            'avg_sentiment': avg_sentiment
-        })
+    # Get all people for the current user, with their entry stats
+    result = social_web(person_entry_stats(current_user.id), current_user.id)
+    return jsonify(add_layout(current_user.id, result, mode))
+
+# Parts of the visualizations dashboard, see get_dashboard
+DASHBOARD_PARTS = ('people', 'strength', 'frequency', 'social_web')
+
+@api.route('/api/visualizations/dashboard', methods=['GET'])
+@login_required
+@data_version_etag
+@cached_result
+@query_budget(3)
+def get_dashboard():
+    """
+    Get the data of the visualizations page in one response.
+    
+    Query parameters:
+    - parts: comma-separated subset of DASHBOARD_PARTS (default: all)
+    - layout: where to lay out the social web, as for social-web
+    
+    Returns {'sync_token', part: data, ...}. Each part has the format of its
+    own endpoint: people like GET /api/people, strength like
+    relationship-strength, frequency like interaction-frequency and
+    social_web like social-web. People and their entry stats are read once
+    and shared by the parts, so all of them take three queries: people,
+    monthly counts and connections. The sync token covers the returned
+    data, to keep it up to date with /api/sync.
+    """
+    parts = DASHBOARD_PARTS
+    if request.args.get('parts'):
+        parts = [part.strip() for part in request.args['parts'].split(',') if part.strip()]
+        unknown = [part for part in parts if part not in DASHBOARD_PARTS]
+        if unknown:
+            return jsonify({'error': f'Unknown parts: {", ".join(unknown)}'}), 400
+    mode = request.args.get('layout', 'auto')
+    if mode not in LAYOUT_MODES:
+        return jsonify({'error': f'layout must be one of: {", ".join(LAYOUT_MODES)}'}), 400
+    
+    result = {'sync_token': encode_sync_token(current_user.id, g.data_version)}
+    with timed_phase('people'):
+        people_stats = person_entry_stats(current_user.id)
+    
+    if 'people' in parts:
+        result['people'] = [serialize_person(person) for person, _, _ in people_stats]
+    if 'strength' in parts:
+        result['strength'] = relationship_strength(people_stats)
+    if 'frequency' in parts:
+        with timed_phase('frequency'):
+            month_counts = {}
+            for person_id, month_key, count in db.session.query(
+                PersonMonthStats.person_id, PersonMonthStats.month, PersonMonthStats.entry_count
+            ).join(Person, Person.id == PersonMonthStats.person_id).filter(
+                Person.user_id == current_user.id
+            ).order_by(PersonMonthStats.person_id, PersonMonthStats.month):
+                month_counts.setdefault(person_id, []).append((month_key, count))
+            # The same rows as the interaction-frequency query, from the people already read
+            result['frequency'] = interaction_frequency(
+                (person.id, person.name, month_key, count)
+                for person, _, _ in people_stats
+                for month_key, count in month_counts.get(person.id, [(None, None)])
+            )
+    if 'social_web' in parts:
+        with timed_phase('social_web'):
+            result['social_web'] = add_layout(current_user.id, social_web(people_stats, current_user.id), mode)
     
-    # Prepare links (connections between people)
-    links = []
-    # Track processed connections to avoid duplicates
-    processed_connections = set()
+    return jsonify(result)
+
+@api.route('/api/visualizations/graph-metrics', methods=['GET'])
+@login_required
+@data_version_etag
+@cached_result
+@query_budget(2)
+def get_graph_metrics():
+    """
+    Get the centrality, PageRank and community of every person in the social web.
     
-    # Get all connections for this user's people
-    for person in people:
-        for connection in person.get_connections():
-            # Create a unique identifier for this connection
-            # Sort IDs to ensure we catch connections in both directions
-            link_key = tuple(sorted([connection.source_id, connection.target_id]))
-            
-            # Skip if already processed
-            if link_key in processed_connections:
-                continue
-            
-            # Mark as processed
-            processed_connections.add(link_key)
-            
-            # Get source and target people
-            source_person = Person.query.get(connection.source_id)
-            target_person = Person.query.get(connection.target_id)
-            
-            # Only include connections between people owned by the current user
-            if source_person.user_id == current_user.id and target_person.user_id == current_user.id:
-                links.append({
-                    'source': connection.source_id,
-                    'target': connection.target_id,
-                    'relationship_type': connection.relationship_type or 'Unknown',
-                    'sentiment': connection.sentiment,
-                    'interaction_count': connection.interaction_count,
-                    'mention_count': connection.mention_count,
-                    'closeness': connection.closeness
-                })
+    Connections are weighted by closeness, sentiment and interactions (see
+    graph.connection_weight). Returns {'node_count', 'edge_count',
+    'modularity', 'nodes', 'communities'}; each node has its degree,
+    degree_centrality, weighted_degree, weighted_centrality (relative to
+    the most connected person), pagerank and community number.
+    """
+    graph = get_user_graph(current_user.id, g.data_version)
+    with timed_phase('graph_metrics'):
+        result = graph.metrics()
+    return jsonify(result)
+
+@api.route('/api/visualizations/graph-metrics/path/<int:source_id>/<int:target_id>', methods=['GET'])
+@login_required
+@data_version_etag
+@query_budget(2)
+def get_graph_path(source_id, target_id):
+    """
+    Get the closest path between two people through their connections.
     
+    Strong connections count as short, so the path follows the strongest
+    ties. Returns {'connected', 'path': [{'id', 'name'}], 'hops',
+    'distance'}, with an empty path if the people aren't connected.
+    """
+    graph = get_user_graph(current_user.id, g.data_version)
+    if source_id not in graph.index or target_id not in graph.index:
+        return jsonify({'error': 'Unknown source or target person'}), 404
+    
+    found = graph.shortest_path(source_id, target_id)
+    if found is None:
+        return jsonify({'connected': False, 'path': [], 'hops': None, 'distance': None})
+    path, distance = found
     return jsonify({
-        'nodes': nodes,
-        'links': links
+        'connected': True,
+        'path': [{'id': person_id, 'name': graph.names[graph.index[person_id]]} for person_id in path],
+        'hops': len(path) - 1,
+        'distance': distance
     })
 
-@app.route('/api/visualizations/social-connections/<int:person_id>', methods=['GET'])
+@api.route('/api/visualizations/social-connections/<int:person_id>', methods=['GET'])
 @login_required
+@data_version_etag
+@query_budget(3)
 def get_person_connections(person_id):
     """
     Get connections for a specific person.
@@ -673,14 +1182,27 @@ def get_person_connections(person_id):
     """
     person = Person.query.filter_by(id=person_id, user_id=current_user.id).first_or_404()
     
+    person_connections = person.get_connections()
+    
+    # Load the other person of every connection in one query,
+    # keeping only people owned by the current user
+    other_ids = {
+        connection.target_id if connection.source_id == person_id else connection.source_id
+        for connection in person_connections
+    }
+    other_people = {
+        other.id: other for other in
+        Person.query.filter(Person.id.in_(other_ids), Person.user_id == current_user.id).all()
+    } if other_ids else {}
+    
     connections = []
-    for connection in person.get_connections():
+    for connection in person_connections:
         # Determine the other person in the connection
         other_id = connection.target_id if connection.source_id == person_id else connection.source_id
-        other_person = Person.query.get(other_id)
+        other_person = other_people.get(other_id)
         
         # Only include connections to people owned by the current user
-        if other_person.user_id == current_user.id:
+        if other_person:
             connections.append({
                 'person_id': other_id,
                 'person_name': other_person.name,
@@ -694,7 +1216,7 @@ def get_person_connections(person_id):
     
     return jsonify(connections)
 
-@app.route('/api/person-connections', methods=['POST'])
+@api.route('/api/person-connections', methods=['POST'])
 @login_required
 def create_or_update_connection():
     """
@@ -721,48 +1243,17 @@ def create_or_update_connection():
     if not source_person or not target_person:
         return jsonify({'error': 'Invalid source or target person'}), 400
     
-    # Check if connection already exists
-    connection = PersonConnection.query.filter(
-        (PersonConnection.source_id == source_id) & 
-        (PersonConnection.target_id == target_id)
-    ).first()
-    
-    if not connection:
-        # Check reverse direction
-        connection = PersonConnection.query.filter(
-            (PersonConnection.source_id == target_id) & 
-            (PersonConnection.target_id == source_id)
-        ).first()
-    
-    if connection:
-        # Update existing connection
-        if relationship_type:
-            connection.relationship_type = relationship_type
-        if sentiment is not None:
-            connection.sentiment = sentiment
-        if closeness is not None:
-            connection.closeness = closeness
-        if notes:
-            connection.notes = notes
-        
-        connection.last_updated = datetime.utcnow()
-    else:
-        # Create new connection
-        connection = PersonConnection(
-            source_id=source_id,
-            target_id=target_id,
-            relationship_type=relationship_type or 'Unknown',
-            sentiment=sentiment or 0,
-            closeness=closeness or 1,
-            notes=notes,
-            interaction_count=0,
-            mention_count=0
-        )
-        db.session.add(connection)
+    if source_person.id == target_person.id:
+        return jsonify({'error': 'Source and target must be different people'}), 400
+    
+    # Connections are stored once per pair, with the lower id as source
+    source_id, target_id = connection_pair(source_person.id, target_person.id)
+    version = bump_data_version([current_user.id])[current_user.id]
     
+    connection_id = save_connection(source_id, target_id, version, relationship_type, sentiment, closeness, notes)
     db.session.commit()
     
     return jsonify({
         'message': 'Connection updated successfully', 
-        'id': connection.id
+        'id': connection_id
     })
@@ -0,0 +1,114 @@
+import re
+from datetime import timedelta
+
+from markupsafe import escape
+from sqlalchemy import DateTime, bindparam, text
+
+from app import db
+
+# Snippet match markers; the snippet is HTML-escaped before they become <mark> tags
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+_SEARCH_TERM = re.compile(r'\w+')
+
+
+def fts5_query(query):
+    """
+    Turn free text into a safe SQLite FTS5 query.
+
+    Every word becomes a quoted prefix term and all terms must match, so
+    user input can't produce FTS5 syntax errors.
+    """
+    return ' '.join(f'"{term}"*' for term in _SEARCH_TERM.findall(query))
+
+
+def snippet_html(snippet):
+    """Escape a snippet and turn its match markers into <mark> tags"""
+    return str(escape(snippet or '')).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+def search_entries(user_id, query, person_id=None, mood=None, interaction_type=None,
+                   date_from=None, date_to=None, limit=20, offset=0):
+    """
+    Full-text search over a user's journal entry titles and content.
+
+    Uses the journal_entry_fts FTS5 table on SQLite and the search_vector
+    tsvector column (with its GIN index) on PostgreSQL; both are kept in sync
+    by the database itself. Results are filtered by person, mood,
+    interaction type and an inclusive date range, ordered by relevance, and
+    returned as dicts with the entry fields, an HTML 'snippet' around the
+    matches and a 'rank' (higher is better).
+    """
+    filters = ['je.user_id = :user_id']
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+
+    if person_id is not None:
+        filters.append('EXISTS (SELECT 1 FROM journal_person jp '
+                       'WHERE jp.journal_entry_id = je.id AND jp.person_id = :person_id)')
+        params['person_id'] = person_id
+    if mood:
+        filters.append('je.mood = :mood')
+        params['mood'] = mood
+    if interaction_type:
+        filters.append('je.interaction_type = :interaction_type')
+        params['interaction_type'] = interaction_type
+    if date_from:
+        filters.append('je.date_created >= :date_from')
+        params['date_from'] = date_from
+    if date_to:
+        # Include the whole last day
+        filters.append('je.date_created < :date_to')
+        params['date_to'] = date_to + timedelta(days=1)
+
+    where = ' AND '.join(filters)
+
+    if db.engine.dialect.name == 'postgresql':
+        params['query'] = query
+        # Rank and page first so ts_headline only runs on the returned rows
+        sql = f'''
+            SELECT page.*, ts_headline('english', page.content, page.tsquery,
+                       'StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxFragments=2, MaxWords=20, MinWords=5') AS snippet
+            FROM (
+                SELECT je.id, je.title, je.content, je.date_created, je.mood, je.sentiment_score,
+                       je.interaction_type, q.tsquery, ts_rank_cd(je.search_vector, q.tsquery) AS rank
+                FROM journal_entry je, websearch_to_tsquery('english', :query) AS q(tsquery)
+                WHERE je.search_vector @@ q.tsquery AND {where}
+                ORDER BY rank DESC, je.date_created DESC
+                LIMIT :limit OFFSET :offset
+            ) AS page
+            ORDER BY page.rank DESC, page.date_created DESC
+        '''
+    else:
+        params['query'] = fts5_query(query)
+        if not params['query']:
+            return []
+        # bm25() is lower for better matches; titles weigh twice as much as content
+        sql = f'''
+            SELECT je.id, je.title, je.date_created, je.mood, je.sentiment_score, je.interaction_type,
+                   snippet(journal_entry_fts, 1, '{_MATCH_START}', '{_MATCH_END}', '…', 16) AS snippet,
+                   -bm25(journal_entry_fts, 2.0, 1.0) AS rank
+            FROM journal_entry_fts
+            JOIN journal_entry je ON je.id = journal_entry_fts.rowid
+            WHERE journal_entry_fts MATCH :query AND {where}
+            ORDER BY rank DESC, je.date_created DESC
+            LIMIT :limit OFFSET :offset
+        '''
+
+    statement = text(sql).columns(date_created=DateTime).bindparams(
+        *[bindparam(name, type_=DateTime) for name in ('date_from', 'date_to') if name in params]
+    )
+
+    results = []
+    for row in db.session.execute(statement, params).mappings():
+        results.append({
+            'id': row['id'],
+            'title': row['title'],
+            'date_created': row['date_created'],
+            'mood': row['mood'],
+            'sentiment_score': row['sentiment_score'],
+            'interaction_type': row['interaction_type'],
+            'snippet': snippet_html(row['snippet']),
+            'rank': row['rank']
+        })
+    return results
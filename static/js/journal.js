@@ -6,6 +6,17 @@ let editingEntryId = null;
 let nameRecognitionEnabled = true; // Enable name recognition by default
 let peopleColors = {}; // Store custom colors for people
 let allPeople = []; // Store all people data
+let nextEntriesCursor = null; // Cursor for the next page of journal entries
+let searchTimeout = null; // Pending search while the user is typing
+let displayedEntries = new Map(); // Entries shown in the list by id, or null while search results are shown
+
+// Page size and fields requested for the journal entries list
+const ENTRIES_PAGE_SIZE = 20;
+const ENTRY_LIST_FIELDS = 'title,content_with_highlights,date_created,mood,sentiment_score,interaction_type,people';
+
+// Local copy of the people; entry changes are synced along with them, a page
+// at most, and patched into the list
+const journalStore = new SyncStore(['people'], ENTRY_LIST_FIELDS, ENTRIES_PAGE_SIZE);
 
 // Initialize journal page
 document.addEventListener('DOMContentLoaded', function() {
@@ -13,11 +24,9 @@ document.addEventListener('DOMContentLoaded', function() {
     journalEntriesList = document.getElementById('journal-entries');
     peopleDropdown = document.getElementById('people-select');
     
-    // Load journal entries
-    loadJournalEntries();
-    
-    // Load people for dropdown and store for highlighting
-    loadPeopleWithColors();
+    // Load people for dropdown and store for highlighting, then the journal
+    // entries, so later syncs don't miss changes made in between
+    loadPeopleWithColors().then(() => loadJournalEntries());
     
     // Set up form submission
     journalForm.addEventListener('submit', handleJournalFormSubmit);
@@ -26,8 +35,10 @@ document.addEventListener('DOMContentLoaded', function() {
     const searchInput = document.getElementById('search-journal');
     if (searchInput) {
         searchInput.addEventListener('input', function() {
-            const searchTerm = this.value.toLowerCase();
-            filterJournalEntries(searchTerm);
+            const searchTerm = this.value.trim();
+            // Wait for a pause in typing before searching
+            clearTimeout(searchTimeout);
+            searchTimeout = setTimeout(() => searchJournalEntries(searchTerm), 300);
         });
     }
     
@@ -54,12 +65,25 @@ document.addEventListener('DOMContentLoaded', function() {
     initSentimentGradientBar();
 });
 
-// Load all journal entries
-function loadJournalEntries() {
-    fetch('/api/journal-entries')
+// Load the first page of journal entries, or the next page if append is true
+function loadJournalEntries(append = false) {
+    const params = new URLSearchParams({
+        limit: ENTRIES_PAGE_SIZE,
+        fields: ENTRY_LIST_FIELDS
+    });
+    if (append && nextEntriesCursor) {
+        params.set('cursor', nextEntriesCursor);
+    }
+    
+    fetch(`/api/journal-entries?${params}`)
         .then(response => response.json())
-        .then(entries => {
-            displayJournalEntries(entries);
+        .then(page => {
+            nextEntriesCursor = page.next_cursor;
+            if (!append || displayedEntries === null) {
+                displayedEntries = new Map();
+            }
+            page.entries.forEach(entry => displayedEntries.set(entry.id, entry));
+            displayJournalEntries(page.entries, append);
         })
         .catch(error => {
             console.error('Error loading journal entries:', error);
@@ -67,165 +91,263 @@ function loadJournalEntries() {
         });
 }
 
-// Display journal entries in the list
-function displayJournalEntries(entries) {
-    journalEntriesList.innerHTML = '';
+// Display journal entries in the list, appending them to the current list if append is true
+function displayJournalEntries(entries, append = false) {
+    const loadMoreContainer = document.getElementById('load-more-entries');
+    if (loadMoreContainer) {
+        loadMoreContainer.remove();
+    }
     
-    if (entries.length === 0) {
+    if (!append) {
+        journalEntriesList.innerHTML = '';
+    }
+    
+    if (!append && entries.length === 0) {
         journalEntriesList.innerHTML = '<div class="text-center py-5"><p>No journal entries yet. Create your first one!</p></div>';
         return;
     }
     
-    entries.forEach(entry => {
-        // Create entry card
-        const entryCard = document.createElement('div');
-        entryCard.className = 'card mb-3';
-        entryCard.dataset.entryId = entry.id;
-        
-        // Format date
-        const date = new Date(entry.date_created);
-        const formattedDate = date.toLocaleDateString() + ' ' + date.toLocaleTimeString();
-        
-        // Create people tags
-        let peopleTags = '';
-        if (entry.people && entry.people.length > 0) {
-            peopleTags = '<div class="people-tags">';
-            entry.people.forEach(person => {
-                peopleTags += `<span class="badge bg-secondary me-1">${person.name}</span>`;
-            });
-            peopleTags += '</div>';
-        }
-        
-        // Set sentiment badge color based on score
-        let sentimentClass = 'bg-secondary';
-        let sentimentText = 'Neutral';
-        
-        if (entry.sentiment_score > 0.3) {
-            sentimentClass = 'bg-success';
-            sentimentText = 'Positive';
-        } else if (entry.sentiment_score < -0.3) {
-            sentimentClass = 'bg-danger';
-            sentimentText = 'Negative';
-        }
-        
-        // Use content with highlights if available, otherwise use regular content
-        const displayContent = entry.content_with_highlights || entry.content;
-        
-        entryCard.innerHTML = `
-            <div class="card-header d-flex justify-content-between align-items-center">
-                <h5 class="card-title mb-0">${entry.title}</h5>
-                <div>
-                    <span class="badge ${sentimentClass} me-1">${sentimentText}</span>
-                    ${entry.mood ? `<span class="badge bg-info me-1">${entry.mood}</span>` : ''}
-                    ${entry.interaction_type ? `<span class="badge bg-primary">${entry.interaction_type}</span>` : ''}
-                </div>
-            </div>
-            <div class="card-body">
-                <div class="card-text mb-2">${displayContent}</div>
-                ${peopleTags}
-                <div class="text-muted small mt-2">${formattedDate}</div>
-            </div>
-            <div class="card-footer d-flex justify-content-end">
-                <button class="btn btn-sm btn-outline-primary me-2 edit-entry-btn">Edit</button>
-                <button class="btn btn-sm btn-outline-danger delete-entry-btn">Delete</button>
-            </div>
-        `;
-        
-        // Add event listeners for edit and delete buttons
-        const editButton = entryCard.querySelector('.edit-entry-btn');
-        const deleteButton = entryCard.querySelector('.delete-entry-btn');
-        
-        editButton.addEventListener('click', () => editJournalEntry(entry.id));
-        deleteButton.addEventListener('click', () => deleteJournalEntry(entry.id));
-        
-        // Add event listeners for person highlights
-        const personHighlights = entryCard.querySelectorAll('.person-highlight');
-        personHighlights.forEach(highlight => {
-            if (highlight.classList.contains('known')) {
-                // For known people, add a click handler to show details
-                const personId = highlight.dataset.personId;
-                highlight.addEventListener('click', () => showPersonDetails(personId));
-            } else if (highlight.classList.contains('new')) {
-                // For new people, add a click handler to create new person
-                const personName = highlight.textContent;
-                highlight.addEventListener('click', () => createPersonFromHighlight(personName));
-            }
+    entries.forEach(entry => journalEntriesList.appendChild(createEntryCard(entry)));
+    
+    // Offer to load older entries if there are more pages
+    if (nextEntriesCursor) {
+        const container = document.createElement('div');
+        container.id = 'load-more-entries';
+        container.className = 'text-center my-3';
+        container.innerHTML = '<button class="btn btn-outline-secondary">Load more entries</button>';
+        container.querySelector('button').addEventListener('click', () => loadJournalEntries(true));
+        journalEntriesList.appendChild(container);
+    }
+}
+
+// Create the card of a journal entry in the list
+function createEntryCard(entry) {
+    // Create entry card
+    const entryCard = document.createElement('div');
+    entryCard.className = 'card mb-3';
+    entryCard.dataset.entryId = entry.id;
+    
+    // Format date
+    const date = new Date(entry.date_created);
+    const formattedDate = date.toLocaleDateString() + ' ' + date.toLocaleTimeString();
+    
+    // Create people tags
+    let peopleTags = '';
+    if (entry.people && entry.people.length > 0) {
+        peopleTags = '<div class="people-tags">';
+        entry.people.forEach(person => {
+            peopleTags += `<span class="badge bg-secondary me-1">${person.name}</span>`;
         });
-        
-        journalEntriesList.appendChild(entryCard);
+        peopleTags += '</div>';
+    }
+    
+    // Set sentiment badge color based on score
+    let sentimentClass = 'bg-secondary';
+    let sentimentText = 'Neutral';
+    
+    if (entry.sentiment_score === null) {
+        // Still being analyzed in the background
+        sentimentText = 'Analyzing...';
+    } else if (entry.sentiment_score > 0.3) {
+        sentimentClass = 'bg-success';
+        sentimentText = 'Positive';
+    } else if (entry.sentiment_score < -0.3) {
+        sentimentClass = 'bg-danger';
+        sentimentText = 'Negative';
+    }
+    
+    // Use content with highlights if available, otherwise use regular content
+    const displayContent = entry.content_with_highlights || entry.content ||
+        (entry.sentiment_score === null ? '<span class="text-muted">Analyzing entry...</span>' : '');
+    
+    entryCard.innerHTML = `
+        <div class="card-header d-flex justify-content-between align-items-center">
+            <h5 class="card-title mb-0">${entry.title}</h5>
+            <div>
+                <span class="badge ${sentimentClass} me-1">${sentimentText}</span>
+                ${entry.mood ? `<span class="badge bg-info me-1">${entry.mood}</span>` : ''}
+                ${entry.interaction_type ? `<span class="badge bg-primary">${entry.interaction_type}</span>` : ''}
+            </div>
+        </div>
+        <div class="card-body">
+            <div class="card-text mb-2">${displayContent}</div>
+            ${peopleTags}
+            <div class="text-muted small mt-2">${formattedDate}</div>
+        </div>
+        <div class="card-footer d-flex justify-content-end">
+            <button class="btn btn-sm btn-outline-primary me-2 edit-entry-btn">Edit</button>
+            <button class="btn btn-sm btn-outline-danger delete-entry-btn">Delete</button>
+        </div>
+    `;
+    
+    // Add event listeners for edit and delete buttons
+    const editButton = entryCard.querySelector('.edit-entry-btn');
+    const deleteButton = entryCard.querySelector('.delete-entry-btn');
+    
+    editButton.addEventListener('click', () => editJournalEntry(entry.id));
+    deleteButton.addEventListener('click', () => deleteJournalEntry(entry.id));
+    
+    // Add event listeners for person highlights
+    const personHighlights = entryCard.querySelectorAll('.person-highlight');
+    personHighlights.forEach(highlight => {
+        if (highlight.classList.contains('known')) {
+            // For known people, add a click handler to show details
+            const personId = highlight.dataset.personId;
+            highlight.addEventListener('click', () => showPersonDetails(personId));
+        } else if (highlight.classList.contains('new')) {
+            // For new people, add a click handler to create new person
+            const personName = highlight.textContent;
+            highlight.addEventListener('click', () => createPersonFromHighlight(personName));
+        }
     });
+    
+    return entryCard;
 }
 
-// Load people for the dropdown selection
-function loadPeopleForDropdown() {
-    fetch('/api/people')
-        .then(response => response.json())
-        .then(people => {
-            peopleDropdown.innerHTML = '';
-            
-            people.forEach(person => {
-                const option = document.createElement('option');
-                option.value = person.id;
-                option.textContent = person.name;
-                peopleDropdown.appendChild(option);
-            });
-        })
+// Load people with colors for highlighting
+function loadPeopleWithColors() {
+    return journalStore.sync()
+        .then(() => displayPeople())
         .catch(error => {
             console.error('Error loading people:', error);
+            showAlert('Failed to load people data', 'danger');
         });
 }
 
-// Load people with colors for highlighting
-function loadPeopleWithColors() {
-    fetch('/api/people')
-        .then(response => response.json())
-        .then(people => {
-            // Store all people data for later use
-            allPeople = people;
-            
-            // Populate dropdown (can be called separately if needed)
-            peopleDropdown.innerHTML = '';
+// Show the synced people in the dropdown and use them for highlighting
+function displayPeople() {
+    // Store all people data for later use
+    const people = journalStore.values('people');
+    allPeople = people;
+    
+    // Populate dropdown, keeping the selected people selected
+    const selectedIds = new Set(Array.from(peopleDropdown.selectedOptions).map(option => option.value));
+    peopleDropdown.innerHTML = '';
+    
+    // Generate default colors or load saved ones
+    people.forEach((person, index) => {
+        // Assign default color if none exists
+        if (!peopleColors[person.id]) {
+            // Generate colors from a pleasing palette
+            const colorPalette = [
+                '#9b59b6', // Purple
+                '#3498db', // Blue
+                '#2ecc71', // Green
+                '#f1c40f', // Yellow
+                '#e67e22', // Orange
+                '#e74c3c', // Red
+                '#1abc9c', // Turquoise
+                '#34495e'  // Dark Blue
+            ];
             
-            // Generate default colors or load saved ones
-            people.forEach((person, index) => {
-                // Assign default color if none exists
-                if (!peopleColors[person.id]) {
-                    // Generate colors from a pleasing palette
-                    const colorPalette = [
-                        '#9b59b6', // Purple
-                        '#3498db', // Blue
-                        '#2ecc71', // Green
-                        '#f1c40f', // Yellow
-                        '#e67e22', // Orange
-                        '#e74c3c', // Red
-                        '#1abc9c', // Turquoise
-                        '#34495e'  // Dark Blue
-                    ];
-                    
-                    // Assign color from palette (cycle through if more people than colors)
-                    peopleColors[person.id] = colorPalette[index % colorPalette.length];
-                }
-                
-                // Add to dropdown
-                const option = document.createElement('option');
-                option.value = person.id;
-                option.textContent = person.name;
-                option.style.backgroundColor = peopleColors[person.id] + '33'; // Add transparency
-                peopleDropdown.appendChild(option);
-            });
+            // Assign color from palette (cycle through if more people than colors)
+            peopleColors[person.id] = colorPalette[index % colorPalette.length];
+        }
+        
+        // Add to dropdown
+        const option = document.createElement('option');
+        option.value = person.id;
+        option.textContent = person.name;
+        option.selected = selectedIds.has(String(person.id));
+        option.style.backgroundColor = peopleColors[person.id] + '33'; // Add transparency
+        peopleDropdown.appendChild(option);
+    });
+    
+    // Initialize text editor highlighting after loading people
+    const contentTextarea = document.getElementById('content');
+    if (contentTextarea && nameRecognitionEnabled) {
+        enableInlineHighlighting(contentTextarea);
+    }
+}
+
+// Fetch the people and entries changed since the last sync and patch them into the page
+function syncJournal() {
+    return journalStore.sync(['entries', 'people'])
+        .then(changes => {
+            displayPeople();
             
-            // Initialize text editor highlighting after loading people
-            const contentTextarea = document.getElementById('content');
-            if (contentTextarea && nameRecognitionEnabled) {
-                enableInlineHighlighting(contentTextarea);
+            const searchInput = document.getElementById('search-journal');
+            if (displayedEntries === null && searchInput && searchInput.value.trim()) {
+                // Search results are refreshed by searching again
+                searchJournalEntries(searchInput.value.trim());
+            } else if (changes.full || changes.next_cursor || displayedEntries === null) {
+                // Too much changed to patch, so start over from the first page
+                loadJournalEntries();
+            } else {
+                patchJournalEntries(changes);
             }
         })
         .catch(error => {
-            console.error('Error loading people:', error);
-            showAlert('Failed to load people data', 'danger');
+            console.error('Error syncing journal:', error);
+            showAlert('Failed to refresh journal entries', 'danger');
         });
 }
 
+// Whether entry a comes after entry b in the list, which is sorted newest first
+function isListedAfter(a, b) {
+    return a.date_created < b.date_created || (a.date_created === b.date_created && a.id < b.id);
+}
+
+// Patch synced changes into the shown entries: changed entries replace their
+// cards, deleted ones are removed, and new ones are inserted in date order if
+// they fall within the pages loaded so far
+function patchJournalEntries(changes) {
+    const changedEntries = new Map(changes.entries.map(entry => [entry.id, entry]));
+    
+    // Entries list their people's names, so renamed and deleted people change them too
+    const changedPeople = new Map(changes.people.map(person => [person.id, person]));
+    const deletedPeople = new Set(changes.deleted.people);
+    displayedEntries.forEach((entry, id) => {
+        if (!changedEntries.has(id) &&
+            entry.people.some(person => changedPeople.has(person.id) || deletedPeople.has(person.id))) {
+            const people = entry.people
+                .filter(person => !deletedPeople.has(person.id))
+                .map(person => changedPeople.has(person.id) ? { id: person.id, name: changedPeople.get(person.id).name } : person);
+            changedEntries.set(id, { ...entry, people: people });
+        }
+    });
+    
+    changes.deleted.entries.forEach(id => {
+        if (displayedEntries.delete(id)) {
+            journalEntriesList.querySelector(`[data-entry-id="${id}"]`).remove();
+        }
+    });
+    
+    changedEntries.forEach(entry => {
+        const card = journalEntriesList.querySelector(`[data-entry-id="${entry.id}"]`);
+        if (card) {
+            displayedEntries.set(entry.id, entry);
+            card.replaceWith(createEntryCard(entry));
+            return;
+        }
+        
+        if (displayedEntries.size === 0) {
+            // Drop the "no entries" message
+            journalEntriesList.innerHTML = '';
+        }
+        const cards = Array.from(journalEntriesList.querySelectorAll('[data-entry-id]'));
+        const nextCard = cards.find(other => isListedAfter(displayedEntries.get(parseInt(other.dataset.entryId)), entry));
+        if (nextCard) {
+            nextCard.before(createEntryCard(entry));
+        } else if (!nextEntriesCursor) {
+            journalEntriesList.appendChild(createEntryCard(entry));
+        } else {
+            // It belongs to a page that isn't loaded yet
+            return;
+        }
+        displayedEntries.set(entry.id, entry);
+    });
+    
+    if (displayedEntries.size === 0) {
+        if (nextEntriesCursor) {
+            // Every shown entry was deleted; show the older ones
+            loadJournalEntries();
+        } else {
+            journalEntriesList.innerHTML = '<div class="text-center py-5"><p>No journal entries yet. Create your first one!</p></div>';
+        }
+    }
+}
+
 // Handle journal form submission (create or update)
 function handleJournalFormSubmit(event) {
     event.preventDefault();
@@ -265,6 +387,11 @@ function handleJournalFormSubmit(event) {
             return;
         }
         
+        // Refresh the list again once the entry has been analyzed
+        if (data.analysis_status === 'pending') {
+            waitForAnalysis(editingEntryId || data.id);
+        }
+        
         // Show success message
         const message = editingEntryId ? 'Journal entry updated successfully!' : 'Journal entry created successfully!';
         showAlert(message, 'success');
@@ -276,8 +403,8 @@ function handleJournalFormSubmit(event) {
         document.getElementById('journal-form-title').textContent = 'Create Journal Entry';
         document.getElementById('submit-button').textContent = 'Save Entry';
         
-        // Reload journal entries
-        loadJournalEntries();
+        // Fetch the saved entry and patch it into the list
+        syncJournal();
     })
     .catch(error => {
         console.error('Error saving journal entry:', error);
@@ -285,6 +412,28 @@ function handleJournalFormSubmit(event) {
     });
 }
 
+// Poll the background analysis of an entry, with backoff, and reload the entries when it is done
+function waitForAnalysis(entryId, delay = 500, attempts = 20) {
+    setTimeout(() => {
+        fetch(`/api/journal-entries/analysis?ids=${entryId}`)
+            .then(response => response.json())
+            .then(data => {
+                const entry = data.entries && data.entries[0];
+                if (!entry) {
+                    return;
+                }
+                if (entry.analysis_status === 'ready') {
+                    syncJournal();
+                } else if (entry.analysis_status === 'failed') {
+                    showAlert('The entry could not be analyzed; its sentiment was not updated', 'warning');
+                } else if (attempts > 1) {
+                    waitForAnalysis(entryId, Math.min(delay * 2, 5000), attempts - 1);
+                }
+            })
+            .catch(error => console.error('Error checking entry analysis:', error));
+    }, delay);
+}
+
 // Edit journal entry
 function editJournalEntry(entryId) {
     // Set editing state
@@ -328,7 +477,7 @@ function deleteJournalEntry(entryId) {
         .then(response => response.json())
         .then(data => {
             showAlert('Journal entry deleted successfully!', 'success');
-            loadJournalEntries();
+            syncJournal();
             
             // Reset form if currently editing the deleted entry
             if (editingEntryId === entryId) {
@@ -345,26 +494,32 @@ function deleteJournalEntry(entryId) {
     }
 }
 
-// Filter journal entries based on search term
-function filterJournalEntries(searchTerm) {
-    const entryCards = journalEntriesList.querySelectorAll('.card');
-    
-    entryCards.forEach(card => {
-        const title = card.querySelector('.card-title').textContent.toLowerCase();
-        const content = card.querySelector('.card-text').textContent.toLowerCase();
-        const peopleTags = card.querySelectorAll('.badge');
-        
-        let peopleText = '';
-        peopleTags.forEach(tag => {
-            peopleText += tag.textContent.toLowerCase() + ' ';
+// Search journal entries on the server, or show the latest entries again if the search is empty
+function searchJournalEntries(searchTerm) {
+    if (!searchTerm) {
+        loadJournalEntries();
+        return;
+    }
+    
+    fetch(`/api/journal-entries/search?${new URLSearchParams({ q: searchTerm })}`)
+        .then(response => response.json())
+        .then(data => {
+            // Search results are not paged with the entries cursor, nor patched by syncs
+            nextEntriesCursor = null;
+            displayedEntries = null;
+            
+            if (data.results.length === 0) {
+                journalEntriesList.innerHTML = '<div class="text-center py-5"><p>No journal entries match your search.</p></div>';
+                return;
+            }
+            
+            // Show the matching snippet in place of the entry content
+            displayJournalEntries(data.results.map(result => ({ ...result, content_with_highlights: result.snippet })));
+        })
+        .catch(error => {
+            console.error('Error searching journal entries:', error);
+            showAlert('Failed to search journal entries', 'danger');
         });
-        
-        if (title.includes(searchTerm) || content.includes(searchTerm) || peopleText.includes(searchTerm)) {
-            card.style.display = 'block';
-        } else {
-            card.style.display = 'none';
-        }
-    });
 }
 
 // This function is now replaced by processHighlighting in our enhanced text editor approach
@@ -440,9 +595,8 @@ function createPersonFromHighlight(name) {
             showAlert('Person created successfully!', 'success');
             modal.hide();
             
-            // Reload people dropdown and journal entries
-            loadPeopleForDropdown();
-            loadJournalEntries();
+            // Sync the new person into the dropdown and journal entries
+            syncJournal();
         })
         .catch(error => {
             console.error('Error creating person:', error);
@@ -2,6 +2,7 @@
 let peopleForm;
 let peopleList;
 let editingPersonId = null;
+const peopleStore = new SyncStore(['people']); // Local copy of the people, patched after every change
 
 // Initialize people page
 document.addEventListener('DOMContentLoaded', function() {
@@ -24,12 +25,17 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
-// Load all people
+// Load the people, or only the changes since the last load, and display them
 function loadPeople() {
-    fetch('/api/people')
-        .then(response => response.json())
-        .then(people => {
-            displayPeople(people);
+    peopleStore.sync()
+        .then(() => {
+            displayPeople(peopleStore.values('people'));
+            
+            // Keep the current search applied
+            const searchInput = document.getElementById('search-people');
+            if (searchInput && searchInput.value) {
+                filterPeople(searchInput.value.toLowerCase());
+            }
         })
         .catch(error => {
             console.error('Error loading people:', error);
@@ -0,0 +1,107 @@
+// Local copy of the user's data, kept up to date with /api/sync
+//
+// The first sync loads every record of the store's types; later syncs only
+// fetch what was created, changed or deleted since, and patch it in.
+class SyncStore {
+    // types: the record types kept in the store (entries, people, connections)
+    // fields: the entry fields to sync, as for the journal entries list
+    // pageSize: most entries per /api/sync response
+    constructor(types, fields = null, pageSize = null) {
+        this.types = types;
+        this.fields = fields;
+        this.pageSize = pageSize;
+        this.token = null;
+        this.records = {};
+        types.forEach(type => this.records[type] = new Map());
+        this.pending = Promise.resolve();
+    }
+
+    // Fetch and apply the changes of `types` since the last sync. Types not
+    // kept in the store are only passed on, e.g. to patch the page directly.
+    // Resolves to the /api/sync response. Kept entries are fetched page by
+    // page; for passed-on entries only the first page is fetched, and
+    // next_cursor tells the caller there were more.
+    sync(types = this.types) {
+        // One sync at a time, so each starts from the token of the previous one
+        const result = this.pending.then(() => {
+            const params = new URLSearchParams({ types: types.join(',') });
+            if (this.fields) {
+                params.set('fields', this.fields);
+            }
+            if (this.pageSize) {
+                params.set('limit', this.pageSize);
+            }
+            if (this.token) {
+                params.set('since', this.token);
+            }
+            return this.fetchChanges(params).then(changes => {
+                this.apply(changes);
+                return changes;
+            });
+        });
+        this.pending = result.catch(() => {});
+        return result;
+    }
+
+    fetchChanges(params) {
+        return fetch(`/api/sync?${params}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Sync failed with status ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(changes => {
+                if (!changes.next_cursor || !this.types.includes('entries')) {
+                    return changes;
+                }
+                // Append the following pages of the same sync window
+                const next = new URLSearchParams(params);
+                next.set('cursor', changes.next_cursor);
+                return this.fetchChanges(next).then(rest => {
+                    if (rest.full !== changes.full) {
+                        // The token expired between pages; start over with a full sync
+                        params.delete('since');
+                        params.delete('cursor');
+                        return this.fetchChanges(params);
+                    }
+                    changes.entries = changes.entries.concat(rest.entries);
+                    delete changes.next_cursor;
+                    return changes;
+                });
+            });
+    }
+
+    apply(changes) {
+        this.types.forEach(type => {
+            if (!(type in changes)) {
+                return;
+            }
+            const records = this.records[type];
+            if (changes.full) {
+                records.clear();
+            }
+            changes[type].forEach(record => records.set(record.id, record));
+            changes.deleted[type].forEach(id => records.delete(id));
+        });
+        this.token = changes.token;
+    }
+
+    // Start from records loaded by another request, e.g. the visualizations
+    // dashboard, and the sync token that came with them
+    seed(token, records) {
+        Object.entries(records).forEach(([type, list]) => {
+            this.records[type] = new Map(list.map(record => [record.id, record]));
+        });
+        this.token = token;
+    }
+
+    // The records of a type, in the order they were first synced
+    values(type) {
+        return Array.from(this.records[type].values());
+    }
+
+    get(type, id) {
+        return this.records[type].get(id);
+    }
+}
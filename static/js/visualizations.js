@@ -3,16 +3,13 @@ let relationshipStrengthChart = null;
 let interactionFrequencyChart = null;
 let emotionTimelineChart = null;
 let socialNetworkGraph = null;
+let socialWebData = null; // Nodes and links of the social web graph
+const dataStore = new SyncStore(['people']); // Local copy of the people; connection changes are patched into the social web
 
 // Initialize visualizations page
 document.addEventListener('DOMContentLoaded', function() {
-    // Load people for person selector
-    loadPeopleForSelector();
-    
-    // Load initial visualizations
-    loadRelationshipStrengthVisualization();
-    loadInteractionFrequencyVisualization();
-    loadSocialWebVisualization();
+    // Load the person selector and the initial visualizations in one request
+    loadDashboard();
     
     // Set up person selector change event
     const personSelector = document.getElementById('person-selector');
@@ -47,23 +44,30 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
-// Load people for the person selector
-function loadPeopleForSelector() {
-    fetch('/api/people')
+// Load the people and every chart from the dashboard endpoint, which reads them in one pass
+function loadDashboard() {
+    fetch('/api/visualizations/dashboard')
         .then(response => response.json())
-        .then(people => {
-            const personSelector = document.getElementById('person-selector');
-            
-            // Clear existing options
-            personSelector.innerHTML = '<option value="">Select a person</option>';
-            
-            // Add people options
-            people.forEach(person => {
-                const option = document.createElement('option');
-                option.value = person.id;
-                option.textContent = person.name;
-                personSelector.appendChild(option);
-            });
+        .then(data => {
+            // Later changes are synced from the version the dashboard was read at
+            dataStore.seed(data.sync_token, { people: data.people });
+            displayPeopleSelector();
+            displayRelationshipStrength(data.strength);
+            displayInteractionFrequency(data.frequency);
+            displaySocialWeb(data.social_web);
+        })
+        .catch(error => {
+            console.error('Error loading visualizations:', error);
+            showAlert('Failed to load visualizations', 'danger');
+        });
+}
+
+// Sync the people and connections changed since the last load, and update the person selector
+function loadPeopleForSelector() {
+    return dataStore.sync(['people', 'connections'])
+        .then(changes => {
+            displayPeopleSelector();
+            return changes;
         })
         .catch(error => {
             console.error('Error loading people:', error);
@@ -71,212 +75,211 @@ function loadPeopleForSelector() {
         });
 }
 
-// Load relationship strength visualization
-function loadRelationshipStrengthVisualization() {
-    fetch('/api/visualizations/relationship-strength')
-        .then(response => response.json())
-        .then(data => {
-            if (data.length === 0) {
-                document.getElementById('relationship-strength-chart-container').innerHTML = 
-                    '<div class="text-center py-5">No data available. Add journal entries with people to see visualizations</div>';
-                return;
-            }
-            
-            // Prepare data for chart
-            const labels = data.map(item => item.name);
-            const entryCountData = data.map(item => item.entry_count);
-            const avgSentimentData = data.map(item => item.avg_sentiment);
-            
-            // Generate sentiment colors (green for positive, red for negative)
-            const sentimentColors = avgSentimentData.map(sentiment => {
-                if (sentiment > 0.3) return 'rgba(40, 167, 69, 0.7)';  // Green for positive
-                if (sentiment < -0.3) return 'rgba(220, 53, 69, 0.7)'; // Red for negative
-                return 'rgba(108, 117, 125, 0.7)';                     // Gray for neutral
-            });
-            
-            // Get the canvas element
-            const ctx = document.getElementById('relationship-strength-chart').getContext('2d');
-            
-            // Destroy existing chart if it exists
-            if (relationshipStrengthChart) {
-                relationshipStrengthChart.destroy();
-            }
-            
-            // Create new chart
-            relationshipStrengthChart = new Chart(ctx, {
-                type: 'bar',
-                data: {
-                    labels: labels,
-                    datasets: [
-                        {
-                            label: 'Number of Entries',
-                            data: entryCountData,
-                            backgroundColor: 'rgba(13, 110, 253, 0.7)',
-                            borderColor: 'rgba(13, 110, 253, 1)',
-                            borderWidth: 1,
-                            yAxisID: 'y'
-                        },
-                        {
-                            label: 'Average Sentiment',
-                            data: avgSentimentData,
-                            backgroundColor: sentimentColors,
-                            borderColor: sentimentColors.map(color => color.replace('0.7', '1')),
-                            borderWidth: 1,
-                            yAxisID: 'y1',
-                            type: 'bar'
-                        }
-                    ]
+// Fill the person selector with the synced people, keeping the selected person
+function displayPeopleSelector() {
+    const personSelector = document.getElementById('person-selector');
+    const selectedId = personSelector.value;
+    
+    // Clear existing options
+    personSelector.innerHTML = '<option value="">Select a person</option>';
+    
+    // Add people options
+    dataStore.values('people').forEach(person => {
+        const option = document.createElement('option');
+        option.value = person.id;
+        option.textContent = person.name;
+        personSelector.appendChild(option);
+    });
+    personSelector.value = selectedId;
+}
+
+// Display the relationship strength chart
+function displayRelationshipStrength(data) {
+    if (data.length === 0) {
+        document.getElementById('relationship-strength-chart-container').innerHTML = 
+            '<div class="text-center py-5">No data available. Add journal entries with people to see visualizations</div>';
+        return;
+    }
+    
+    // Prepare data for chart
+    const labels = data.map(item => item.name);
+    const entryCountData = data.map(item => item.entry_count);
+    const avgSentimentData = data.map(item => item.avg_sentiment);
+    
+    // Generate sentiment colors (green for positive, red for negative)
+    const sentimentColors = avgSentimentData.map(sentiment => {
+        if (sentiment > 0.3) return 'rgba(40, 167, 69, 0.7)';  // Green for positive
+        if (sentiment < -0.3) return 'rgba(220, 53, 69, 0.7)'; // Red for negative
+        return 'rgba(108, 117, 125, 0.7)';                     // Gray for neutral
+    });
+    
+    // Get the canvas element
+    const ctx = document.getElementById('relationship-strength-chart').getContext('2d');
+    
+    // Destroy existing chart if it exists
+    if (relationshipStrengthChart) {
+        relationshipStrengthChart.destroy();
+    }
+    
+    // Create new chart
+    relationshipStrengthChart = new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: labels,
+            datasets: [
+                {
+                    label: 'Number of Entries',
+                    data: entryCountData,
+                    backgroundColor: 'rgba(13, 110, 253, 0.7)',
+                    borderColor: 'rgba(13, 110, 253, 1)',
+                    borderWidth: 1,
+                    yAxisID: 'y'
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        title: {
-                            display: true,
-                            text: 'Relationship Strength and Sentiment'
-                        },
-                        tooltip: {
-                            mode: 'index',
-                            intersect: false
-                        }
-                    },
-                    scales: {
-                        y: {
-                            type: 'linear',
-                            display: true,
-                            position: 'left',
-                            title: {
-                                display: true,
-                                text: 'Number of Entries'
-                            }
-                        },
-                        y1: {
-                            type: 'linear',
-                            display: true,
-                            position: 'right',
-                            min: -1,
-                            max: 1,
-                            title: {
-                                display: true,
-                                text: 'Sentiment Score'
-                            }
-                        }
+                {
+                    label: 'Average Sentiment',
+                    data: avgSentimentData,
+                    backgroundColor: sentimentColors,
+                    borderColor: sentimentColors.map(color => color.replace('0.7', '1')),
+                    borderWidth: 1,
+                    yAxisID: 'y1',
+                    type: 'bar'
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Relationship Strength and Sentiment'
+                },
+                tooltip: {
+                    mode: 'index',
+                    intersect: false
+                }
+            },
+            scales: {
+                y: {
+                    type: 'linear',
+                    display: true,
+                    position: 'left',
+                    title: {
+                        display: true,
+                        text: 'Number of Entries'
+                    }
+                },
+                y1: {
+                    type: 'linear',
+                    display: true,
+                    position: 'right',
+                    min: -1,
+                    max: 1,
+                    title: {
+                        display: true,
+                        text: 'Sentiment Score'
                     }
                 }
-            });
-        })
-        .catch(error => {
-            console.error('Error loading relationship strength data:', error);
-            showAlert('Failed to load relationship strength visualization', 'danger');
-        });
+            }
+        }
+    });
 }
 
-// Load interaction frequency visualization
-function loadInteractionFrequencyVisualization() {
-    fetch('/api/visualizations/interaction-frequency')
-        .then(response => response.json())
-        .then(data => {
-            // Check if we have data
-            if (Object.keys(data).length === 0) {
-                document.getElementById('interaction-frequency-chart-container').innerHTML = 
-                    '<div class="text-center py-5">No data available. Add journal entries with people to see visualizations</div>';
-                return;
-            }
-            
-            // Prepare data for chart
-            const peopleNames = Object.keys(data);
-            
-            // Get all unique months across all people
-            const allMonths = new Set();
-            peopleNames.forEach(name => {
-                data[name].forEach(item => {
-                    allMonths.add(item.month);
-                });
-            });
-            
-            // Convert to array and sort chronologically
-            const monthLabels = Array.from(allMonths).sort();
-            
-            // Create datasets for each person
-            const datasets = peopleNames.map((name, index) => {
-                // Generate a color based on index
-                const hue = (index * 137) % 360; // Use golden ratio to spread colors
-                const color = `hsl(${hue}, 70%, 60%)`;
-                
-                // Create array of counts matching the monthLabels
-                const counts = monthLabels.map(month => {
-                    const entry = data[name].find(item => item.month === month);
-                    return entry ? entry.count : 0;
-                });
-                
-                return {
-                    label: name,
-                    data: counts,
-                    backgroundColor: color,
-                    borderColor: color,
-                    borderWidth: 2,
-                    tension: 0.3
-                };
-            });
-            
-            // Get the canvas element
-            const ctx = document.getElementById('interaction-frequency-chart').getContext('2d');
-            
-            // Destroy existing chart if it exists
-            if (interactionFrequencyChart) {
-                interactionFrequencyChart.destroy();
-            }
-            
-            // Format month labels for display (YYYY-MM to MMM YYYY)
-            const formattedMonthLabels = monthLabels.map(monthStr => {
-                const [year, month] = monthStr.split('-');
-                const date = new Date(year, parseInt(month) - 1);
-                return date.toLocaleDateString(undefined, { month: 'short', year: 'numeric' });
-            });
-            
-            // Create new chart
-            interactionFrequencyChart = new Chart(ctx, {
-                type: 'line',
-                data: {
-                    labels: formattedMonthLabels,
-                    datasets: datasets
+// Display the interaction frequency chart
+function displayInteractionFrequency(data) {
+    // Check if we have data
+    if (data.length === 0) {
+        document.getElementById('interaction-frequency-chart-container').innerHTML = 
+            '<div class="text-center py-5">No data available. Add journal entries with people to see visualizations</div>';
+        return;
+    }
+    
+    // Get all unique months across all people
+    const allMonths = new Set();
+    data.forEach(person => {
+        person.months.forEach(item => {
+            allMonths.add(item.month);
+        });
+    });
+    
+    // Convert to array and sort chronologically
+    const monthLabels = Array.from(allMonths).sort();
+    
+    // Create datasets for each person, labelled by name; people may share a name
+    const datasets = data.map((person, index) => {
+        // Generate a color based on index
+        const hue = (index * 137) % 360; // Use golden ratio to spread colors
+        const color = `hsl(${hue}, 70%, 60%)`;
+        
+        // Create array of counts matching the monthLabels
+        const counts = monthLabels.map(month => {
+            const entry = person.months.find(item => item.month === month);
+            return entry ? entry.count : 0;
+        });
+        
+        return {
+            label: person.name,
+            data: counts,
+            backgroundColor: color,
+            borderColor: color,
+            borderWidth: 2,
+            tension: 0.3
+        };
+    });
+    
+    // Get the canvas element
+    const ctx = document.getElementById('interaction-frequency-chart').getContext('2d');
+    
+    // Destroy existing chart if it exists
+    if (interactionFrequencyChart) {
+        interactionFrequencyChart.destroy();
+    }
+    
+    // Format month labels for display (YYYY-MM to MMM YYYY)
+    const formattedMonthLabels = monthLabels.map(monthStr => {
+        const [year, month] = monthStr.split('-');
+        const date = new Date(year, parseInt(month) - 1);
+        return date.toLocaleDateString(undefined, { month: 'short', year: 'numeric' });
+    });
+    
+    // Create new chart
+    interactionFrequencyChart = new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: formattedMonthLabels,
+            datasets: datasets
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                title: {
+                    display: true,
+                    text: 'Interaction Frequency Over Time'
                 },
-                options: {
-                    responsive: true,
-                    plugins: {
-                        title: {
-                            display: true,
-                            text: 'Interaction Frequency Over Time'
-                        },
-                        tooltip: {
-                            mode: 'index',
-                            intersect: false
-                        }
+                tooltip: {
+                    mode: 'index',
+                    intersect: false
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    title: {
+                        display: true,
+                        text: 'Number of Interactions'
                     },
-                    scales: {
-                        y: {
-                            beginAtZero: true,
-                            title: {
-                                display: true,
-                                text: 'Number of Interactions'
-                            },
-                            ticks: {
-                                stepSize: 1
-                            }
-                        },
-                        x: {
-                            title: {
-                                display: true,
-                                text: 'Month'
-                            }
-                        }
+                    ticks: {
+                        stepSize: 1
+                    }
+                },
+                x: {
+                    title: {
+                        display: true,
+                        text: 'Month'
                     }
                 }
-            });
-        })
-        .catch(error => {
-            console.error('Error loading interaction frequency data:', error);
-            showAlert('Failed to load interaction frequency visualization', 'danger');
-        });
+            }
+        }
+    });
 }
 
 // Load emotion timeline visualization for a specific person
@@ -390,25 +393,29 @@ function loadEmotionTimelineVisualization(personId) {
 function loadSocialWebVisualization() {
     fetch('/api/visualizations/social-web')
         .then(response => response.json())
-        .then(data => {
-            if (!data.nodes || data.nodes.length === 0) {
-                document.getElementById('social-web-container').innerHTML = 
-                    '<div class="text-center py-5">No data available. Add people and their relationships to see the social web.</div>';
-                return;
-            }
-            
-            const container = document.getElementById('social-web-container');
-            container.innerHTML = '<div id="social-web-graph" class="social-web-graph"></div>';
-            
-            // Create D3 force directed graph
-            createSocialWebGraph(data);
-        })
+        .then(displaySocialWeb)
         .catch(error => {
             console.error('Error loading social web data:', error);
             showAlert('Failed to load social web visualization', 'danger');
         });
 }
 
+// Display the social web graph
+function displaySocialWeb(data) {
+    if (!data.nodes || data.nodes.length === 0) {
+        document.getElementById('social-web-container').innerHTML = 
+            '<div class="text-center py-5">No data available. Add people and their relationships to see the social web.</div>';
+        return;
+    }
+    
+    const container = document.getElementById('social-web-container');
+    container.innerHTML = '<div id="social-web-graph" class="social-web-graph"></div>';
+    
+    // Create D3 force directed graph
+    socialWebData = data;
+    createSocialWebGraph(data);
+}
+
 // Create D3 force directed graph for social web
 function createSocialWebGraph(data) {
     const width = document.getElementById('social-web-graph').clientWidth;
@@ -453,12 +460,22 @@ function createSocialWebGraph(data) {
         })
         .attr('d', 'M0,-5L10,0L0,5');
     
-    // Create the force simulation
-    const simulation = d3.forceSimulation(data.nodes)
-        .force('link', d3.forceLink(data.links).id(d => d.id).distance(100))
-        .force('charge', d3.forceManyBody().strength(-300))
-        .force('center', d3.forceCenter(width / 2, height / 2))
-        .force('collision', d3.forceCollide().radius(50));
+    // Large graphs come laid out by the server, around (0, 0); others are laid out by a force simulation
+    let simulation = null;
+    if (data.layout === 'server') {
+        const nodesById = new Map(data.nodes.map(node => [node.id, node]));
+        data.links.forEach(link => {
+            link.source = nodesById.get(link.source);
+            link.target = nodesById.get(link.target);
+        });
+        zoomToFit(svg, zoom, data.nodes, width, height);
+    } else {
+        simulation = d3.forceSimulation(data.nodes)
+            .force('link', d3.forceLink(data.links).id(d => d.id).distance(100))
+            .force('charge', d3.forceManyBody().strength(-300))
+            .force('center', d3.forceCenter(width / 2, height / 2))
+            .force('collision', d3.forceCollide().radius(50));
+    }
     
     // Create links
     const links = g.append('g')
@@ -468,17 +485,9 @@ function createSocialWebGraph(data) {
         .enter().append('path')
         .attr('class', 'link')
         .attr('stroke-width', d => Math.max(1, d.closeness || 1))
-        .attr('stroke', d => {
-            if (d.sentiment > 0.3) return '#28a745';  // Green for positive
-            if (d.sentiment < -0.3) return '#dc3545'; // Red for negative
-            return '#6c757d';                        // Gray for neutral
-        })
+        .attr('stroke', linkStroke)
         .attr('fill', 'none')
-        .attr('marker-end', d => {
-            if (d.sentiment > 0.3) return 'url(#arrow-positive)';
-            if (d.sentiment < -0.3) return 'url(#arrow-negative)';
-            return 'url(#arrow-neutral)';
-        })
+        .attr('marker-end', linkMarker)
         .on('click', function(event, d) {
             showRelationshipDetails(d);
         });
@@ -532,19 +541,25 @@ function createSocialWebGraph(data) {
         showPersonDetails(d);
     });
     
-    // Define tick function for simulation
-    simulation.on('tick', () => {
+    // Draw links and nodes at their current positions
+    function draw() {
         links.attr('d', linkArc);
         
         nodeGroups.attr('transform', d => `translate(${d.x},${d.y})`);
-    });
+    }
+    
+    if (simulation) {
+        simulation.on('tick', draw);
+    } else {
+        draw();
+    }
     
     // Store simulation for later use
     socialNetworkGraph = simulation;
     
-    // Helper functions for drag behavior
+    // Helper functions for drag behavior; without a simulation only the dragged node moves
     function dragstarted(event, d) {
-        if (!event.active) simulation.alphaTarget(0.3).restart();
+        if (simulation && !event.active) simulation.alphaTarget(0.3).restart();
         d.fx = d.x;
         d.fy = d.y;
     }
@@ -552,10 +567,15 @@ function createSocialWebGraph(data) {
     function dragged(event, d) {
         d.fx = event.x;
         d.fy = event.y;
+        if (!simulation) {
+            d.x = event.x;
+            d.y = event.y;
+            draw();
+        }
     }
     
     function dragended(event, d) {
-        if (!event.active) simulation.alphaTarget(0);
+        if (simulation && !event.active) simulation.alphaTarget(0);
         d.fx = null;
         d.fy = null;
     }
@@ -569,6 +589,68 @@ function createSocialWebGraph(data) {
     }
 }
 
+// Zoom so that all nodes fit in the view, zooming out further than the zoom's extent if needed
+function zoomToFit(svg, zoom, nodes, width, height) {
+    if (nodes.length === 0) {
+        return;
+    }
+    const padding = 50;
+    const [minX, maxX] = d3.extent(nodes, d => d.x);
+    const [minY, maxY] = d3.extent(nodes, d => d.y);
+    const scale = Math.min(1, (width - 2 * padding) / Math.max(maxX - minX, 1),
+                           (height - 2 * padding) / Math.max(maxY - minY, 1));
+    zoom.scaleExtent([Math.min(0.5, scale), 5]);
+    svg.call(zoom.transform, d3.zoomIdentity
+        .translate(width / 2, height / 2)
+        .scale(scale)
+        .translate(-(minX + maxX) / 2, -(minY + maxY) / 2));
+}
+
+// Link colors and arrows by sentiment
+function linkStroke(d) {
+    if (d.sentiment > 0.3) return '#28a745';  // Green for positive
+    if (d.sentiment < -0.3) return '#dc3545'; // Red for negative
+    return '#6c757d';                        // Gray for neutral
+}
+
+function linkMarker(d) {
+    if (d.sentiment > 0.3) return 'url(#arrow-positive)';
+    if (d.sentiment < -0.3) return 'url(#arrow-negative)';
+    return 'url(#arrow-neutral)';
+}
+
+// Patch synced connection changes into the social web links in place.
+// Returns false if the graph has to be reloaded instead, e.g. when people
+// or connections were added or removed.
+function patchSocialWeb(changes) {
+    if (!socialWebData || changes.full || changes.people.length > 0 ||
+        changes.deleted.people.length > 0 || changes.deleted.connections.length > 0) {
+        return false;
+    }
+    
+    const linksByPair = new Map(socialWebData.links.map(link => [`${link.source.id}-${link.target.id}`, link]));
+    const changedLinks = changes.connections.map(connection => linksByPair.get(`${connection.source_id}-${connection.target_id}`));
+    if (changedLinks.some(link => !link)) {
+        return false;
+    }
+    
+    changes.connections.forEach((connection, index) => {
+        Object.assign(changedLinks[index], {
+            relationship_type: connection.relationship_type || 'Unknown',
+            sentiment: connection.sentiment,
+            interaction_count: connection.interaction_count,
+            mention_count: connection.mention_count,
+            closeness: connection.closeness
+        });
+    });
+    
+    d3.selectAll('.link')
+        .attr('stroke-width', d => Math.max(1, d.closeness || 1))
+        .attr('stroke', linkStroke)
+        .attr('marker-end', linkMarker);
+    return true;
+}
+
 // Highlight a person in the social web visualization
 function highlightPersonInSocialWeb(personId) {
     // Reset previous highlights
@@ -812,19 +894,20 @@ function updatePersonConnection() {
         const modal = bootstrap.Modal.getInstance(document.getElementById('edit-relationship-modal'));
         modal.hide();
         
-        // Reload the social web
-        loadSocialWebVisualization();
-        
-        // Reload person details
-        const personSelector = document.getElementById('person-selector');
-        if (personSelector && personSelector.value) {
-            const personId = personSelector.value;
-            fetch(`/api/people/${personId}`)
-                .then(response => response.json())
-                .then(person => {
-                    showPersonDetails(person);
-                });
-        }
+        // Patch the changed connection into the social web, or reload it
+        loadPeopleForSelector().then(changes => {
+            if (!changes || !patchSocialWeb(changes)) {
+                loadSocialWebVisualization();
+            }
+            
+            // Reload person details
+            const personSelector = document.getElementById('person-selector');
+            const node = socialWebData && personSelector && personSelector.value &&
+                socialWebData.nodes.find(node => node.id === parseInt(personSelector.value));
+            if (node) {
+                showPersonDetails(node);
+            }
+        });
     })
     .catch(error => {
         console.error('Error updating relationship:', error);
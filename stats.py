@@ -0,0 +1,196 @@
+from sqlalchemy import Float, Integer, bindparam, case, delete, func, or_, select, update
+
+from app import db
+from models import JournalEntry, Person, PersonMonthStats, PersonStats, dialect_insert, journal_person, month_bucket
+
+
+def add_entry_stats(person_ids, date_created, sentiment_score):
+    """Add one journal entry's contribution to the stats of `person_ids`"""
+    add_entries_stats([(person_ids, date_created, sentiment_score)])
+
+
+def add_entries_stats(entries):
+    """
+    Add many journal entries' contributions to the stats of their people.
+
+    `entries` is an iterable of (person_ids, date_created, sentiment_score)
+    tuples. Contributions are summed per person and per month first, so each
+    stats table gets a single upsert however many entries there are.
+    """
+    totals = {}
+    month_counts = {}
+    for person_ids, date_created, sentiment_score in entries:
+        month = date_created.strftime('%Y-%m')
+        for person_id in set(person_ids):
+            row = totals.get(person_id)
+            if row is None:
+                row = totals[person_id] = {
+                    'person_id': person_id,
+                    'entry_count': 0,
+                    'sentiment_sum': 0,
+                    'sentiment_n': 0,
+                    'first_seen': date_created,
+                    'last_seen': date_created
+                }
+            row['entry_count'] += 1
+            if sentiment_score is not None:
+                row['sentiment_sum'] += sentiment_score
+                row['sentiment_n'] += 1
+            row['first_seen'] = min(row['first_seen'], date_created)
+            row['last_seen'] = max(row['last_seen'], date_created)
+            month_counts[person_id, month] = month_counts.get((person_id, month), 0) + 1
+    if not totals:
+        return
+
+    stats = PersonStats.__table__
+    insert = dialect_insert(stats).values(list(totals.values()))
+    excluded = insert.excluded
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=[stats.c.person_id],
+        set_={
+            'entry_count': stats.c.entry_count + excluded.entry_count,
+            'sentiment_sum': stats.c.sentiment_sum + excluded.sentiment_sum,
+            'sentiment_n': stats.c.sentiment_n + excluded.sentiment_n,
+            'first_seen': case(
+                (or_(stats.c.first_seen.is_(None), excluded.first_seen < stats.c.first_seen), excluded.first_seen),
+                else_=stats.c.first_seen
+            ),
+            'last_seen': case(
+                (or_(stats.c.last_seen.is_(None), excluded.last_seen > stats.c.last_seen), excluded.last_seen),
+                else_=stats.c.last_seen
+            )
+        }
+    ))
+
+    months = PersonMonthStats.__table__
+    insert = dialect_insert(months).values([
+        {'person_id': person_id, 'month': month, 'entry_count': count}
+        for (person_id, month), count in month_counts.items()
+    ])
+    db.session.execute(insert.on_conflict_do_update(
+        index_elements=[months.c.person_id, months.c.month],
+        set_={'entry_count': months.c.entry_count + insert.excluded.entry_count}
+    ))
+
+
+def replace_entries_sentiment_stats(entries):
+    """
+    Swap entries' old sentiment scores for new ones in the stats of their people.
+
+    `entries` is an iterable of (person_ids, old_score, new_score) tuples,
+    for entries whose people and date are unchanged. The changes are summed
+    per person and written with one executemany UPDATE.
+    """
+    deltas = {}
+    for person_ids, old_score, new_score in entries:
+        delta_sum = (new_score or 0) - (old_score or 0)
+        delta_n = (new_score is not None) - (old_score is not None)
+        for person_id in set(person_ids):
+            total_sum, total_n = deltas.get(person_id, (0, 0))
+            deltas[person_id] = (total_sum + delta_sum, total_n + delta_n)
+    if not deltas:
+        return
+
+    stats = PersonStats.__table__
+    db.session.execute(
+        update(stats).where(stats.c.person_id == bindparam('stats_person_id')).values(
+            sentiment_sum=stats.c.sentiment_sum + bindparam('delta_sum', type_=Float),
+            sentiment_n=stats.c.sentiment_n + bindparam('delta_n', type_=Integer)
+        ),
+        [{'stats_person_id': person_id, 'delta_sum': delta_sum, 'delta_n': delta_n}
+         for person_id, (delta_sum, delta_n) in deltas.items()]
+    )
+
+
+def remove_entry_stats(person_ids, date_created, sentiment_score):
+    """
+    Remove one journal entry's contribution from the stats of `person_ids`.
+
+    first_seen and last_seen can't be rolled back incrementally, so they are
+    recomputed for these people from their remaining entries. Call it after
+    the entry's people have been changed or the entry deleted in the session.
+    """
+    person_ids = list(set(person_ids))
+    if not person_ids:
+        return
+
+    # Make pending changes to the entry and its people visible to the queries below
+    db.session.flush()
+
+    stats = PersonStats.__table__
+    db.session.execute(update(stats).where(stats.c.person_id.in_(person_ids)).values(
+        entry_count=stats.c.entry_count - 1,
+        sentiment_sum=stats.c.sentiment_sum - (sentiment_score or 0),
+        sentiment_n=stats.c.sentiment_n - (0 if sentiment_score is None else 1)
+    ))
+
+    months = PersonMonthStats.__table__
+    month = date_created.strftime('%Y-%m')
+    db.session.execute(update(months).where(
+        months.c.person_id.in_(person_ids), months.c.month == month
+    ).values(entry_count=months.c.entry_count - 1))
+    db.session.execute(delete(months).where(
+        months.c.person_id.in_(person_ids), months.c.month == month, months.c.entry_count <= 0
+    ))
+
+    refresh_seen(person_ids)
+
+
+def refresh_seen(person_ids):
+    """Recompute first_seen and last_seen for `person_ids` from journal_person"""
+    stats = PersonStats.__table__
+    entry_dates = select(JournalEntry.date_created).join_from(
+        journal_person, JournalEntry, JournalEntry.id == journal_person.c.journal_entry_id
+    ).where(journal_person.c.person_id == stats.c.person_id)
+
+    db.session.execute(update(stats).where(stats.c.person_id.in_(person_ids)).values(
+        first_seen=entry_dates.with_only_columns(func.min(JournalEntry.date_created)).scalar_subquery(),
+        last_seen=entry_dates.with_only_columns(func.max(JournalEntry.date_created)).scalar_subquery()
+    ))
+
+
+def delete_person_stats(person_id):
+    """Delete the stats rows of a person that is being deleted"""
+    db.session.execute(delete(PersonStats.__table__).where(PersonStats.person_id == person_id))
+    db.session.execute(delete(PersonMonthStats.__table__).where(PersonMonthStats.person_id == person_id))
+
+
+def rebuild_person_stats(user_id=None):
+    """
+    Recompute the stats tables from journal_person.
+
+    Rebuilds the stats of one user's people, or of everyone if `user_id` is
+    None. The caller commits.
+    """
+    person_ids = select(Person.id)
+    if user_id is not None:
+        person_ids = person_ids.where(Person.user_id == user_id)
+
+    stats = PersonStats.__table__
+    months = PersonMonthStats.__table__
+    db.session.execute(delete(stats).where(stats.c.person_id.in_(person_ids)))
+    db.session.execute(delete(months).where(months.c.person_id.in_(person_ids)))
+
+    entries = select().select_from(journal_person).join(
+        JournalEntry, JournalEntry.id == journal_person.c.journal_entry_id
+    ).where(journal_person.c.person_id.in_(person_ids))
+
+    db.session.execute(stats.insert().from_select(
+        ['person_id', 'entry_count', 'sentiment_sum', 'sentiment_n', 'first_seen', 'last_seen'],
+        entries.with_only_columns(
+            journal_person.c.person_id,
+            func.count(),
+            func.coalesce(func.sum(JournalEntry.sentiment_score), 0),
+            func.count(JournalEntry.sentiment_score),
+            func.min(JournalEntry.date_created),
+            func.max(JournalEntry.date_created)
+        ).group_by(journal_person.c.person_id)
+    ))
+
+    month = month_bucket(JournalEntry.date_created)
+    db.session.execute(months.insert().from_select(
+        ['person_id', 'month', 'entry_count'],
+        entries.with_only_columns(
+            journal_person.c.person_id, month, func.count()
+        ).group_by(journal_person.c.person_id, month)
+    ))
@@ -0,0 +1,149 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app import db
+from models import DataVersion, JournalEntry, Person, PersonConnection, SyncTombstone
+
+SYNC_TYPES = ('entries', 'people', 'connections')
+DEFAULT_TOMBSTONE_DAYS = 30
+# Most entries in one sync response; the rest are fetched with its next_cursor
+SYNC_PAGE_SIZE = 500
+
+
+def encode_sync_token(user_id, version):
+    """Encode a user's data version as an opaque sync token"""
+    return base64.urlsafe_b64encode(f'{user_id}|{version}'.encode()).decode()
+
+
+def decode_sync_token(token):
+    """Decode a token from encode_sync_token into (user_id, version), raising ValueError if it is malformed"""
+    raw = base64.urlsafe_b64decode(token.encode()).decode()
+    user_id, version = raw.split('|')
+    return int(user_id), int(version)
+
+
+def encode_sync_cursor(user_id, version, after_id):
+    """Encode where the next page of a sync's entries starts, for the sync window ending at `version`"""
+    return base64.urlsafe_b64encode(f'{user_id}|{version}|{after_id}'.encode()).decode()
+
+
+def decode_sync_cursor(cursor):
+    """Decode a cursor from encode_sync_cursor into (user_id, version, after_id), raising ValueError if it is malformed"""
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    user_id, version, after_id = raw.split('|')
+    return int(user_id), int(version), int(after_id)
+
+
+def sync_since(user_id, token, version):
+    """
+    Return the data version a sync from `token` starts after, or None for a full sync.
+
+    A sync sends the changes stamped after it and up to the user's current
+    `version`, which must be read before the changes, so a change committed
+    meanwhile is sent again with the next sync rather than missed. Clients
+    need a full sync when they have no token, it is malformed, another
+    user's or from the future (e.g. a restored database), or the tombstones
+    it would need were pruned.
+    """
+    if not token:
+        return None
+    try:
+        token_user_id, since = decode_sync_token(token)
+    except ValueError:
+        return None
+    if token_user_id != user_id or since > version:
+        return None
+    floor = db.session.execute(
+        select(DataVersion.sync_floor).where(DataVersion.user_id == user_id)
+    ).scalar() or 0
+    return since if since >= floor else None
+
+
+def in_sync_window(statement, column, since, version):
+    """Restrict `statement` to rows whose sync version `column` is in (since, version]; since None means from the start"""
+    statement = statement.where(column <= version)
+    if since is not None:
+        statement = statement.where(column > since)
+    return statement
+
+
+def changed_entries(user_id, since, version, options=(), after_id=0, limit=None):
+    """
+    Return a user's journal entries changed in the sync window, or all of them if `since` is None.
+
+    Entries are in id order, starting after `after_id`, and at most `limit` of them.
+    """
+    statement = select(JournalEntry).options(*options).where(JournalEntry.user_id == user_id,
+                                                              JournalEntry.id > after_id)
+    statement = in_sync_window(statement, JournalEntry.sync_version, since, version)
+    return db.session.execute(statement.order_by(JournalEntry.id).limit(limit)).scalars().all()
+
+
+def changed_people(user_id, since, version):
+    """Return a user's people changed in the sync window, or all of them if `since` is None"""
+    statement = select(Person).where(Person.user_id == user_id)
+    statement = in_sync_window(statement, Person.sync_version, since, version)
+    return db.session.execute(statement.order_by(Person.id)).scalars().all()
+
+
+def changed_connections(user_id, since, version):
+    """Return the connections of a user's people changed in the sync window, or all of them if `since` is None"""
+    # Both people of a connection belong to the same user
+    statement = select(PersonConnection).join(Person, Person.id == PersonConnection.source_id).where(
+        Person.user_id == user_id)
+    statement = in_sync_window(statement, PersonConnection.sync_version, since, version)
+    return db.session.execute(statement.order_by(PersonConnection.id)).scalars().all()
+
+
+def deleted_records(user_id, since, version, types=SYNC_TYPES):
+    """Return {type: [id, ...]} of the records of `types` a user deleted in the sync window"""
+    deleted = {record_type: [] for record_type in types}
+    if since is None:
+        return deleted
+    rows = db.session.execute(select(SyncTombstone.record_type, SyncTombstone.record_id).where(
+        SyncTombstone.user_id == user_id,
+        SyncTombstone.version > since,
+        SyncTombstone.version <= version,
+        SyncTombstone.record_type.in_(types)
+    ).order_by(SyncTombstone.id))
+    for record_type, record_id in rows:
+        deleted[record_type].append(record_id)
+    return deleted
+
+
+def record_tombstones(user_id, version, record_type, record_ids):
+    """
+    Record that a user deleted `record_ids` of `record_type` in data version `version`.
+
+    Call it in the transaction of the delete, with the version returned by
+    bump_data_version.
+    """
+    now = datetime.utcnow()
+    rows = [{'user_id': user_id, 'record_type': record_type, 'record_id': record_id,
+             'version': version, 'deleted_at': now} for record_id in record_ids]
+    if rows:
+        db.session.execute(insert(SyncTombstone), rows)
+
+
+def prune_tombstones(before):
+    """
+    Delete the tombstones of deletes made before `before`, in the current transaction.
+
+    Each user's sync_floor is raised to the newest version pruned, so
+    clients with an older token get a full sync instead of missing deletes.
+    Returns the number of tombstones deleted.
+    """
+    floors = db.session.execute(
+        select(SyncTombstone.user_id, func.max(SyncTombstone.version))
+        .where(SyncTombstone.deleted_at < before)
+        .group_by(SyncTombstone.user_id)
+    ).all()
+    if not floors:
+        return 0
+    # Versions only grow, so the newest pruned version is above any older floor
+    db.session.execute(update(DataVersion), [
+        {'user_id': user_id, 'sync_floor': version} for user_id, version in floors
+    ])
+    return db.session.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < before)).rowcount
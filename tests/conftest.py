@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.synthetic import generate_account, logged_in_client, open_benchmark_app
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """A migrated app on a temporary SQLite database, with query budgets enforced and caches off"""
+    return open_benchmark_app(
+        str(tmp_path_factory.mktemp('journal')), TESTING=True, RESULT_CACHE='none',
+        GRAPH_CACHE_MAX_ENTRIES=0, LAYOUT_CACHE_MAX_ENTRIES=0
+    )
+
+
+@pytest.fixture(scope='session')
+def accounts(app):
+    """A small and a larger seeded account, {'small': account, 'large': account} as from generate_account"""
+    with app.app_context():
+        return {
+            'small': generate_account('small', people=4, entries=8, seed=1),
+            'large': generate_account('large', people=16, entries=80, seed=2),
+        }
+
+
+@pytest.fixture
+def login(app):
+    """Return a function that gives a test client logged in as an account"""
+    return lambda account: logged_in_client(app, account['user_id'])
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import select
+
+import analysis
+from app import db
+from benchmarks.synthetic import generate_account
+from models import Person, PersonConnection
+
+
+def broken_analysis(contents):
+    raise RuntimeError('analysis failed')
+
+
+def entry_status(client, entry_id):
+    statuses = {entry['id']: entry['analysis_status']
+                for entry in client.get(f'/api/journal-entries/analysis?ids={entry_id}').get_json()['entries']}
+    assert client.get(f'/api/journal-entries/{entry_id}').get_json()['analysis_status'] == statuses[entry_id]
+    return statuses[entry_id]
+
+
+def test_failed_analysis_is_reported_and_retried(app, login, monkeypatch):
+    with app.app_context():
+        account = generate_account('failing', people=2, entries=0)
+    client = login(account)
+    entry_id = client.post('/api/journal-entries', json={'title': 't', 'content': 'A lovely day'}).get_json()['id']
+
+    with app.app_context():
+        assert entry_status(client, entry_id) == 'pending'
+        etag = client.get(f'/api/journal-entries/analysis?ids={entry_id}').headers['ETag']
+        depth = analysis.analysis_queue_stats()['depth']
+
+        monkeypatch.setattr(analysis, 'analyze_contents', broken_analysis)
+        for _ in range(analysis.MAX_ATTEMPTS):
+            with pytest.raises(RuntimeError):
+                analysis.process_analysis_jobs()
+        assert analysis.process_analysis_jobs() == 0
+
+        assert entry_status(client, entry_id) == 'failed'
+        assert client.get(f'/api/journal-entries/analysis?ids={entry_id}',
+                          headers={'If-None-Match': etag}).status_code == 200
+        stats = analysis.analysis_queue_stats()
+        assert stats['depth'] == depth - 1
+        assert stats['failed'] >= 1
+
+        monkeypatch.undo()
+        assert analysis.retry_failed_analysis(account['user_id']) == 1
+        db.session.commit()
+        assert entry_status(client, entry_id) == 'pending'
+        assert analysis.analysis_queue_stats()['depth'] == depth
+
+        while analysis.process_analysis_jobs():
+            pass
+        assert entry_status(client, entry_id) == 'ready'
+
+
+def connection_counts(account):
+    return sorted(db.session.execute(
+        select(PersonConnection.interaction_count).join(Person, Person.id == PersonConnection.source_id)
+        .where(Person.user_id == account['user_id'])
+    ).scalars())
+
+
+def drain():
+    while analysis.process_analysis_jobs():
+        pass
+
+
+def test_content_edits_record_connections_only_when_people_change(app, login):
+    with app.app_context():
+        account = generate_account('editing', people=3, entries=0)
+        people = db.session.execute(
+            select(Person.id).where(Person.user_id == account['user_id']).order_by(Person.id)).scalars().all()
+    client = login(account)
+    entry_id = client.post('/api/journal-entries', json={
+        'title': 't', 'content': 'Dinner', 'interaction_type': 'meeting', 'people_ids': people[:2]}).get_json()['id']
+
+    with app.app_context():
+        drain()
+        assert connection_counts(account) == [1]
+
+        # Coalesced content edits of the same people don't count the interaction again
+        for content in ('Dinner out', 'A long dinner out'):
+            client.put(f'/api/journal-entries/{entry_id}', json={'content': content})
+        drain()
+        assert connection_counts(account) == [1]
+
+        # An edit that also changes the people records the new pairs
+        client.put(f'/api/journal-entries/{entry_id}', json={'content': 'Dinner for three', 'people_ids': people})
+        drain()
+        assert connection_counts(account) == [1, 1, 2]
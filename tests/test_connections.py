@@ -0,0 +1,26 @@
+from app import db
+from benchmarks.synthetic import generate_account
+from models import Person, PersonConnection
+
+
+def test_saving_a_connection_upserts_the_pair(app, login):
+    with app.app_context():
+        account = generate_account('connecting', people=2, entries=0)
+        first, second = db.session.execute(
+            db.select(Person.id).where(Person.user_id == account['user_id']).order_by(Person.id)
+        ).scalars().all()
+    client = login(account)
+
+    created = client.post('/api/person-connections', json={
+        'source_id': second, 'target_id': first, 'relationship_type': 'friend', 'closeness': 7, 'notes': 'school'})
+    assert created.status_code == 200
+    updated = client.post('/api/person-connections', json={'source_id': first, 'target_id': second, 'sentiment': 0.5})
+    assert updated.get_json()['id'] == created.get_json()['id']
+
+    with app.app_context():
+        connection = db.session.execute(
+            db.select(PersonConnection).where(PersonConnection.source_id.in_([first, second]))
+        ).scalar_one()
+        assert (connection.source_id, connection.target_id) == (first, second)
+        assert (connection.relationship_type, connection.closeness, connection.notes, connection.sentiment) == \
+            ('friend', 7, 'school', 0.5)
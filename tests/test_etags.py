@@ -0,0 +1,75 @@
+import analysis
+from benchmarks.synthetic import generate_account
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_data_is_answered_with_304(accounts, login):
+    client = login(accounts['small'])
+    response = client.get('/api/people')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    not_modified = revalidate(client, '/api/people', etag)
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == response.headers['ETag']
+
+    # The tag covers the query string and the user
+    other_page = client.get('/api/journal-entries?limit=1').headers['ETag']
+    assert revalidate(client, '/api/journal-entries?limit=2', other_page).status_code == 200
+    assert revalidate(login(accounts['large']), '/api/people', etag).status_code == 200
+
+
+def test_compressed_bodies_are_revalidated_by_their_own_etag(accounts, login):
+    client = login(accounts['large'])
+    plain = client.get('/api/journal-entries')
+    gzipped = client.get('/api/journal-entries', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] != plain.headers['ETag']
+
+    response = client.get('/api/journal-entries', headers={'Accept-Encoding': 'gzip',
+                                                            'If-None-Match': gzipped.headers['ETag']})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == gzipped.headers['ETag']
+
+
+def test_writes_change_the_etag(app, login):
+    with app.app_context():
+        account = generate_account('etag-writes', people=2, entries=2)
+    client = login(account)
+    etag = client.get('/api/people').headers['ETag']
+
+    person_id = client.post('/api/people', json={'name': 'Ada'}).get_json()['id']
+    response = revalidate(client, '/api/people', etag)
+    assert response.status_code == 200
+    assert 'Ada' in [person['name'] for person in response.get_json()]
+    etag = response.headers['ETag']
+    assert revalidate(client, '/api/people', etag).status_code == 304
+
+    client.delete(f'/api/people/{person_id}')
+    response = revalidate(client, '/api/people', etag)
+    assert response.status_code == 200
+    assert 'Ada' not in [person['name'] for person in response.get_json()]
+
+
+def test_finished_analysis_changes_the_etag(app, login):
+    with app.app_context():
+        account = generate_account('etag-analysis', people=2, entries=0)
+    client = login(account)
+    entry_id = client.post('/api/journal-entries', json={'title': 't', 'content': 'A wonderful day'}).get_json()['id']
+    url = f'/api/journal-entries/analysis?ids={entry_id}'
+    pending = client.get(url)
+    assert pending.get_json()['entries'][0]['analysis_status'] == 'pending'
+    etag = pending.headers['ETag']
+    assert revalidate(client, url, etag).status_code == 304
+
+    with app.app_context():
+        while analysis.process_analysis_jobs():
+            pass
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.get_json()['entries'][0]['analysis_status'] == 'ready'
+    assert response.headers['ETag'] != etag
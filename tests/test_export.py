@@ -0,0 +1,32 @@
+import json
+
+from benchmarks.synthetic import generate_account
+
+
+def exported(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_incremental_export_includes_edited_entries(app, login):
+    with app.app_context():
+        account = generate_account('exporting', people=3, entries=5, seed=3)
+    client = login(account)
+
+    full = client.get('/api/export?types=entries')
+    entries = exported(full)
+    assert len(entries) == 5
+    token = full.headers['X-Sync-Token']
+    assert exported(client.get(f'/api/export?since={token}')) == []
+
+    # The oldest entry, created long before the token, is edited after it
+    oldest = min(entries, key=lambda entry: entry['date_created'])
+    assert client.put(f'/api/journal-entries/{oldest["id"]}', json={'title': 'Edited'}).status_code == 200
+    changed = exported(client.get(f'/api/export?types=entries&since={token}'))
+    assert [(entry['id'], entry['title']) for entry in changed] == [(oldest['id'], 'Edited')]
+
+
+def test_export_rejects_bad_tokens(app, login, accounts):
+    client = login(accounts['small'])
+    assert client.get('/api/export?since=2024-01-01').status_code == 400
+    other = login(accounts['large']).get('/api/export?types=people').headers['X-Sync-Token']
+    assert client.get(f'/api/export?since={other}').status_code == 400
@@ -0,0 +1,67 @@
+import math
+
+import pytest
+
+from graph import Graph
+
+
+def build(people, edges, weight=1.0):
+    """A Graph of people 1..people with unit-weight (or `weight`) connections between the given pairs"""
+    return Graph([(i, f'P{i}') for i in range(1, people + 1)],
+                 [(source, target, weight) for source, target in edges])
+
+
+def test_pagerank_sums_to_one_and_ranks_the_hub_highest():
+    # Person 1 is connected to everyone else; 5 and 6 are also connected to each other
+    graph = build(7, [(1, i) for i in range(2, 8)] + [(5, 6)])
+    ranks = graph.pagerank
+    assert sum(ranks) == pytest.approx(1)
+    assert max(range(7), key=ranks.__getitem__) == 0
+    assert ranks[4] == pytest.approx(ranks[5]) and ranks[4] > ranks[1]
+
+
+def test_pagerank_spreads_the_rank_of_people_without_connections():
+    ranks = build(4, [(1, 2)]).pagerank
+    assert sum(ranks) == pytest.approx(1)
+    assert ranks[0] == pytest.approx(ranks[1]) and ranks[2] == pytest.approx(ranks[3])
+    assert ranks[0] > ranks[2]
+
+
+def test_disconnected_cliques_are_two_communities():
+    clique = [(a, b) for a in range(1, 5) for b in range(a + 1, 5)]
+    graph = build(8, clique + [(a + 4, b + 4) for a, b in clique])
+    assert graph.communities == [0, 0, 0, 0, 1, 1, 1, 1]
+    assert graph.modularity == pytest.approx(0.5)
+    metrics = graph.metrics()
+    assert metrics['communities'] == [{'id': 0, 'members': [1, 2, 3, 4]}, {'id': 1, 'members': [5, 6, 7, 8]}]
+    assert (metrics['node_count'], metrics['edge_count']) == (8, 12)
+
+
+def test_graph_without_connections():
+    graph = build(3, [])
+    assert graph.modularity == 0.0
+    assert graph.communities == [0, 1, 2]
+    assert graph.pagerank == pytest.approx([1 / 3] * 3)
+
+
+def test_shortest_path_follows_the_strongest_ties():
+    # 1-2-3 with strong ties is shorter than the weak direct 1-3
+    graph = Graph([(i, f'P{i}') for i in (1, 2, 3, 4)], [(1, 2, 4.0), (2, 3, 4.0), (1, 3, 1.0)])
+    path, distance = graph.shortest_path(1, 3)
+    assert path == [1, 2, 3] and distance == pytest.approx(0.5)
+    assert graph.shortest_path(3, 3) == ([3], 0.0)
+
+
+def test_shortest_path_without_a_path():
+    graph = build(4, [(1, 2), (3, 4)])
+    assert graph.shortest_path(1, 4) is None
+    with pytest.raises(KeyError):
+        graph.shortest_path(1, 99)
+
+
+def test_unknown_people_and_loops_are_ignored():
+    graph = build(3, [(1, 2), (2, 2), (1, 99)])
+    assert graph.edge_count == 1
+    assert [graph.degree(i) for i in range(3)] == [1, 1, 0]
+    assert graph.weighted_degrees == [1.0, 1.0, 0]
+    assert not math.isnan(graph.modularity)
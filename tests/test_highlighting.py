@@ -0,0 +1,97 @@
+import pytest
+
+import analysis
+from app import db
+from benchmarks.synthetic import generate_account
+from models import JournalEntry
+from utils import NameMatcher, extract_potential_names, get_name_matcher, invalidate_name_matcher
+
+
+def known(person_id, name):
+    return f'<span class="person-highlight known" data-person-id="{person_id}">{name}</span>'
+
+
+def new(name):
+    return f'<span class="person-highlight new">{name}</span>'
+
+
+PEOPLE = [(1, 'Sam'), (2, 'Priya'), (3, "O'Neil"), (4, 'Jo-Anne')]
+
+
+@pytest.mark.parametrize('content, expected, known_people', [
+    ('Had lunch with Sam and Priya.',
+     f'Had lunch with {known(1, "Sam")} and {known(2, "Priya")}.', {'Sam': 1, 'Priya': 2}),
+    # Every casing is highlighted with the stored name, and isn't also a new name
+    ('sam called, then SAM called again. Later Sam came by.',
+     f'{known(1, "Sam")} called, then {known(1, "Sam")} called again. Later {known(1, "Sam")} came by.',
+     {'Sam': 1}),
+    # Names inside longer words don't count
+    ('Priya was out, so I saw Samantha and Sammy instead.',
+     f'{known(2, "Priya")} was out, so I saw {new("Samantha")} and {new("Sammy")} instead.', {'Priya': 2}),
+    # Names with punctuation are matched whole, not as the words in them
+    ("Met O'Neil and Jo-Anne at the Harbour with Lee.",
+     'Met ' + known(3, "O'Neil") + f' and {known(4, "Jo-Anne")} at the {new("Harbour")} with {new("Lee")}.',
+     {"O'Neil": 3, 'Jo-Anne': 4}),
+    ('Talked to jo-anne about Lee and lee about Jo-Anne.',
+     f'Talked to {known(4, "Jo-Anne")} about {new("Lee")} and {new("Lee")} about {known(4, "Jo-Anne")}.',
+     {'Jo-Anne': 4}),
+    ('Nobody here today.', 'Nobody here today.', {}),
+])
+def test_known_and_new_names_are_highlighted(content, expected, known_people):
+    matcher = NameMatcher(PEOPLE)
+    new_names = [name for name in extract_potential_names(content) if name not in matcher.names]
+    assert matcher.highlight(content, new_names) == (expected, known_people)
+
+
+def test_longer_names_win_over_names_inside_them():
+    matcher = NameMatcher([(1, 'Ann'), (2, 'Mary Ann')])
+    result, known_people = matcher.highlight('Mary Ann met Ann.')
+    assert result == f'{known(2, "Mary Ann")} met {known(1, "Ann")}.'
+    assert known_people == {'Mary Ann': 2, 'Ann': 1}
+
+
+def test_names_are_only_highlighted_when_written_with_their_casing():
+    matcher = NameMatcher([(1, 'Sam')])
+    assert matcher.highlight('sam and SAM') == ('sam and SAM', {})
+    # With the exact casing present, every casing is highlighted with the stored name
+    assert matcher.highlight('sam and Sam') == (f'{known(1, "Sam")} and {known(1, "Sam")}', {'Sam': 1})
+
+
+def test_new_names_dont_touch_the_markup_of_known_people():
+    matcher = NameMatcher([(1, 'Sam')])
+    result, _ = matcher.highlight('Sam met Person and Known.', ['Person', 'Known'])
+    assert result == f'{known(1, "Sam")} met {new("Person")} and {new("Known")}.'
+
+
+def test_cached_matchers_are_rebuilt_when_people_change():
+    invalidate_name_matcher(-1)
+    matcher = get_name_matcher(-1, [(1, 'Sam')])
+    assert get_name_matcher(-1, [(1, 'Sam')]) is matcher
+    renamed = get_name_matcher(-1, [(1, 'Samuel')])
+    assert renamed is not matcher
+    assert renamed.highlight('Samuel and Sam')[1] == {'Samuel': 1}
+    invalidate_name_matcher(-1)
+
+
+def test_saved_entries_are_highlighted(app, login):
+    with app.app_context():
+        account = generate_account('highlights', people=0, entries=0)
+    client = login(account)
+    sam = client.post('/api/people', json={'name': 'Sam'}).get_json()['id']
+    entry_id = client.post('/api/journal-entries', json={
+        'title': 't', 'content': 'Walked with Sam and Greta.', 'people_ids': [sam]}).get_json()['id']
+
+    with app.app_context():
+        while analysis.process_analysis_jobs():
+            pass
+        entry = db.session.get(JournalEntry, entry_id)
+        assert entry.content_with_highlights == f'Walked with {known(sam, "Sam")} and {new("Greta")}.'
+
+    # Renaming the person rebuilds the matcher used for the next save
+    client.put(f'/api/people/{sam}', json={'name': 'Samuel'})
+    client.put(f'/api/journal-entries/{entry_id}', json={'content': 'Walked with Samuel and Sam.'})
+    with app.app_context():
+        while analysis.process_analysis_jobs():
+            pass
+        entry = db.session.get(JournalEntry, entry_id)
+        assert entry.content_with_highlights == f'Walked with {known(sam, "Samuel")} and {new("Sam")}.'
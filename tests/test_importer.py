@@ -0,0 +1,35 @@
+import json
+
+from app import db
+from benchmarks.synthetic import generate_account
+from importer import import_journal, parse_import_record
+from models import JournalEntry
+
+
+def test_invalid_fields_skip_only_their_line(app):
+    records = [
+        {'title': 'ok', 'content': 'A good day', 'mood': 'happy', 'interaction_type': 'call'},
+        {'title': 'long mood', 'content': 'x', 'mood': 'm' * 51},
+        {'title': 'bad type', 'content': 'x', 'interaction_type': ['call']},
+        {'title': 'bad mood', 'content': 'x', 'mood': 3},
+        {'title': 'also ok', 'content': 'Another day'},
+    ]
+    with app.app_context():
+        account = generate_account('importing', people=2, entries=0)
+        progress = list(import_journal(account['user_id'], [json.dumps(record) for record in records], workers=1))
+
+        assert progress[-1]['imported'] == 2
+        assert [(error['line'], error['error']) for error in progress[-1]['errors']] == [
+            (2, 'mood is longer than 50 characters'),
+            (3, 'interaction_type must be a string'),
+            (4, 'mood must be a string'),
+        ]
+        titles = db.session.execute(
+            db.select(JournalEntry.title).where(JournalEntry.user_id == account['user_id']).order_by(JournalEntry.id)
+        ).scalars().all()
+        assert titles == ['ok', 'also ok']
+
+
+def test_only_integer_people_ids_are_linked():
+    record = {'title': 't', 'content': 'x', 'people_ids': [True, False, 1.0, '2', 2, 3, 2]}
+    assert parse_import_record(record, {0, 1, 2}, {})['person_ids'] == [2]
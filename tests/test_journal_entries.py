@@ -0,0 +1,90 @@
+import base64
+import json
+
+import pytest
+
+from benchmarks.synthetic import generate_account
+from importer import import_journal
+from routes import ENTRY_FIELDS
+
+
+@pytest.fixture(scope='module')
+def tied_account(app):
+    """An account whose 12 entries share three dates, four entries on each"""
+    with app.app_context():
+        account = generate_account('tied', people=2, entries=0)
+        person_id = account['people'][0][0]
+        records = [{'title': f'entry {number}', 'content': 'A day out',
+                    'date_created': f'2024-03-0{1 + number % 3}T12:00:00', 'people_ids': [person_id]}
+                   for number in range(12)]
+        progress = list(import_journal(account['user_id'], [json.dumps(record) for record in records], workers=1))
+        assert progress[-1]['imported'] == 12
+    return account
+
+
+def all_pages(client, limit, query=''):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/journal-entries?limit={limit}{query}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        assert len(page['entries']) <= limit
+        ids.extend(entry['id'] for entry in page['entries'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 3, 5, 12, 200])
+def test_pages_cover_tied_entries_once_in_order(tied_account, login, limit):
+    client = login(tied_account)
+    full = client.get('/api/journal-entries?limit=200&fields=date_created').get_json()['entries']
+    assert len(full) == 12
+    # Newest first, ties broken by the newest id
+    assert full == sorted(full, key=lambda entry: (entry['date_created'], entry['id']), reverse=True)
+
+    ids = all_pages(client, limit)
+    assert ids == [entry['id'] for entry in full]
+    # Paging again gives the same order
+    assert all_pages(client, limit, '&fields=title') == ids
+
+
+def test_new_entries_dont_shift_later_pages(tied_account, app, login):
+    client = login(tied_account)
+    first = client.get('/api/journal-entries?limit=4').get_json()
+    rest = all_pages(client, 200, f'&cursor={first["next_cursor"]}')
+    created = client.post('/api/journal-entries', json={'title': 'new', 'content': 'Newest'}).get_json()['id']
+    try:
+        assert all_pages(client, 200, f'&cursor={first["next_cursor"]}') == rest
+        assert created not in rest
+    finally:
+        client.delete(f'/api/journal-entries/{created}')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    'YQ',
+    base64.urlsafe_b64encode(b'no separator').decode(),
+    base64.urlsafe_b64encode(b'2024-03-01T12:00:00|x').decode(),
+    base64.urlsafe_b64encode(b'yesterday|5').decode(),
+    base64.urlsafe_b64encode(b'\xff\xfe|5').decode(),
+])
+def test_invalid_cursors_are_rejected(tied_account, login, cursor):
+    response = login(tied_account).get(f'/api/journal-entries?cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_fields_limit_the_serialized_entries(tied_account, login):
+    client = login(tied_account)
+    entries = client.get('/api/journal-entries?fields=title,people&limit=3').get_json()['entries']
+    assert [set(entry) for entry in entries] == [{'id', 'title', 'people'}] * 3
+    person_id, name = tied_account['people'][0]
+    assert all(entry['people'] == [{'id': person_id, 'name': name}] for entry in entries)
+
+    full = client.get('/api/journal-entries?limit=3').get_json()['entries']
+    assert [set(entry) for entry in full] == [{'id', *ENTRY_FIELDS}] * 3
+    assert [{'id': entry['id'], 'title': entry['title'], 'people': entry['people']} for entry in full] == entries
+
+    response = client.get('/api/journal-entries?fields=title,password_hash')
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Unknown fields: password_hash'}
@@ -0,0 +1,80 @@
+import tracemalloc
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import layout
+
+
+def ring_web(people):
+    """A social web of `people` people, each connected to the next"""
+    return {
+        'nodes': [{'id': person_id} for person_id in range(1, people + 1)],
+        'links': [{'source': person_id, 'target': person_id % people + 1, 'closeness': 5, 'sentiment': 0.5,
+                   'interaction_count': 2} for person_id in range(1, people + 1)]
+    }
+
+
+@pytest.fixture
+def layout_cache(app, monkeypatch):
+    cache = layout.LayoutCache(4)
+    monkeypatch.setitem(app.extensions, 'layout_cache', cache)
+    return cache
+
+
+def test_layout_is_deterministic(app, layout_cache):
+    with app.app_context():
+        first = layout.social_web_positions(1, ring_web(12))
+        layout_cache.entries.clear()
+        assert layout.social_web_positions(1, ring_web(12)) == first
+    distances = [np.hypot(*np.subtract(first[i], first[i % 12 + 1])) for i in range(1, 13)]
+    assert max(distances) < 3 * layout.LINK_DISTANCE
+
+
+def test_warm_layout_starts_from_the_previous_one(app, layout_cache, monkeypatch):
+    with app.app_context():
+        cold = layout.social_web_positions(1, ring_web(12))
+        assert layout.social_web_positions(1, ring_web(12)) is cold
+
+        runs = []
+        force_layout = layout.force_layout
+        monkeypatch.setattr(layout, 'force_layout', lambda *args: runs.append(args) or force_layout(*args))
+        web = ring_web(12)
+        web['nodes'].append({'id': 13})
+        web['links'].append({'source': 13, 'target': 1, 'closeness': 5, 'sentiment': 0, 'interaction_count': 1})
+        warm = layout.social_web_positions(1, web)
+
+    (n, _, _, _, initial, iterations, _), = runs
+    assert (n, iterations) == (13, layout.WARM_ITERATIONS)
+    assert np.allclose(initial[:12], [cold[person_id] for person_id in range(1, 13)])
+    moved = [np.hypot(*np.subtract(warm[person_id], cold[person_id])) for person_id in range(1, 13)]
+    assert np.median(moved) < layout.LINK_DISTANCE
+
+
+def test_barnes_hut_matches_exact_repulsion():
+    positions = np.random.default_rng(1).uniform(-2000, 2000, (500, 2))
+    k2 = layout.LINK_DISTANCE ** 2
+    exact = layout._exact_repulsion(positions, k2)
+    error = np.linalg.norm(layout._barnes_hut_repulsion(positions, k2) - exact, axis=1) / np.linalg.norm(exact, axis=1)
+    assert np.median(error) < 0.01 and error.max() < 0.3
+
+
+def test_barnes_hut_handles_clustered_nodes():
+    # More nearly coincident people than a cell may hold drive the tree to MAX_TREE_DEPTH
+    random = np.random.default_rng(2)
+    positions = random.uniform(-2000, 2000, (400, 2))
+    positions[:40] = random.normal(0, 1e-6, (40, 2))
+    k2 = layout.LINK_DISTANCE ** 2
+
+    tracemalloc.start()
+    try:
+        force = layout._barnes_hut_repulsion(positions, k2)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 20 * 2 ** 20
+    assert np.isfinite(force).all()
+    exact = layout._exact_repulsion(positions, k2)
+    error = np.linalg.norm(force[40:] - exact[40:], axis=1) / np.linalg.norm(exact[40:], axis=1)
+    assert np.median(error) < 0.01
@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def metrics_token(app):
+    token = app.config.get('METRICS_TOKEN')
+    yield app.config
+    app.config['METRICS_TOKEN'] = token
+
+
+def test_metrics_without_a_token_are_served_only_to_loopback(app, metrics_token):
+    metrics_token['METRICS_TOKEN'] = None
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '::1'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'}).status_code == 403
+
+
+def test_metrics_with_a_token_require_it(app, metrics_token):
+    metrics_token['METRICS_TOKEN'] = 'secret'
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'},
+                          environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert response.status_code == 200
+    assert 'journal_analysis_queue_depth' in response.get_data(as_text=True)
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import func, select
+
+from app import db
+from models import JournalEntry, Person, PersonConnection, journal_person
+from query_count import count_queries
+
+
+def most_mentioned_person(account):
+    return db.session.execute(
+        select(journal_person.c.person_id).join(JournalEntry).where(
+            JournalEntry.user_id == account['user_id']
+        ).group_by(journal_person.c.person_id).order_by(func.count().desc()).limit(1)
+    ).scalar()
+
+
+def best_connected_person(account):
+    """The person with the most connections, so every query of their connections runs"""
+    connections = func.count(PersonConnection.id)
+    return db.session.execute(
+        select(Person.id).join(PersonConnection, (PersonConnection.source_id == Person.id) |
+                               (PersonConnection.target_id == Person.id))
+        .where(Person.user_id == account['user_id']).group_by(Person.id).order_by(connections.desc()).limit(1)
+    ).scalar()
+
+
+def entry_ids(account):
+    return db.session.execute(
+        select(JournalEntry.id).where(JournalEntry.user_id == account['user_id']).order_by(JournalEntry.id)
+    ).scalars().all()
+
+
+# URL of every view with a @query_budget, given an account; the rule is the view's route
+BUDGETED_URLS = {
+    '/api/journal-entries': lambda account: '/api/journal-entries?limit=200',
+    '/api/journal-entries/search': lambda account: '/api/journal-entries/search?q=coffee&limit=100',
+    '/api/journal-entries/analysis': lambda account: '/api/journal-entries/analysis?ids=' + ','.join(
+        str(entry_id) for entry_id in entry_ids(account)[:100]),
+    '/api/sync': lambda account: '/api/sync',
+    '/api/visualizations/relationship-strength': lambda account: '/api/visualizations/relationship-strength',
+    '/api/visualizations/interaction-frequency': lambda account: '/api/visualizations/interaction-frequency',
+    '/api/visualizations/social-web': lambda account: '/api/visualizations/social-web?layout=client',
+    '/api/visualizations/dashboard': lambda account: '/api/visualizations/dashboard?layout=client',
+    '/api/visualizations/graph-metrics': lambda account: '/api/visualizations/graph-metrics',
+    '/api/visualizations/graph-metrics/path/<int:source_id>/<int:target_id>':
+        lambda account: f'/api/visualizations/graph-metrics/path/{account["people"][0][0]}/'
+                        f'{most_mentioned_person(account)}',
+    '/api/visualizations/social-connections/<int:person_id>':
+        lambda account: f'/api/visualizations/social-connections/{best_connected_person(account)}',
+}
+
+
+def test_every_budgeted_view_is_covered(app):
+    budgeted = {rule.rule for rule in app.url_map.iter_rules()
+                if hasattr(app.view_functions[rule.endpoint], 'query_budget')}
+    assert budgeted == set(BUDGETED_URLS)
+
+
+def test_budgets_are_enforced_when_testing(app):
+    assert app.config['ENFORCE_QUERY_BUDGETS']
+
+
+@pytest.mark.parametrize('rule', sorted(BUDGETED_URLS))
+def test_query_count_does_not_grow_with_data(app, accounts, login, rule):
+    counts = {}
+    for size, account in accounts.items():
+        client = login(account)
+        with app.app_context():
+            url = BUDGETED_URLS[rule](account)
+        # The first request loads the logged-in user into the user cache
+        assert client.get(url).status_code == 200
+        with app.app_context(), count_queries() as counter:
+            response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        counts[size] = counter.count
+
+    # The budget itself is enforced by the view: going over it raises
+    assert counts['small'] == counts['large'], counts
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+from sqlalchemy import select, update
+
+from analysis import reanalyze_entries
+from app import db
+from benchmarks.synthetic import generate_account
+from models import JournalEntry, PersonStats
+from stats import rebuild_person_stats
+
+
+def entry_ids(account):
+    return db.session.execute(
+        select(JournalEntry.id).where(JournalEntry.user_id == account['user_id']).order_by(JournalEntry.id)
+    ).scalars().all()
+
+
+def stored_analysis(account):
+    return db.session.execute(
+        select(JournalEntry.id, JournalEntry.sentiment_score, JournalEntry.content_with_highlights,
+               JournalEntry.extracted_names)
+        .where(JournalEntry.user_id == account['user_id']).order_by(JournalEntry.id)
+    ).all()
+
+
+def corrupt(account, ids):
+    """Make the stored analysis of `ids` stale, as after a lexicon or name rule change"""
+    db.session.execute(update(JournalEntry).where(JournalEntry.id.in_(ids)).values(
+        sentiment_score=0.123, extracted_names='[]'))
+    # The stats were computed from the stored scores
+    rebuild_person_stats(account['user_id'])
+    db.session.commit()
+
+
+@pytest.fixture
+def account(app, request):
+    with app.app_context():
+        return generate_account(request.node.name, people=4, entries=10, seed=3)
+
+
+def test_only_changed_entries_are_rewritten(app, account):
+    with app.app_context():
+        ids = entry_ids(account)
+        expected = stored_analysis(account)
+        corrupt(account, ids[1::3])
+
+        progress = list(reanalyze_entries(account['user_id'], batch_size=4, workers=1))
+        assert [step['last_id'] for step in progress] == [ids[3], ids[7], ids[9]]
+        assert [(step['entries'], step['changed']) for step in progress] == [(4, 1), (8, 3), (10, 3)]
+        assert stored_analysis(account) == expected
+
+        # The people's sentiment stats were corrected along with the entries
+        stats = select(PersonStats.person_id, PersonStats.sentiment_sum).where(
+            PersonStats.person_id.in_([person_id for person_id, _ in account['people']])).order_by(PersonStats.person_id)
+        incremental = db.session.execute(stats).all()
+        rebuild_person_stats(account['user_id'])
+        assert db.session.execute(stats).all() == [(person_id, pytest.approx(total)) for person_id, total in incremental]
+        db.session.rollback()
+
+        assert list(reanalyze_entries(account['user_id'], batch_size=4, workers=1))[-1]['changed'] == 0
+
+
+def test_an_interrupted_run_resumes_after_its_last_batch(app, account):
+    with app.app_context():
+        ids = entry_ids(account)
+        expected = stored_analysis(account)
+        corrupt(account, ids)
+
+        run = reanalyze_entries(account['user_id'], batch_size=3, workers=1)
+        first = next(run)
+        run.close()
+        assert first == {'last_id': ids[2], 'entries': 3, 'changed': 3}
+        assert stored_analysis(account)[:3] == expected[:3]
+        assert stored_analysis(account)[3:] != expected[3:]
+
+        progress = list(reanalyze_entries(account['user_id'], after_id=first['last_id'], batch_size=3, workers=1))
+        assert progress[-1] == {'last_id': ids[-1], 'entries': 7, 'changed': 7}
+        assert stored_analysis(account) == expected
+
+
+def test_reanalyze_command_checkpoints_and_resumes(app, account, tmp_path):
+    checkpoint = tmp_path / 'reanalyze.checkpoint'
+    with app.app_context():
+        ids = entry_ids(account)
+        username = db.session.get(JournalEntry, ids[0]).author.username
+        corrupt(account, ids)
+    filters = {'user_id': account['user_id'], 'since': None, 'until': None}
+    checkpoint.write_text(json.dumps({'filters': filters, 'last_id': ids[5]}))
+    runner = app.test_cli_runner()
+    args = ['reanalyze', '--user', username, '--batch-size', '2', '--workers', '1', '--checkpoint', str(checkpoint)]
+
+    # A checkpoint of a run with other filters is refused
+    result = runner.invoke(args=[*args, '--since', '2020-01-01'])
+    assert result.exit_code != 0
+    assert 'other filters' in result.output
+
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert f'Resuming after entry {ids[5]}' in result.output
+    assert 'Reanalyzed 4 entries, 4 changed' in result.output
+    assert not checkpoint.exists()
+
+    result = runner.invoke(args=args)
+    assert 'Reanalyzed 10 entries, 6 changed' in result.output
@@ -0,0 +1,144 @@
+import pytest
+
+import result_cache
+from benchmarks.synthetic import generate_account
+from query_count import count_queries
+from result_cache import MemoryCache, NullCache, SQLiteCache
+
+
+def counters(cache):
+    stats = cache.stats.as_dict()
+    return stats['hits'], stats['misses'], stats['evictions'], stats['invalidations']
+
+
+def test_null_cache_stores_nothing():
+    cache = NullCache()
+    cache.set(1, 1, '/a', b'body')
+    assert cache.get(1, 1, '/a') is None
+    assert cache.size() == 0
+    assert counters(cache) == (0, 1, 0, 0)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    """Return a function that builds a cache of the parametrized backend with a TTL and size limit"""
+    if request.param == 'memory':
+        return MemoryCache
+    return lambda ttl, max_entries: SQLiteCache(str(tmp_path / 'cache.sqlite3'), ttl, max_entries)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake clock for both backends, advanced by adding to clock[0]"""
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(result_cache.time, 'time', lambda: now[0])
+    return now
+
+
+def test_values_are_read_at_their_version(make_cache, clock):
+    cache = make_cache(ttl=60, max_entries=10)
+    cache.set(1, 3, '/a', b'one')
+    cache.set(2, 3, '/a', b'two')
+    assert cache.get(1, 3, '/a') == b'one'
+    assert cache.get(2, 3, '/a') == b'two'
+    assert cache.get(1, 3, '/b') is None
+    # A request still running at an older version doesn't see the newer value
+    assert cache.get(1, 2, '/a') is None
+    assert counters(cache) == (2, 2, 0, 0)
+
+    # Once the user's version moves on, their older values are dropped
+    assert cache.get(1, 4, '/a') is None
+    cache.set(1, 4, '/b', b'new')
+    assert cache.get(1, 4, '/b') == b'new'
+    assert cache.get(1, 3, '/a') is None
+    assert cache.get(2, 3, '/a') == b'two'
+    assert cache.size() == 2
+    assert counters(cache)[3] == 1
+
+
+def test_values_expire(make_cache, clock):
+    cache = make_cache(ttl=60, max_entries=10)
+    cache.set(1, 1, '/a', b'body')
+    clock[0] += 59
+    assert cache.get(1, 1, '/a') == b'body'
+    clock[0] += 2
+    assert cache.get(1, 1, '/a') is None
+    assert cache.size() == 0
+    assert counters(cache) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_values_are_evicted(make_cache, clock):
+    cache = make_cache(ttl=60, max_entries=2)
+    cache.set(1, 1, '/a', b'a')
+    clock[0] += 2
+    cache.set(1, 1, '/b', b'b')
+    clock[0] += 2
+    assert cache.get(1, 1, '/a') == b'a'
+    clock[0] += 2
+    cache.set(1, 1, '/c', b'c')
+
+    assert cache.size() == 2
+    assert cache.get(1, 1, '/b') is None
+    assert cache.get(1, 1, '/a') == b'a'
+    assert cache.get(1, 1, '/c') == b'c'
+    assert counters(cache)[2] == 1
+
+
+def test_memory_cache_drops_stale_versions_from_the_lru_end():
+    cache = MemoryCache(ttl=60, max_entries=3)
+    for key in ('/a', '/b', '/c'):
+        cache.set(1, 1, key, b'old')
+    cache.set(1, 2, '/d', b'new')
+    cache.set(1, 2, '/e', b'new')
+    assert list(cache.entries) == [(1, '/c'), (1, '/d'), (1, '/e')]
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'shared.sqlite3')
+    SQLiteCache(path).set(1, 1, '/a', b'body')
+    other = SQLiteCache(path)
+    assert other.get(1, 1, '/a') == b'body'
+    other.set(1, 2, '/b', b'new')
+    assert SQLiteCache(path).get(1, 1, '/a') is None
+    assert other.size() == 1
+
+
+@pytest.fixture
+def memory_cache(app, monkeypatch):
+    """Use a fresh in-memory result cache in the app instead of none"""
+    cache = MemoryCache()
+    monkeypatch.setitem(app.extensions, 'result_cache', cache)
+    return cache
+
+
+def test_cached_views_skip_their_queries_until_data_changes(app, login, memory_cache):
+    with app.app_context():
+        account = generate_account('cached-views', people=3, entries=4)
+    client = login(account)
+    url = '/api/visualizations/interaction-frequency'
+    first = client.get(url)
+
+    with app.app_context(), count_queries() as counter:
+        cached = client.get(url)
+    assert cached.get_json() == first.get_json()
+    # Only the data version is read
+    assert counter.count == 1
+    assert counters(memory_cache)[:2] == (1, 1)
+
+    client.post('/api/people', json={'name': 'Newcomer'})
+    changed = client.get(url).get_json()
+    assert 'Newcomer' in [person['name'] for person in changed]
+    assert counters(memory_cache)[:2] == (1, 2)
+
+    assert client.get('/api/result-cache').get_json() == dict(
+        memory_cache.stats.as_dict(), backend='memory', size=memory_cache.size())
+
+
+def test_errors_are_not_cached(app, login, memory_cache):
+    with app.app_context():
+        account = generate_account('cached-errors', people=1, entries=0)
+    client = login(account)
+    for _ in range(2):
+        assert client.get('/api/visualizations/dashboard?parts=nope').status_code == 400
+    assert memory_cache.size() == 0
@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks.synthetic import generate_account, logged_in_client
+from search import fts5_query, snippet_html
+
+
+@pytest.mark.parametrize('text, query', [
+    ('picnic', '"picnic"*'),
+    ('Picnic  in the park', '"Picnic"* "in"* "the"* "park"*'),
+    ('"unbalanced quote', '"unbalanced"* "quote"*'),
+    ('say "hi" there', '"say"* "hi"* "there"*'),
+    ('park NEAR picnic', '"park"* "NEAR"* "picnic"*'),
+    ('NEAR(park picnic, 2)', '"NEAR"* "park"* "picnic"* "2"*'),
+    ('pic* OR -park AND NOT title:x ^y', '"pic"* "OR"* "park"* "AND"* "NOT"* "title"* "x"* "y"*'),
+    ('café über', '"café"* "über"*'),
+    ('"*" () : -', ''),
+])
+def test_fts5_query_quotes_every_word(text, query):
+    assert fts5_query(text) == query
+
+
+def test_snippet_html_escapes_content_but_keeps_marks():
+    snippet = '<script>alert("x")</script> & \x02picnic\x03 <b>'
+    assert snippet_html(snippet) == (
+        '&lt;script&gt;alert(&#34;x&#34;)&lt;/script&gt; &amp; <mark>picnic</mark> &lt;b&gt;')
+    assert snippet_html(None) == ''
+
+
+@pytest.fixture(scope='module')
+def search_client(app):
+    with app.app_context():
+        account = generate_account('searching', people=1, entries=0)
+    client = logged_in_client(app, account['user_id'])
+    for title, content in [
+        ('Picnic', 'A "picnic" in the park near the lake'),
+        ('Script', 'Wrote <script>alert(1)</script> on the picnic blanket'),
+        ('Quiet', 'Stayed home and read'),
+    ]:
+        client.post('/api/journal-entries', json={'title': title, 'content': content})
+    return client
+
+
+def search(client, query):
+    response = client.get('/api/journal-entries/search', query_string={'q': query})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['results']
+
+
+@pytest.mark.parametrize('query, titles', [
+    ('picnic', {'Picnic', 'Script'}),
+    ('pic', {'Picnic', 'Script'}),
+    ('"picnic', {'Picnic', 'Script'}),
+    ('picnic"', {'Picnic', 'Script'}),
+    # NEAR is only matched as the word "near"
+    ('park NEAR lake', {'Picnic'}),
+    ('NEAR(park lake)', {'Picnic'}),
+    ('NEAR(park home)', set()),
+    ('pic*', {'Picnic', 'Script'}),
+    ('*', set()),
+    ('script', {'Script'}),
+    # So is OR, which would otherwise match the park and the home entries
+    ('home OR park', set()),
+    ('"', set()),
+])
+def test_search_operators_are_searched_as_words(search_client, query, titles):
+    assert {result['title'] for result in search(search_client, query)} == titles
+
+
+def test_search_snippets_escape_entry_html(search_client):
+    [result] = search(search_client, 'alert')
+    assert '<script>' not in result['snippet']
+    assert '&lt;script&gt;' in result['snippet']
+    assert '<mark>alert</mark>' in result['snippet']
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from cli import SENTIMENT_CORPUS_PATH
+from utils import analyze_sentiment, analyze_sentiment_batch, iter_sentiment_batch
+
+with open(SENTIMENT_CORPUS_PATH, encoding='utf-8') as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize('case', CORPUS, ids=[f'case{i}' for i in range(len(CORPUS))])
+def test_sentiment_matches_the_recorded_score(case):
+    # Scores were recorded from the original implementation and must match exactly
+    assert analyze_sentiment(case['text']) == case['score']
+
+
+def test_batch_sentiment_matches_the_recorded_scores():
+    assert analyze_sentiment_batch([case['text'] for case in CORPUS], workers=1) == \
+        [case['score'] for case in CORPUS]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_streamed_sentiment_matches_every_index(workers):
+    texts = [case['text'] for case in CORPUS]
+    scores = dict(iter_sentiment_batch(iter(texts), workers=workers, chunksize=32))
+    assert scores == {index: analyze_sentiment(text) for index, text in enumerate(texts)}
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+import analysis
+from app import db
+from benchmarks.synthetic import generate_account
+from importer import import_journal
+from models import Person, PersonMonthStats, PersonStats
+from stats import rebuild_person_stats
+
+
+def stats_snapshot(user_id):
+    """The user's PersonStats and PersonMonthStats rows, leaving out people without entries"""
+    people = select(Person.id).where(Person.user_id == user_id)
+    totals = {
+        row.person_id: (row.entry_count, pytest.approx(row.sentiment_sum), row.sentiment_n,
+                        row.first_seen, row.last_seen)
+        for row in db.session.execute(select(PersonStats).where(PersonStats.person_id.in_(people))).scalars()
+        if row.entry_count
+    }
+    months = sorted(db.session.execute(
+        select(PersonMonthStats.person_id, PersonMonthStats.month, PersonMonthStats.entry_count)
+        .where(PersonMonthStats.person_id.in_(people))
+    ).all())
+    return totals, months
+
+
+def assert_stats_match_rebuild(account):
+    """Compare the incrementally maintained stats with rebuild_person_stats, then undo the rebuild"""
+    while analysis.process_analysis_jobs():
+        pass
+    db.session.expire_all()
+    incremental = stats_snapshot(account['user_id'])
+    rebuild_person_stats(account['user_id'])
+    assert stats_snapshot(account['user_id']) == incremental
+    db.session.rollback()
+    return incremental
+
+
+def test_incremental_stats_match_a_rebuild(app, login):
+    with app.app_context():
+        account = generate_account('stats', people=3, entries=0)
+        records = [
+            {'title': 'spring', 'content': 'A wonderful happy day', 'date_created': '2024-03-05T09:00:00',
+             'people_ids': [account['people'][0][0], account['people'][1][0]]},
+            {'title': 'summer', 'content': 'A sad and awful day', 'date_created': '2024-06-10T09:00:00',
+             'people_ids': [account['people'][0][0]]},
+        ]
+        list(import_journal(account['user_id'], [json.dumps(record) for record in records], workers=1))
+    first, second, third = [person_id for person_id, _ in account['people']]
+    client = login(account)
+
+    with app.app_context():
+        totals, _ = assert_stats_match_rebuild(account)
+        assert totals[first][0] == 2 and totals[second][0] == 1 and third not in totals
+        assert totals[first][2] == 2
+
+        # Create
+        entry_id = client.post('/api/journal-entries', json={
+            'title': 'today', 'content': 'Lunch was great', 'people_ids': [second, third]}).get_json()['id']
+        totals, _ = assert_stats_match_rebuild(account)
+        assert totals[third][0] == 1
+
+        # Edit the people, then the content and its sentiment
+        client.put(f'/api/journal-entries/{entry_id}', json={'people_ids': [first, third]})
+        totals, _ = assert_stats_match_rebuild(account)
+        assert (totals[first][0], totals[second][0]) == (3, 1)
+        client.put(f'/api/journal-entries/{entry_id}', json={'content': 'Lunch was terrible and sad'})
+        assert_stats_match_rebuild(account)
+
+        # Delete
+        client.delete(f'/api/journal-entries/{entry_id}')
+        totals, _ = assert_stats_match_rebuild(account)
+        assert third not in totals
+
+        spring = db.session.execute(select(PersonStats).where(PersonStats.person_id == second)).scalar_one()
+        assert spring.first_seen.month == spring.last_seen.month == 3
+
+        # Deleting a person drops their stats along with their links
+        client.delete(f'/api/people/{second}')
+        totals, months = assert_stats_match_rebuild(account)
+        assert second not in totals and second not in [person_id for person_id, _, _ in months]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from app import db
+from benchmarks.synthetic import generate_account
+from data_version import get_data_version
+from models import SyncTombstone
+from sync import encode_sync_cursor, encode_sync_token, prune_tombstones, sync_since
+
+
+def sync(client, **params):
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_sync_since_only_accepts_usable_tokens(app, accounts):
+    account = accounts['small']
+    with app.app_context():
+        version = get_data_version(account['user_id'])
+        assert sync_since(account['user_id'], encode_sync_token(account['user_id'], version), version) == version
+        assert sync_since(account['user_id'], None, version) is None
+        assert sync_since(account['user_id'], 'not a token', version) is None
+        assert sync_since(account['user_id'], encode_sync_token(accounts['large']['user_id'], 1), version) is None
+        assert sync_since(account['user_id'], encode_sync_token(account['user_id'], version + 1), version) is None
+
+
+def test_deletes_are_synced_until_their_tombstones_are_pruned(app, login):
+    with app.app_context():
+        account = generate_account('syncing', people=3, entries=6, seed=4)
+    client = login(account)
+    full = sync(client, types='entries')
+    assert full['full'] and len(full['entries']) == 6
+
+    deleted_id = full['entries'][0]['id']
+    assert client.delete(f'/api/journal-entries/{deleted_id}').status_code == 200
+    changes = sync(client, types='entries', since=full['token'])
+    assert not changes['full']
+    assert changes['entries'] == [] and changes['deleted']['entries'] == [deleted_id]
+    with app.app_context():
+        tombstone = db.session.execute(
+            db.select(SyncTombstone).where(SyncTombstone.user_id == account['user_id'])).scalar_one()
+        assert (tombstone.record_type, tombstone.record_id) == ('entries', deleted_id)
+
+        # Once the tombstone is pruned, the old token can't see the delete and gets a full sync
+        assert prune_tombstones(datetime.utcnow() + timedelta(seconds=1)) >= 1
+        db.session.commit()
+    resync = sync(client, types='entries', since=full['token'])
+    assert resync['full']
+    assert sorted(entry['id'] for entry in resync['entries']) == sorted(
+        entry['id'] for entry in full['entries'] if entry['id'] != deleted_id)
+    # Tokens issued after the prune are still good
+    assert not sync(client, types='entries', since=resync['token'])['full']
+
+
+def test_full_sync_is_paged(app, login, accounts):
+    client = login(accounts['large'])
+    first = sync(client, limit=30)
+    pages = [first]
+    while 'next_cursor' in pages[-1]:
+        pages.append(sync(client, limit=30, cursor=pages[-1]['next_cursor']))
+
+    assert len(pages) == 3 and all(page['token'] == first['token'] for page in pages)
+    assert all(len(page['entries']) <= 30 for page in pages)
+    assert all(set(page) - {'next_cursor'} == {'token', 'full', 'entries', 'deleted'} for page in pages[1:])
+    ids = [entry['id'] for page in pages for entry in page['entries']]
+    assert ids == sorted(set(ids)) and len(ids) == 80
+    assert ids == [entry['id'] for entry in sync(client, types='entries')['entries']]
+
+
+def test_sync_rejects_bad_cursors(app, login, accounts):
+    client = login(accounts['small'])
+    assert client.get('/api/sync?cursor=nope').status_code == 400
+    other = encode_sync_cursor(accounts['large']['user_id'], 1, 0)
+    assert client.get(f'/api/sync?cursor={other}').status_code == 400
+    assert client.get('/api/sync?limit=many').status_code == 400
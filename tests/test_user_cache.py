@@ -0,0 +1,64 @@
+import user_cache
+from app import db
+from models import User, load_user
+from user_cache import CachedUser, UserCache
+
+
+def test_entries_expire_and_the_oldest_are_dropped_when_full(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(user_cache.time, 'monotonic', lambda: now[0])
+    cache = UserCache(max_entries=2)
+
+    assert cache.get(1) is None
+    cache.set(CachedUser(1, 'one', 'one@example.com'), ttl=5)
+    cache.set(CachedUser(2, 'two', 'two@example.com'), ttl=10)
+    assert cache.get(1).username == 'one'
+
+    now[0] += 6
+    assert cache.get(1) is None
+    assert cache.get(2).username == 'two'
+
+    cache.set(CachedUser(3, 'three', 'three@example.com'), ttl=10)
+    cache.set(CachedUser(4, 'four', 'four@example.com'), ttl=10)
+    assert cache.get(2) is None
+    assert [cache.get(user_id).id for user_id in (3, 4)] == [3, 4]
+    assert cache.stats() == {'size': 2, 'hits': 4, 'misses': 3}
+
+
+def add_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_updated_and_deleted_users_are_reloaded(app):
+    with app.test_request_context():
+        user_id = add_user('cached')
+        assert load_user(str(user_id)).email == 'cached@example.com'
+        hits = user_cache.user_cache_stats()['hits']
+        assert load_user(str(user_id)).email == 'cached@example.com'
+        assert user_cache.user_cache_stats()['hits'] == hits + 1
+
+        db.session.get(User, user_id).email = 'changed@example.com'
+        db.session.commit()
+        assert user_cache.user_cache.get(user_id) is None
+        assert load_user(str(user_id)).email == 'changed@example.com'
+
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+        assert load_user(str(user_id)) is None
+
+
+def test_metrics_export_the_user_cache_counters(app, accounts, login):
+    client = login(accounts['small'])
+    client.get('/api/people')
+    client.get('/api/people')
+
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    values = {line.split()[0]: float(line.split()[1]) for line in lines if line.startswith('journal_user_cache_')}
+    stats = user_cache.user_cache_stats()
+    assert values['journal_user_cache_hits_total'] == stats['hits'] >= 1
+    assert values['journal_user_cache_misses_total'] == stats['misses']
+    assert values['journal_user_cache_entries'] == stats['size']
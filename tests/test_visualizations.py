@@ -0,0 +1,28 @@
+import json
+
+from benchmarks.synthetic import generate_account
+from importer import import_journal
+
+
+def test_interaction_frequency_keeps_people_with_the_same_name_apart(app, login):
+    with app.app_context():
+        account = generate_account('namesakes', people=0, entries=0)
+    client = login(account)
+    first, second = [client.post('/api/people', json={'name': 'Sam'}).get_json()['id'] for _ in range(2)]
+    records = [
+        {'title': 't', 'content': 'Saw Sam', 'date_created': '2024-05-02T10:00:00', 'people_ids': [first]},
+        {'title': 't', 'content': 'Saw Sam', 'date_created': '2024-05-20T10:00:00', 'people_ids': [first]},
+        {'title': 't', 'content': 'Saw Sam', 'date_created': '2024-07-01T10:00:00', 'people_ids': [first, second]},
+        {'title': 't', 'content': 'Saw Sam', 'date_created': '2023-12-31T23:00:00', 'people_ids': [second]},
+    ]
+    with app.app_context():
+        progress = list(import_journal(account['user_id'], [json.dumps(record) for record in records], workers=1))
+        assert progress[-1]['imported'] == 4
+
+    frequency = client.get('/api/visualizations/interaction-frequency').get_json()
+    assert frequency == [
+        {'id': first, 'name': 'Sam', 'months': [{'month': '2024-05', 'count': 2}, {'month': '2024-07', 'count': 1}]},
+        {'id': second, 'name': 'Sam', 'months': [{'month': '2023-12', 'count': 1}, {'month': '2024-07', 'count': 1}]},
+    ]
+    dashboard = client.get('/api/visualizations/dashboard?parts=frequency').get_json()
+    assert dashboard['frequency'] == frequency
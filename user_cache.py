@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, session
+from flask_login import UserMixin
+
+# Other processes only see a user's changes once their copy expires, so keep it short
+DEFAULT_TTL = 5
+DEFAULT_MAX_ENTRIES = 10000
+# Session key of the signed copy of the user's fields
+SESSION_KEY = '_user'
+
+
+class CachedUser(UserMixin):
+    """
+    The fields of a User that request handlers need, as current_user.
+
+    It isn't attached to a database session, so handlers that need more
+    than these fields or the user's relationships must load the User.
+    """
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    def as_dict(self):
+        return {'id': self.id, 'username': self.username, 'email': self.email}
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """
+    Per-process cache of CachedUsers, each stored with a TTL.
+
+    Entries are dropped when the user is updated or deleted in this process.
+    Other processes aren't told, so a changed password, email or deleted
+    account can be served from their caches until the entry's TTL runs out;
+    the TTL is the bound on that staleness and should stay at a few seconds.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # user_id -> (expires_at, CachedUser), oldest first; the oldest are dropped when full
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        with self.lock:
+            item = self.entries.get(user_id)
+            if item is None or item[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[1]
+
+    def set(self, user, ttl):
+        with self.lock:
+            self.entries[user.id] = (time.monotonic() + ttl, user)
+            self.entries.move_to_end(user.id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+user_cache = UserCache()
+
+
+def user_cache_stats():
+    """Return the size and hit/miss counters of this process's user cache"""
+    return user_cache.stats()
+
+
+def invalidate_cached_user(user_id):
+    """Forget the cached copy of a user, e.g. after their password or account changed"""
+    user_cache.invalidate(user_id)
+
+
+def load_cached_user(user_id, load):
+    """
+    Return the CachedUser for `user_id`, calling `load(user_id)` on a miss.
+
+    `load` returns the user's CachedUser, or None if they don't exist. With
+    USER_SESSION_PAYLOAD set, the user's fields are also kept in the signed
+    session cookie for USER_CACHE_TTL seconds, so requests that reach any
+    process skip the cache lookup and the query; a changed or deleted
+    account then only reaches other sessions when their copy expires.
+    """
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    use_session = current_app.config.get('USER_SESSION_PAYLOAD', False)
+
+    if use_session:
+        payload = session.get(SESSION_KEY)
+        if payload and payload.get('id') == user_id and payload.get('expires', 0) > time.time():
+            return CachedUser(payload['id'], payload['username'], payload['email'])
+
+    user = user_cache.get(user_id)
+    if user is None:
+        user = load(user_id)
+        if user is None:
+            return None
+        user_cache.set(user, ttl)
+
+    if use_session:
+        session[SESSION_KEY] = dict(user.as_dict(), expires=time.time() + ttl)
+    return user
+
+
+def clear_session_user():
+    """Drop the session copy of the user's fields, e.g. on logout"""
+    session.pop(SESSION_KEY, None)
@@ -1,4 +1,182 @@
+import os
 import re
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from itertools import islice
+from threading import Lock
+
+# Sentiment lexicon, in the order the scores are accumulated.
+# Keyword lists only match whole words; phrases are regular expressions that
+# may also match inside longer words (e.g. 'impressed' in 'unimpressed').
+
+# Strong positive words (weight: 1.0)
+STRONG_POSITIVE = [
+    'love', 'amazing', 'excellent', 'fantastic', 'outstanding', 'perfect',
+    'wonderful', 'brilliant', 'delightful', 'exceptional', 'thrilled'
+]
+
+# Moderate positive words (weight: 0.7)
+MODERATE_POSITIVE = [
+    'good', 'great', 'happy', 'pleased', 'enjoy', 'nice', 'joy', 'excited',
+    'grateful', 'thankful', 'awesome', 'best', 'positive', 'comfortable',
+    'fun', 'caring', 'helpful', 'thoughtful', 'considerate', 'impressed'
+]
+
+# Mild positive words (weight: 0.4)
+MILD_POSITIVE = [
+    'fine', 'okay', 'decent', 'pleasant', 'satisfactory', 'content',
+    'calm', 'relaxed', 'refreshing', 'interesting', 'promising', 'sweet'
+]
+
+# Strong negative words (weight: -1.0)
+STRONG_NEGATIVE = [
+    'hate', 'terrible', 'horrible', 'awful', 'dreadful', 'miserable',
+    'devastating', 'disgusting', 'furious', 'despise', 'disaster'
+]
+
+# Moderate negative words (weight: -0.7)
+MODERATE_NEGATIVE = [
+    'bad', 'sad', 'upset', 'angry', 'annoyed', 'disappointed', 'frustrated',
+    'unhappy', 'sorry', 'regret', 'difficult', 'unfortunate', 'unpleasant',
+    'troubled', 'worried', 'painful', 'negative', 'problem', 'concerned'
+]
+
+# Mild negative words (weight: -0.4)
+MILD_NEGATIVE = [
+    'not great', 'not good', 'mediocre', 'uneasy', 'uncomfortable',
+    'tired', 'boring', 'dull', 'bland', 'awkward', 'challenging'
+]
+
+# Positive phrases (weight: varies)
+POSITIVE_PHRASES = {
+    r'was so (sweet|nice|kind|helpful|thoughtful)': 0.8,
+    r'made me (smile|laugh|happy)': 0.8,
+    r'really (enjoyed|appreciated|liked|loved)': 0.9,
+    r'very (supportive|understanding|patient)': 0.8,
+    r'had a great time': 0.7,
+    r'was a pleasure': 0.7,
+    r'went well': 0.6,
+    r'felt comfortable': 0.6,
+    r'was helpful': 0.5,
+    r'helped me': 0.6,
+    r'good conversation': 0.5,
+    r'looking forward to': 0.5,
+    r'impressed': 0.6,
+    r'proud of': 0.7,
+    r'grateful for': 0.7,
+    r'thankful for': 0.7
+}
+
+# Negative phrases (weight: varies)
+NEGATIVE_PHRASES = {
+    r'had a (bad|terrible|awful|uncomfortable) experience': -0.8,
+    r'made me (uncomfortable|upset|angry|sad)': -0.8,
+    r'did not (like|enjoy|appreciate)': -0.6,
+    r'was not (helpful|pleasant|kind|nice)': -0.6,
+    r'was (rude|impolite|inconsiderate|mean)': -0.8,
+    r'felt (awkward|uncomfortable|uneasy)': -0.5,
+    r'didn\'t go well': -0.6,
+    r'wasn\'t (good|great|pleasant)': -0.5,
+    r'struggled with': -0.4,
+    r'don\'t like': -0.6,
+    r'not comfortable': -0.5,
+    r'disappointed': -0.5,
+    r'frustrating': -0.6,
+    r'not happy': -0.6,
+    r'concerned about': -0.4,
+    r'worried about': -0.4
+}
+
+_WORD_CHAR = re.compile(r'\w')
+_PHRASE_GROUP = re.compile(r'\(([^()]*)\)')
+
+
+def _expand_phrase(phrase):
+    """
+    Expand a lexicon phrase into the literal strings it matches.
+
+    Phrases may contain at most one '(a|b|c)' group of plain alternatives;
+    escaped quotes are unescaped.
+    """
+    phrase = phrase.replace("\\'", "'")
+    group = _PHRASE_GROUP.search(phrase)
+    if not group:
+        return [phrase]
+    head, tail = phrase[:group.start()], phrase[group.end():]
+    return [head + option + tail for option in group.group(1).split('|')]
+
+
+def _trie_regex(literals):
+    """
+    Build a regex source matching the longest of `literals` at a position.
+
+    The literals are arranged as a trie so the regex engine only follows the
+    branches that share the characters already seen.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        terminal = '' in node
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # Greedy optional: prefer the longer literal, fall back to this one
+        return '(?:' + body + ')?' if terminal else body
+
+    return build(trie)
+
+
+def _compile_sentiment_lexicon():
+    """
+    Compile the lexicon into a single scanner.
+
+    Returns (scanner, literal_patterns, weights) where `scanner` finds the
+    longest lexicon literal starting at every position of the text,
+    `literal_patterns` maps every literal to the (pattern index, needs word
+    boundaries) pairs matched by it or by any literal that is a prefix of it,
+    and `weights` lists the pattern weights in accumulation order.
+    """
+    weights = []
+    pattern_literals = []
+    for words, weight in ((STRONG_POSITIVE, 1.0), (MODERATE_POSITIVE, 0.7),
+                          (MILD_POSITIVE, 0.4), (STRONG_NEGATIVE, -1.0),
+                          (MODERATE_NEGATIVE, -0.7), (MILD_NEGATIVE, -0.4)):
+        for word in words:
+            weights.append(weight)
+            pattern_literals.append(([word], True))
+    for phrases in (POSITIVE_PHRASES, NEGATIVE_PHRASES):
+        for phrase, weight in phrases.items():
+            weights.append(weight)
+            pattern_literals.append((_expand_phrase(phrase), False))
+
+    matches_by_literal = {}
+    for index, (literals, bounded) in enumerate(pattern_literals):
+        for literal in literals:
+            matches_by_literal.setdefault(literal, []).append((index, bounded))
+
+    # A literal found at a position implies every shorter literal that is a
+    # prefix of it matched there too
+    literal_patterns = {}
+    for literal in matches_by_literal:
+        literal_patterns[literal] = [
+            (index, bounded, len(other))
+            for other, targets in matches_by_literal.items()
+            if literal.startswith(other)
+            for index, bounded in targets
+        ]
+
+    scanner = re.compile('(?=(' + _trie_regex(matches_by_literal) + '))')
+    return scanner, literal_patterns, weights
+
+
+_SENTIMENT_SCANNER, _SENTIMENT_LITERALS, _SENTIMENT_WEIGHTS = _compile_sentiment_lexicon()
+
 
 def analyze_sentiment(text):
     """
@@ -8,139 +186,38 @@ def analyze_sentiment(text):
     and phrases, with weighted scores.
     Returns a score between -1 (very negative) and 1 (very positive).
     
+    The lexicon is compiled once at import into a single scanner, so the text is
+    scanned in one pass. Each keyword and phrase is still counted as its own
+    non-overlapping match, exactly as separate `re.findall` calls would.
+    
     In a production environment, this could be replaced with even more sophisticated
     sentiment analysis using NLP libraries like NLTK, spaCy, or a cloud service API.
     """
-    # Strong positive words (weight: 1.0)
-    strong_positive = [
-        'love', 'amazing', 'excellent', 'fantastic', 'outstanding', 'perfect',
-        'wonderful', 'brilliant', 'delightful', 'exceptional', 'thrilled'
-    ]
-    
-    # Moderate positive words (weight: 0.7)
-    moderate_positive = [
-        'good', 'great', 'happy', 'pleased', 'enjoy', 'nice', 'joy', 'excited',
-        'grateful', 'thankful', 'awesome', 'best', 'positive', 'comfortable',
-        'fun', 'caring', 'helpful', 'thoughtful', 'considerate', 'impressed'
-    ]
-    
-    # Mild positive words (weight: 0.4)
-    mild_positive = [
-        'fine', 'okay', 'decent', 'pleasant', 'satisfactory', 'content',
-        'calm', 'relaxed', 'refreshing', 'interesting', 'promising', 'sweet'
-    ]
-    
-    # Strong negative words (weight: -1.0)
-    strong_negative = [
-        'hate', 'terrible', 'horrible', 'awful', 'dreadful', 'miserable',
-        'devastating', 'disgusting', 'furious', 'despise', 'disaster'
-    ]
-    
-    # Moderate negative words (weight: -0.7)
-    moderate_negative = [
-        'bad', 'sad', 'upset', 'angry', 'annoyed', 'disappointed', 'frustrated',
-        'unhappy', 'sorry', 'regret', 'difficult', 'unfortunate', 'unpleasant',
-        'troubled', 'worried', 'painful', 'negative', 'problem', 'concerned'
-    ]
-    
-    # Mild negative words (weight: -0.4)
-    mild_negative = [
-        'not great', 'not good', 'mediocre', 'uneasy', 'uncomfortable',
-        'tired', 'boring', 'dull', 'bland', 'awkward', 'challenging'
-    ]
-    
-    # Positive phrases (weight: varies)
-    positive_phrases = {
-        r'was so (sweet|nice|kind|helpful|thoughtful)': 0.8,
-        r'made me (smile|laugh|happy)': 0.8,
-        r'really (enjoyed|appreciated|liked|loved)': 0.9,
-        r'very (supportive|understanding|patient)': 0.8,
-        r'had a great time': 0.7,
-        r'was a pleasure': 0.7,
-        r'went well': 0.6,
-        r'felt comfortable': 0.6,
-        r'was helpful': 0.5,
-        r'helped me': 0.6,
-        r'good conversation': 0.5,
-        r'looking forward to': 0.5,
-        r'impressed': 0.6,
-        r'proud of': 0.7,
-        r'grateful for': 0.7,
-        r'thankful for': 0.7
-    }
-    
-    # Negative phrases (weight: varies)
-    negative_phrases = {
-        r'had a (bad|terrible|awful|uncomfortable) experience': -0.8,
-        r'made me (uncomfortable|upset|angry|sad)': -0.8,
-        r'did not (like|enjoy|appreciate)': -0.6,
-        r'was not (helpful|pleasant|kind|nice)': -0.6,
-        r'was (rude|impolite|inconsiderate|mean)': -0.8,
-        r'felt (awkward|uncomfortable|uneasy)': -0.5,
-        r'didn\'t go well': -0.6,
-        r'wasn\'t (good|great|pleasant)': -0.5,
-        r'struggled with': -0.4,
-        r'don\'t like': -0.6,
-        r'not comfortable': -0.5,
-        r'disappointed': -0.5,
-        r'frustrating': -0.6,
-        r'not happy': -0.6,
-        r'concerned about': -0.4,
-        r'worried about': -0.4
-    }
-    
     # Convert to lowercase for easier comparison
     text_lower = text.lower()
+    text_length = len(text_lower)
     
-    # Calculate sentiment scores with weights
-    score = 0
-    word_count = 0
-    
-    # Check for strong positive words
-    for word in strong_positive:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * 1.0
-        word_count += matches
-    
-    # Check for moderate positive words
-    for word in moderate_positive:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * 0.7
-        word_count += matches
-    
-    # Check for mild positive words
-    for word in mild_positive:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * 0.4
-        word_count += matches
-    
-    # Check for strong negative words
-    for word in strong_negative:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * -1.0
-        word_count += matches
-    
-    # Check for moderate negative words
-    for word in moderate_negative:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * -0.7
-        word_count += matches
+    counts = [0] * len(_SENTIMENT_WEIGHTS)
+    # End of the last counted match per pattern, so matches don't overlap
+    last_end = [0] * len(_SENTIMENT_WEIGHTS)
     
-    # Check for mild negative words
-    for word in mild_negative:
-        matches = len(re.findall(r'\b' + word + r'\b', text_lower))
-        score += matches * -0.4
-        word_count += matches
-    
-    # Check for positive phrases
-    for phrase, weight in positive_phrases.items():
-        matches = len(re.findall(phrase, text_lower))
-        score += matches * weight
-        word_count += matches
+    for match in _SENTIMENT_SCANNER.finditer(text_lower):
+        start = match.start()
+        for index, bounded, length in _SENTIMENT_LITERALS[match.group(1)]:
+            end = start + length
+            if start < last_end[index]:
+                continue
+            if bounded and (
+                    (start > 0 and _WORD_CHAR.match(text_lower, start - 1)) or
+                    (end < text_length and _WORD_CHAR.match(text_lower, end))):
+                continue
+            counts[index] += 1
+            last_end[index] = end
     
-    # Check for negative phrases
-    for phrase, weight in negative_phrases.items():
-        matches = len(re.findall(phrase, text_lower))
+    # Calculate sentiment scores with weights, in lexicon order
+    score = 0
+    word_count = 0
+    for matches, weight in zip(counts, _SENTIMENT_WEIGHTS):
         score += matches * weight
         word_count += matches
     
@@ -153,6 +230,139 @@ def analyze_sentiment(text):
     return max(min(sentiment_score, 1.0), -1.0)
 
 
+def _chunked(items, chunksize):
+    """Yield (start index, list of items) chunks from any iterable"""
+    iterator = iter(items)
+    start = 0
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+class PendingResults:
+    """Results of ChunkedPool.submit, in the order of the submitted items"""
+    
+    def __init__(self, parts):
+        # Lists of results, or futures of them
+        self.parts = parts
+    
+    def result(self):
+        """Wait for every chunk and return all results as one list"""
+        results = []
+        for part in self.parts:
+            results.extend(part if isinstance(part, list) else part.result())
+        return results
+
+
+class ChunkedPool:
+    """
+    Run a function over chunks of a list of items, in worker processes when workers > 1.
+    
+    `function` takes a list of items and returns a list with one result per
+    item; it must be a module-level function so it can be sent to worker
+    processes. With one worker everything runs in the calling process and
+    no pool is started. Use it as a context manager, or call shutdown(),
+    so the workers exit even when the caller stops early.
+    """
+    
+    def __init__(self, function, workers=1):
+        self.function = function
+        self.workers = max(1, workers or 1)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+    
+    def submit(self, items, chunksize=None):
+        """
+        Start running the function over `items` and return their PendingResults.
+        
+        Items are split into chunks of `chunksize`, by default spread evenly
+        over the workers, which run while the caller does other work, e.g.
+        writes the previous batch. With one worker the results are computed
+        before returning.
+        """
+        items = list(items)
+        if self.executor is None:
+            return PendingResults([self.function(items)])
+        chunksize = chunksize or max(1, -(-len(items) // self.workers))
+        return PendingResults([self.executor.submit(self.function, items[start:start + chunksize])
+                               for start in range(0, len(items), chunksize)])
+    
+    def map(self, items, chunksize=None):
+        """Run the function over `items` and return the list of results"""
+        return self.submit(items, chunksize).result()
+    
+    def iter_completed(self, items, chunksize):
+        """
+        Run the function over `items` and yield (index, result) as chunks complete.
+        
+        The order is not guaranteed. `items` is consumed lazily, with at most
+        two chunks per worker in flight, so it can be a stream of any length.
+        """
+        chunks = _chunked(items, chunksize)
+        if self.executor is None:
+            for start, chunk in chunks:
+                yield from enumerate(self.function(chunk), start)
+            return
+        
+        pending = {}
+        for start, chunk in chunks:
+            pending[self.executor.submit(self.function, chunk)] = start
+            if len(pending) < self.workers * 2:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from enumerate(future.result(), pending.pop(future))
+        for future in as_completed(list(pending)):
+            yield from enumerate(future.result(), pending.pop(future))
+    
+    def shutdown(self, wait=True):
+        """Stop the workers, dropping chunks that haven't started"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+def score_sentiments(texts):
+    """Score a list of texts; a module-level function so ChunkedPool can run it in worker processes."""
+    return [analyze_sentiment(text) for text in texts]
+
+
+def iter_sentiment_batch(texts, workers=None, chunksize=256):
+    """
+    Score an iterable of texts across a process pool.
+    
+    Yields (index, score) pairs as chunks complete, so the order is not
+    guaranteed. `texts` is consumed lazily and at most two chunks per worker
+    are in flight at once. With workers=1 the texts are scored in-process.
+    """
+    # Also shuts the pool down if the caller stops iterating early
+    with ChunkedPool(score_sentiments, workers or os.cpu_count() or 1) as pool:
+        yield from pool.iter_completed(texts, chunksize)
+
+
+def analyze_sentiment_batch(texts, workers=None, chunksize=256):
+    """
+    Score many texts at once, using a process pool for large batches.
+    
+    Returns a list of scores in the same order as `texts`. Work is handed out
+    in chunks of `chunksize` texts; `workers` defaults to the number of CPUs.
+    """
+    texts = list(texts)
+    if len(texts) <= chunksize:
+        # Not worth starting a pool for a single chunk
+        workers = 1
+    
+    with ChunkedPool(score_sentiments, workers or os.cpu_count() or 1) as pool:
+        return pool.map(texts, chunksize)
+
+
 def extract_potential_names(text):
     """
     Extract potential person names from text.
@@ -190,3 +400,110 @@ def extract_potential_names(text):
                     potential_names.append(word)
     
     return list(set(potential_names))  # Remove duplicates
+
+
+
+def analyze_contents(contents):
+    """
+    Run the CPU-bound analysis of journal entry contents.
+    
+    Returns a (sentiment_score, potential_names) pair per content. It is a
+    module-level function so chunks of entries can be analyzed in worker
+    processes.
+    """
+    return [(analyze_sentiment(content), extract_potential_names(content)) for content in contents]
+
+
+class NameMatcher:
+    """
+    Compiled matcher for the names of one user's people.
+    
+    All known names are folded into a single case-insensitive alternation
+    (longest first, so 'Mary Ann' wins over 'Ann'), followed by a catch-all
+    word alternative used to pick up candidate names. A document is
+    highlighted in one pass over the text.
+    """
+    
+    def __init__(self, people):
+        # people: iterable of (id, name) pairs, in priority order
+        self.fingerprint = tuple(people)
+        self.names = {name for _, name in self.fingerprint}
+        self.people_by_name = {}
+        for person_id, name in self.fingerprint:
+            self.people_by_name.setdefault(name.lower(), (person_id, name))
+        
+        known = sorted(self.names, key=len, reverse=True)
+        if known:
+            alternation = '|'.join(re.escape(name) for name in known)
+            self.pattern = re.compile(r'\b(' + alternation + r')\b|\w+', re.IGNORECASE)
+        else:
+            self.pattern = re.compile(r'\w+')
+    
+    def highlight(self, content, candidate_names=()):
+        """
+        Wrap known people and candidate names found in `content` in highlight spans.
+        
+        Names are matched case-insensitively as whole words. A known person is
+        only highlighted if their name also appears in `content` with its
+        exact casing.
+        Returns (content_with_highlights, known_people) where known_people maps
+        each highlighted person's name to their id.
+        """
+        candidates = {name.lower(): name for name in candidate_names}
+        matches = list(self.pattern.finditer(content))
+        matched = {self.people_by_name[match.group(1).lower()][1]
+                   for match in matches if match.lastindex}
+        present = {name for name in matched if name in content}
+        
+        pieces = []
+        known_people = {}
+        position = 0
+        for match in matches:
+            text = match.group()
+            key = text.lower()
+            if match.lastindex:
+                person_id, name = self.people_by_name[key]
+                if name in present:
+                    highlight = f'<span class="person-highlight known" data-person-id="{person_id}">{name}</span>'
+                    known_people[name] = person_id
+                elif key in candidates:
+                    highlight = f'<span class="person-highlight new">{candidates[key]}</span>'
+                else:
+                    continue
+            elif key in candidates:
+                highlight = f'<span class="person-highlight new">{candidates[key]}</span>'
+            else:
+                continue
+            pieces.append(content[position:match.start()])
+            pieces.append(highlight)
+            position = match.end()
+        pieces.append(content[position:])
+        
+        return ''.join(pieces), known_people
+
+
+_name_matchers = {}
+_name_matchers_lock = Lock()
+
+
+def get_name_matcher(user_id, people):
+    """
+    Return the cached NameMatcher for a user, rebuilding it if `people` changed.
+    
+    `people` is the user's current list of (id, name) pairs. Comparing it
+    against the cached matcher keeps the cache correct across processes even
+    when another process changed the user's people.
+    """
+    people = tuple(people)
+    matcher = _name_matchers.get(user_id)
+    if matcher is None or matcher.fingerprint != people:
+        matcher = NameMatcher(people)
+        with _name_matchers_lock:
+            _name_matchers[user_id] = matcher
+    return matcher
+
+
+def invalidate_name_matcher(user_id):
+    """Drop the cached NameMatcher for a user after their people change."""
+    with _name_matchers_lock:
+        _name_matchers.pop(user_id, None)